@@ -18,6 +18,10 @@ import os
 import sgtk
 
 
+# delay before the file search is prewarmed once the engine has started
+PREWARM_DELAY_MS = 2000
+
+
 class MultiWorkFiles(sgtk.platform.Application):
 
     def init_app(self):
@@ -97,11 +101,28 @@ class MultiWorkFiles(sgtk.platform.Application):
                                      "in this engine! You can currently only use it with the following "
                                      "engines: %s" % ", ".join(SUPPORTED_ENGINES))
 
+        if self.engine.has_ui and self.get_setting("prewarm_file_search", False):
+            # use a single-shot timer to give the engine time to finish starting up before
+            # searching for files:
+            from sgtk.platform.qt import QtCore
+            QtCore.QTimer.singleShot(PREWARM_DELAY_MS, self._prewarm_file_search)
+
     def destroy_app(self):
         """
         Clean up app
         """
         self.log_debug("Destroying tk-multi-workfiles2")
+        self._tk_multi_workfiles.WorkFiles.shut_down()
+
+    def post_context_change(self, old_context, new_context):
+        """
+        Runs after a context change - prewarms the file search for the new context if enabled.
+
+        :param old_context: The context being changed away from
+        :param new_context: The new context
+        """
+        if self.engine.has_ui and self.get_setting("prewarm_file_search", False):
+            self._prewarm_file_search()
 
     def show_file_open_dlg(self):
         """
@@ -115,6 +136,15 @@ class MultiWorkFiles(sgtk.platform.Application):
         """
         self._tk_multi_workfiles.WorkFiles.show_file_save_dlg()
 
+    def _prewarm_file_search(self):
+        """
+        Run the file search for the current context in the background
+        """
+        try:
+            self._tk_multi_workfiles.WorkFiles.prewarm()
+        except:
+            self.log_exception("Failed to prewarm the file search!")
+
     # access general information:
     def get_work_template(self, context):
         """
@@ -197,3 +227,16 @@ class DebugWrapperShotgun(object):
         data = self._sg.insert(*args, **kwargs)
         self._log_fn("SG API insert end")
         return data
+
+    def summarize(self, *args, **kwargs):
+        self._log_fn("SG API summarize start: %s %s" % (args, kwargs))
+        data = self._sg.summarize(*args, **kwargs)
+        self._log_fn("SG API summarize end")
+        return data
+
+    def __getattr__(self, name):
+        # pass anything that isn't explicitly wrapped straight through to the Shotgun instance:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        self._log_fn("SG API %s" % name)
+        return getattr(self._sg, name)
@@ -0,0 +1,701 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+File model built directly on QAbstractItemModel with all items stored in flat arrays.
+"""
+
+from sgtk.platform.qt import QtCore
+
+from .file_model import FileModelBase
+
+
+class ArrayFileModel(FileModelBase, QtCore.QAbstractItemModel):
+    """
+    Alternative to the FileModel that stores groups, folders and files as lightweight Python objects
+    in flat, indexed arrays rather than as QStandardItems.  Data is served directly from the items
+    (and the FileItem they represent) and rows are inserted and removed in ranges so that views are
+    notified once per change rather than once per row.
+
+    The model items provide the subset of the QStandardItem interface used by the model and the file
+    views so the two models can be used interchangeably.
+    """
+
+    class _BaseModelItem(object):
+        """
+        Base model item for storage of the file data in the model.  Child items are stored in a
+        flat list and each item keeps track of its own row so that building an index for an item
+        doesn't require a search.
+        """
+        __slots__ = ("_type", "_text", "_tool_tip", "_role_data", "_model", "_parent", "_row",
+                     "_children", "__weakref__")
+
+        def __init__(self, typ, text=None):
+            """
+            :param typ:     The type of item this represents (see enumeration of node types in
+                            FileModelBase)
+            :param text:    String used for the label/display role for this item
+            """
+            self._type = typ
+            self._text = text or ""
+            self._tool_tip = None
+            self._role_data = None# role:value for any other roles set on the item
+            self._model = None
+            self._parent = None
+            self._row = -1
+            # most items never have children so share an empty tuple until they do:
+            self._children = ()
+
+        def model(self):
+            """
+            :returns:   The model this item belongs to or None if it isn't in a model
+            """
+            return self._model
+
+        def parent(self):
+            """
+            :returns:   The parent item of this item or None if this is a top level item
+            """
+            if self._parent is None or self._parent._parent is None:
+                return None
+            return self._parent
+
+        def row(self):
+            """
+            :returns:   The row of this item under its parent or -1 if it doesn't have a parent
+            """
+            return self._row
+
+        def index(self):
+            """
+            :returns:   The QModelIndex for this item - this is invalid if the item isn't in a model
+            """
+            if self._model is None or self._parent is None:
+                return QtCore.QModelIndex()
+            return self._model.createIndex(self._row, 0, self)
+
+        def rowCount(self):
+            """
+            :returns:   The number of child items this item has
+            """
+            return len(self._children)
+
+        def hasChildren(self):
+            """
+            :returns:   True if this item has any child items, otherwise False
+            """
+            return bool(self._children)
+
+        def child(self, row, column=0):
+            """
+            :param row:     The row of the child item to return
+            :param column:  The column of the child item to return
+            :returns:       The child item at the specified row or None if there isn't one
+            """
+            if column != 0 or row < 0 or row >= len(self._children):
+                return None
+            return self._children[row]
+
+        def text(self):
+            """
+            :returns:   The display text for this item
+            """
+            return self._text
+
+        def setText(self, text):
+            """
+            :param text:    The display text to set on this item
+            """
+            self.setData(text, QtCore.Qt.DisplayRole)
+
+        def toolTip(self):
+            """
+            :returns:   The tooltip for this item
+            """
+            return self._tool_tip
+
+        def setToolTip(self, tool_tip):
+            """
+            :param tool_tip:    The tooltip to set on this item
+            """
+            self.setData(tool_tip, QtCore.Qt.ToolTipRole)
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == ArrayFileModel.NODE_TYPE_ROLE:
+                return self._type
+            elif role == QtCore.Qt.DisplayRole:
+                return self._text
+            elif role == QtCore.Qt.ToolTipRole:
+                return self._tool_tip
+            elif self._role_data:
+                return self._role_data.get(role)
+            return None
+
+        def setData(self, value, role):
+            """
+            Set the data on the item for the specified role
+
+            :param value:   The value to set the data with
+            :param role:    The role to set the data for
+            """
+            if role == ArrayFileModel.NODE_TYPE_ROLE:
+                # do nothing as the data can't be set:
+                return
+            elif role == QtCore.Qt.DisplayRole:
+                self._text = value
+            elif role == QtCore.Qt.ToolTipRole:
+                self._tool_tip = value
+            else:
+                if self._role_data is None:
+                    self._role_data = {}
+                self._role_data[role] = value
+            self.emitDataChanged()
+
+        def emitDataChanged(self):
+            """
+            Emit the dataChanged signal from the model for this item.
+            """
+            if self._model is not None and self._parent is not None:
+                index = self.index()
+                self._model.dataChanged.emit(index, index)
+
+        def appendRow(self, item):
+            """
+            :param item:    The item to append as the last child of this item
+            """
+            self.insertRows(len(self._children), [item])
+
+        def appendRows(self, items):
+            """
+            :param items:   A list of items to append as the last children of this item
+            """
+            self.insertRows(len(self._children), items)
+
+        def insertRow(self, row, item):
+            """
+            :param row:     The row to insert the item at
+            :param item:    The item to insert as a child of this item
+            """
+            self.insertRows(row, [item])
+
+        def insertRows(self, row, items):
+            """
+            Insert a list of items as children of this item.  If this item is in a model then the
+            model emits a single rowsInserted signal for all the items.
+
+            :param row:     The row to insert the items at
+            :param items:   A list of items to insert as children of this item
+            """
+            items = list(items)
+            if not items:
+                return
+            row = max(0, min(row, len(self._children)))
+
+            model = self._model
+            if model is not None:
+                model.beginInsertRows(self.index(), row, row + len(items) - 1)
+
+            if not self._children:
+                self._children = []
+            self._children[row:row] = items
+            for item in items:
+                item._parent = self
+                item._set_model(model)
+            self._update_rows(row)
+
+            if model is not None:
+                model.endInsertRows()
+
+        def removeRow(self, row):
+            """
+            :param row: The row of the child item to remove
+            """
+            self.removeRows(row, 1)
+
+        def removeRows(self, row, count):
+            """
+            Remove a range of children from this item.  If this item is in a model then the model
+            emits a single rowsRemoved signal for the whole range.
+
+            :param row:     The first row to remove
+            :param count:   The number of rows to remove
+            """
+            count = min(count, len(self._children) - row)
+            if row < 0 or count <= 0:
+                return
+
+            model = self._model
+            if model is not None:
+                model.beginRemoveRows(self.index(), row, row + count - 1)
+
+            removed_items = self._children[row:row + count]
+            del self._children[row:row + count]
+            for item in removed_items:
+                item._parent = None
+                item._row = -1
+                item._set_model(None)
+            self._update_rows(row)
+
+            if model is not None:
+                model.endRemoveRows()
+
+        def _set_model(self, model):
+            """
+            Set the model for this item and all of its children.
+
+            :param model:   The model the item belongs to or None if it's been removed from a model
+            """
+            self._model = model
+            for child_item in self._children:
+                child_item._set_model(model)
+
+        def _update_rows(self, first_row):
+            """
+            Update the row stored on each child item from the specified row onwards.
+
+            :param first_row:   The first row that needs updating
+            """
+            children = self._children
+            for row in xrange(first_row, len(children)):
+                children[row]._row = row
+
+    class _FileModelItem(_BaseModelItem):
+        """
+        Model item that represents a single FileItem in the model
+        """
+        __slots__ = ("_file_item", "_work_area", "_tooltip", "_subtitle", "_sort_key")
+
+        def __init__(self, file_item, work_area):
+            """
+            :param file_item:    The FileItem instance this model item represents
+            :param work_area:    The WorkArea this file item belongs to
+            """
+            ArrayFileModel._BaseModelItem.__init__(self, typ=ArrayFileModel.FILE_NODE_TYPE)
+            self._file_item = file_item
+            self._work_area = work_area
+            # tooltip, subtitle and sort key are only built when first requested:
+            self._tooltip = None
+            self._subtitle = None
+            self._sort_key = None
+
+        @property
+        def file_item(self):
+            """
+            :returns:    The file item this model item represents
+            """
+            return self._file_item
+
+        @property
+        def work_area(self):
+            """
+            :returns:    The work area the file belongs to
+            """
+            return self._work_area
+
+        def clear_display_cache(self):
+            """
+            Drop the cached tooltip, subtitle and sort key so that they are rebuilt when next requested.
+            """
+            self._tooltip = None
+            self._subtitle = None
+            self._sort_key = None
+
+        def emitDataChanged(self):
+            """
+            Overriden from base class.  Drops the cached tooltip, subtitle and sort key before emitting the
+            dataChanged signal for the item.
+            """
+            self.clear_display_cache()
+            ArrayFileModel._BaseModelItem.emitDataChanged(self)
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == QtCore.Qt.DisplayRole:
+                return "%s, v%0d" % (self._file_item.name, self._file_item.version)
+            elif role == QtCore.Qt.ToolTipRole:
+                if self._tooltip is None:
+                    self._tooltip = self._file_item.format_tooltip()
+                return self._tooltip
+            elif role == ArrayFileModel.SUBTITLE_ROLE:
+                if self._subtitle is None:
+                    self._subtitle = self._file_item.format_subtitle()
+                return self._subtitle
+            elif role == ArrayFileModel.SORT_ROLE:
+                if self._sort_key is None:
+                    # files are sorted after any folders:
+                    self._sort_key = "1|%s" % self._file_item.get_sort_key()
+                return self._sort_key
+            elif role == ArrayFileModel.FILE_ITEM_ROLE:
+                return self._file_item
+            elif role == ArrayFileModel.WORK_AREA_ROLE:
+                return self._work_area
+            elif role == ArrayFileModel.LATEST_VERSIONS_ROLE:
+                group_item = self._parent
+                if isinstance(group_item, ArrayFileModel._GroupModelItem):
+                    return group_item.latest_versions.get(self._file_item.key)
+                return None
+            else:
+                # just return the default implementation:
+                return ArrayFileModel._BaseModelItem.data(self, role)
+
+        def setData(self, value, role):
+            """
+            Set the data on the item for the specified role
+
+            :param value:   The value to set the data with
+            :param role:    The role to set the data for
+            """
+            if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole, ArrayFileModel.SUBTITLE_ROLE,
+                        ArrayFileModel.LATEST_VERSIONS_ROLE, ArrayFileModel.SORT_ROLE):
+                # do nothing as these can't be set!
+                pass
+            elif role == ArrayFileModel.FILE_ITEM_ROLE:
+                self._file_item = value
+                self.emitDataChanged()
+            elif role == ArrayFileModel.WORK_AREA_ROLE:
+                self._work_area = value
+                self.emitDataChanged()
+            else:
+                # call the base implementation:
+                ArrayFileModel._BaseModelItem.setData(self, value, role)
+
+    class _FolderModelItem(_BaseModelItem):
+        """
+        Model item that represents a folder in the model.  These are used when a group has entity
+        children that need to be represented in the model.
+        """
+        __slots__ = ("_entity",)
+
+        def __init__(self, name, entity):
+            """
+            :param name:    The name to use for the model item display role
+            :param entity:  A Shotgun entity dictionary for the entity that this folder item represents
+            """
+            ArrayFileModel._BaseModelItem.__init__(self, typ=ArrayFileModel.FOLDER_NODE_TYPE, text=name)
+            self._entity = entity
+
+        @property
+        def entity(self):
+            """
+            :returns:   An entity dictionary representing the entity represented by this item
+            """
+            return self._entity
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == ArrayFileModel.SORT_ROLE:
+                # folders are sorted alphabetically before any files:
+                return "0|%s" % (self.text() or "").lower()
+            else:
+                # just return the default implementation:
+                return ArrayFileModel._BaseModelItem.data(self, role)
+
+    class _GroupModelItem(_BaseModelItem):
+        """
+        Model item that represents a group in the model.  A group is a per-user, per-entity item that contains
+        the files found for the group as well as any additional child entities.
+        """
+        __slots__ = ("_search_status", "_search_msg", "_key", "_work_area", "_latest_versions")
+
+        def __init__(self, name, key, work_area=None):
+            """
+            :param name:        The name to use for the model items display role
+            :param key:         A unique key representing this group
+            :param work_area:   A WorkArea instance that this group represents
+            """
+            ArrayFileModel._BaseModelItem.__init__(self, typ=ArrayFileModel.GROUP_NODE_TYPE, text=name)
+
+            self._search_status = ArrayFileModel.SEARCH_COMPLETED
+            self._search_msg = ""
+            self._key = key
+            self._work_area = work_area
+            self._latest_versions = {}# file key:(latest work file version, latest publish version)
+
+        @property
+        def key(self):
+            """
+            :returns:   The unique key for this group
+            """
+            return self._key
+
+        @property
+        def latest_versions(self):
+            """
+            :returns:   Dictionary of the latest work file and publish versions for each file in this group
+            """
+            return self._latest_versions
+
+        # @property
+        def _get_work_area(self):
+            """
+            :returns:   The WorkArea instance associated with this item
+            """
+            return self._work_area
+
+        # @work_area.setter
+        def _set_work_area(self, work_area):
+            """
+            Set the work area associated with this item
+
+            :param work_area:   The WorkArea to associate with this item
+            """
+            self._work_area = work_area
+            self.emitDataChanged()
+
+        work_area = property(_get_work_area, _set_work_area)
+
+        def set_search_status(self, status, msg=None):
+            """
+            Set the search status for this item and emit a dataChanged signal to indicate it's changed.
+
+            :param status:  The search status (see the search status enumeration in FileModelBase) to update
+                            this item with
+            :param msg:     The status message if any to update this item with
+            """
+            self._search_status = status
+            self._search_msg = msg
+            self.emitDataChanged()
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == ArrayFileModel.SEARCH_STATUS_ROLE:
+                return self._search_status
+            elif role == ArrayFileModel.SEARCH_MSG_ROLE:
+                return self._search_msg
+            elif role == ArrayFileModel.WORK_AREA_ROLE:
+                return self._work_area
+            elif role == ArrayFileModel.SORT_ROLE:
+                # groups are kept in the order they are in the model:
+                return self.row()
+            else:
+                # just return the default implementation:
+                return ArrayFileModel._BaseModelItem.data(self, role)
+
+        def setData(self, value, role):
+            """
+            Set the data on the item for the specified role
+
+            :param value:   The value to set the data with
+            :param role:    The role to set the data for
+            """
+            if role == ArrayFileModel.SEARCH_STATUS_ROLE:
+                self._search_status = value
+                self.emitDataChanged()
+            elif role == ArrayFileModel.SEARCH_MSG_ROLE:
+                self._search_msg = value
+                self.emitDataChanged()
+            elif role == ArrayFileModel.WORK_AREA_ROLE:
+                self._work_area = value
+                self.emitDataChanged()
+            else:
+                # call the base implementation:
+                ArrayFileModel._BaseModelItem.setData(self, value, role)
+
+    # Signal emitted when sandboxes are used, but before we know which ones
+    uses_user_sandboxes = QtCore.Signal(object) # Work area that uses sandboxes.
+    # Signal emitted when the sandbox_users_found when users were found in the sandbox.
+    sandbox_users_found = QtCore.Signal(list)# list of users
+    # Signal emitted when all in-progress searches have completed.
+    searches_completed = QtCore.Signal()
+
+    def __init__(self, bg_task_manager, parent):
+        """
+        :param bg_task_manager: A BackgroundTaskManager instance that will be used for all background/threaded
+                                work that needs undertaking
+        :param parent:          The parent QObject for this instance
+        """
+        QtCore.QAbstractItemModel.__init__(self, parent)
+
+        # the invisible root item that all groups are parented under:
+        self._root_item = ArrayFileModel._BaseModelItem(typ=None)
+        self._root_item._model = self
+
+        FileModelBase.__init__(self, bg_task_manager)
+
+    # ------------------------------------------------------------------------------------------
+    # QStandardItemModel compatible interface
+
+    def invisibleRootItem(self):
+        """
+        :returns:   The invisible root item of the model
+        """
+        return self._root_item
+
+    def appendRow(self, item):
+        """
+        :param item:    The item to append as the last top level item in the model
+        """
+        self._root_item.appendRow(item)
+
+    def insertRow(self, row, item):
+        """
+        :param row:     The row to insert the item at
+        :param item:    The item to insert as a top level item in the model
+        """
+        self._root_item.insertRow(row, item)
+
+    def itemFromIndex(self, index):
+        """
+        :param index:   The QModelIndex to find the item for
+        :returns:       The model item for the index or None if the index is invalid
+        """
+        if not index.isValid():
+            return None
+        return index.internalPointer()
+
+    def indexFromItem(self, item):
+        """
+        :param item:    The model item to find the index for
+        :returns:       The QModelIndex for the item
+        """
+        return item.index()
+
+    # ------------------------------------------------------------------------------------------
+    # QAbstractItemModel overrides
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        """
+        Overriden from base class.
+
+        :param row:     The row of the index to return
+        :param column:  The column of the index to return
+        :param parent:  The parent QModelIndex of the index to return
+        :returns:       The QModelIndex for the row and column under the parent
+        """
+        parent_item = self.itemFromIndex(parent) if parent.isValid() else self._root_item
+        child_item = parent_item.child(row, column) if parent_item else None
+        if child_item is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, child_item)
+
+    def parent(self, index=None):
+        """
+        Overriden from base class.  Note that if index is None then this returns the parent QObject
+        of the model.
+
+        :param index:   The QModelIndex to return the parent for
+        :returns:       The parent QModelIndex of the index
+        """
+        if index is None:
+            return QtCore.QAbstractItemModel.parent(self)
+
+        item = self.itemFromIndex(index)
+        parent_item = item.parent() if item else None
+        if not parent_item:
+            return QtCore.QModelIndex()
+        return parent_item.index()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """
+        Overriden from base class.
+
+        :param parent:  The parent QModelIndex to return the number of rows for
+        :returns:       The number of rows under the parent
+        """
+        if parent.column() > 0:
+            return 0
+        parent_item = self.itemFromIndex(parent) if parent.isValid() else self._root_item
+        return parent_item.rowCount() if parent_item else 0
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """
+        Overriden from base class.
+
+        :param parent:  The parent QModelIndex to return the number of columns for
+        :returns:       The number of columns under the parent
+        """
+        return 1
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        """
+        Overriden from base class.
+
+        :param parent:  The parent QModelIndex to check
+        :returns:       True if the parent has any children, otherwise False
+        """
+        return self.rowCount(parent) > 0
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """
+        Overriden from base class.
+
+        :param index:   The QModelIndex to return data for
+        :param role:    The role to return data for
+        :returns:       Data for the specified index and role
+        """
+        item = self.itemFromIndex(index)
+        if not item:
+            return None
+        return item.data(role)
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        """
+        Overriden from base class.
+
+        :param index:   The QModelIndex to set data for
+        :param value:   The value to set the data with
+        :param role:    The role to set the data for
+        :returns:       True if the data was set, otherwise False
+        """
+        item = self.itemFromIndex(index)
+        if not item:
+            return False
+        item.setData(value, role)
+        return True
+
+    def flags(self, index):
+        """
+        Overriden from base class.
+
+        :param index:   The QModelIndex to return the flags for
+        :returns:       The item flags for the index
+        """
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    def _item_generator(self, parent_item, item_type=object):
+        """
+        Overriden from base class.  Iterate directly over the children of the parent item rather than
+        looking each one up by row.
+
+        :param parent_item: The parent model item to search under
+        :param item_type:   The class type of the model items to generate
+        :returns:           A generator that yields all child items of the parent that
+                            are of the specified type
+        """
+        # iterate over a copy so that the children can be modified whilst iterating:
+        for child_item in list(parent_item._children):
+            if isinstance(child_item, item_type):
+                yield child_item
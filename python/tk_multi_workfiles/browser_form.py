@@ -21,6 +21,7 @@ from .entity_tree.entity_tree_form import EntityTreeForm
 from .my_tasks.my_tasks_form import MyTasksForm
 from .file_list.file_list_form import FileListForm
 from .file_model import FileModel
+from .searchable_entity_model import SearchableEntityModel
 from .util import value_to_str
 from .ui.browser_form import Ui_BrowserForm
 from .framework_qtwidgets import Breadcrumb
@@ -60,6 +61,11 @@ class BrowserForm(QtGui.QWidget):
         self._entity_tree_forms = []
         self._file_browser_forms = []
 
+        # entity models that are loaded the first time their tab is shown:
+        self._entity_tree_form_models = {}# entity tree form:SearchableEntityModel
+        self._entity_models_to_load = []# models that haven't been loaded yet in tab order
+        self._loading_entity_models = set()# models that are being loaded
+
         # set up the UI
         self._ui = Ui_BrowserForm()
         self._ui.setupUi(self)
@@ -87,6 +93,17 @@ class BrowserForm(QtGui.QWidget):
             for entity_form in self._entity_tree_forms:
                 entity_form.shut_down()
             self._entity_tree_forms = []
+            self._entity_tree_form_models = {}
+            self._entity_models_to_load = []
+            for model in self._loading_entity_models:
+                model.data_refreshed.disconnect(self._on_entity_model_loaded)
+                model.data_refresh_fail.disconnect(self._on_entity_model_loaded)
+            self._loading_entity_models = set()
+
+            if self._file_model:
+                self._file_model.sandbox_users_found.disconnect(self._on_sandbox_users_found)
+                self._file_model.uses_user_sandboxes.disconnect(self._on_uses_user_sandboxes)
+                self._file_model.searches_completed.disconnect(self._load_next_entity_model)
 
             # clean up file forms:
             for file_form in self._file_browser_forms:
@@ -165,9 +182,14 @@ class BrowserForm(QtGui.QWidget):
             self._ui.task_browser_tabs.addTab(self._my_tasks_form, "My Tasks")
             self._my_tasks_form.create_new_task.connect(self.create_new_task)
 
+        # models that weren't loaded when they were built will be loaded when their tab is first shown:
+        self._entity_models_to_load = [model for _, model in entity_models
+                                       if isinstance(model, SearchableEntityModel) and not model.is_loaded]
+
         for caption, model in entity_models:
             # create new entity form:
             entity_form = EntityTreeForm(model, caption, allow_task_creation, [], parent=self)
+            self._entity_tree_form_models[entity_form] = model
             entity_form.entity_selected.connect(self._on_entity_selected)
             self._ui.task_browser_tabs.addTab(entity_form, caption)
             entity_form.create_new_task.connect(self.create_new_task)
@@ -178,6 +200,7 @@ class BrowserForm(QtGui.QWidget):
             self._file_model = file_model
             self._file_model.sandbox_users_found.connect(self._on_sandbox_users_found)
             self._file_model.uses_user_sandboxes.connect(self._on_uses_user_sandboxes)
+            self._file_model.searches_completed.connect(self._load_next_entity_model)
             self._file_model.set_users(self._file_filters.users)
 
             # add an 'all files' tab:
@@ -185,6 +208,11 @@ class BrowserForm(QtGui.QWidget):
             self._add_file_list_form("Working", "Work Files", show_work_files=True, show_publishes=False)
             self._add_file_list_form("Publishes", "Publishes", show_work_files=False, show_publishes=True)
 
+        if self._entity_models_to_load:
+            # the remaining entity models are loaded once the current tab and any file search that is started
+            # for it have finished loading:
+            QtCore.QTimer.singleShot(0, self._load_next_entity_model)
+
     def _add_file_list_form(self, tab_name, search_label, show_work_files, show_publishes):
         """
         Adds a file tab to the browser.
@@ -536,6 +564,54 @@ class BrowserForm(QtGui.QWidget):
         """
         """
         form = self._ui.task_browser_tabs.widget(idx)
+        # make sure the model for the form has been loaded:
+        model = self._entity_tree_form_models.get(form)
+        if model:
+            self._load_entity_model(model)
+
         # retrieve the selection from the form and emit a work-area changed signal:
         selection, breadcrumb_trail = form.get_selection()
         self._on_selected_entity_changed(selection, breadcrumb_trail)
+
+    def _load_entity_model(self, model):
+        """
+        Load an entity model that wasn't loaded when it was built.
+
+        :param model:   The SearchableEntityModel to load
+        """
+        if model not in self._entity_models_to_load:
+            # model has already been loaded!
+            return
+        self._entity_models_to_load.remove(model)
+
+        self._loading_entity_models.add(model)
+        model.data_refreshed.connect(self._on_entity_model_loaded)
+        model.data_refresh_fail.connect(self._on_entity_model_loaded)
+        model.load()
+
+    def _load_next_entity_model(self):
+        """
+        Load the next entity model that hasn't been loaded yet as long as no other entity models are
+        being loaded and the file model isn't searching.  This ensures that loading models for tabs that
+        aren't visible doesn't compete with loading the data the user is looking at.
+        """
+        if not self._entity_models_to_load or self._loading_entity_models:
+            return
+        if self._file_model and self._file_model.is_searching:
+            return
+        self._load_entity_model(self._entity_models_to_load[0])
+
+    def _on_entity_model_loaded(self, *args):
+        """
+        Slot triggered when an entity model that was being loaded has been refreshed from Shotgun,
+        successfully or not.
+        """
+        model = self.sender()
+        if model not in self._loading_entity_models:
+            return
+        self._loading_entity_models.remove(model)
+        model.data_refreshed.disconnect(self._on_entity_model_loaded)
+        model.data_refresh_fail.disconnect(self._on_entity_model_loaded)
+
+        # and move on to the next model:
+        self._load_next_entity_model()
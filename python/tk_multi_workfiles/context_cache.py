@@ -0,0 +1,179 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+App-wide cache of the contexts built for entities and paths.
+"""
+
+import os
+from collections import OrderedDict
+
+import sgtk
+
+from .path_cache_sync import g_path_cache_sync
+from .util import Threaded
+
+
+def get_entity_key(entity):
+    """
+    :param entity:  A Shotgun entity dictionary or None
+    :returns:       A hashable (type, id) tuple for the entity or None
+    """
+    if not entity:
+        return None
+    return (entity.get("type"), entity.get("id"))
+
+
+def get_context_key(context):
+    """
+    Get a hashable key for a context that identifies it by its entities.  The user isn't included as
+    the settings for a context are the same for all users.
+
+    :param context: The Toolkit context to get the key for
+    :returns:       A hashable key for the context or None if there is no context
+    """
+    if not context:
+        return None
+    additional_entities = sorted(get_entity_key(e) for e in (context.additional_entities or []))
+    return (get_entity_key(context.project),
+            get_entity_key(context.entity),
+            get_entity_key(context.step),
+            get_entity_key(context.task),
+            tuple(additional_entities))
+
+
+class ContextCache(Threaded):
+    """
+    Least-recently-used cache of the contexts built for entities and paths.  Contexts are built from
+    the path cache so the cache is cleared whenever the path cache has been synchronized.
+
+    Contexts for files are cached per directory so that all the files in the same directory share
+    the context built for the first of them.
+    """
+
+    # default maximum number of contexts that are cached:
+    DEFAULT_MAX_ENTRIES = 10000
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Construction
+
+        :param max_entries: The maximum number of entity & path contexts to cache
+        """
+        Threaded.__init__(self)
+        self._contexts = OrderedDict()# key:context, least recently used first
+        self._max_entries = max_entries
+        self._sync_count = None
+
+    def context_from_entity(self, entity, wait_for_sync=True):
+        """
+        Get the context for an entity, building it if it isn't in the cache.
+
+        :param entity:          The Shotgun entity dictionary to get the context for
+        :param wait_for_sync:   If True then any path cache synchronization that is in progress is waited
+                                for first.  This should be False when called from the main thread in which
+                                case the context may be out of date if a synchronization is in progress
+        :returns:               The context for the entity
+        """
+        key = ("entity", get_entity_key(entity))
+        return self._get_context(key, lambda app: app.sgtk.context_from_entity_dictionary(entity),
+                                 wait_for_sync)
+
+    def context_from_path(self, path, previous_context=None, is_file=False):
+        """
+        Get the context for a path, building it if it isn't in the cache.
+
+        :param path:                The path to get the context for
+        :param previous_context:    The context to pass to the path resolution, see
+                                    Tank.context_from_path()
+        :param is_file:             True if the path is a file.  Only folders are registered in the path
+                                    cache so the context is cached for the directory the file is in and
+                                    shared by all other files in the same directory
+        :returns:                   The context for the path
+        """
+        if is_file:
+            path = os.path.dirname(path)
+        key = ("path", os.path.normpath(path), get_context_key(previous_context))
+        return self._get_context(key, lambda app: app.sgtk.context_from_path(path, previous_context), True)
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the cache
+        """
+        self._contexts = OrderedDict()
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    def _get_context(self, key, build_fn, wait_for_sync):
+        """
+        Get a context from the cache, building and adding it if it isn't already cached.
+
+        :param key:             The key of the context in the cache
+        :param build_fn:        Function that builds the context, called with the app instance
+        :param wait_for_sync:   If True then wait for any path cache synchronization that is in progress
+                                before building the context
+        :returns:               The context
+        """
+        # contexts are built using the path cache so make sure it's up to date:
+        if wait_for_sync:
+            g_path_cache_sync.wait()
+        sync_count = g_path_cache_sync.sync_count
+
+        context = self._find(key, sync_count)
+        if context is not None:
+            return context
+
+        app = sgtk.platform.current_bundle()
+        context = build_fn(app)
+        if not g_path_cache_sync.is_syncing:
+            # (a context built whilst the path cache is being synchronized may be out of date)
+            self._add(key, context, sync_count)
+        return context
+
+    @Threaded.exclusive
+    def _find(self, key, sync_count):
+        """
+        :param key:         The key of the context to find
+        :param sync_count:  The number of times the path cache has been synchronized - the cache is
+                            cleared if this has changed since the cache was last used
+        :returns:           The cached context marked as the most recently used or None if it isn't in
+                            the cache
+        """
+        if sync_count != self._sync_count:
+            # the path cache has been synchronized since the contexts were built:
+            self._contexts = OrderedDict()
+            self._sync_count = sync_count
+
+        context = self._contexts.pop(key, None)
+        if context is not None:
+            self._contexts[key] = context
+        return context
+
+    @Threaded.exclusive
+    def _add(self, key, context, sync_count):
+        """
+        :param key:         The key to add the context for
+        :param context:     The context to add
+        :param sync_count:  The number of times the path cache had been synchronized when the context
+                            was built.  The context isn't added if the path cache has been synchronized
+                            since
+        """
+        if context is None or sync_count != self._sync_count:
+            return
+        self._contexts.pop(key, None)
+        self._contexts[key] = context
+        if len(self._contexts) > self._max_entries:
+            self._contexts.popitem(last=False)
+
+
+# single global instance of the context cache
+g_context_cache = ContextCache()
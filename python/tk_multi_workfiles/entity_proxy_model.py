@@ -14,6 +14,8 @@ from sgtk.platform.qt import QtCore, QtGui
 from .framework_qtwidgets import HierarchicalFilteringProxyModel
 
 from .util import get_model_str
+from .searchable_entity_model import SearchableEntityModel
+from .lazy_entity_model import LazyEntityModel
 
 class EntityProxyModel(HierarchicalFilteringProxyModel):
     """
@@ -24,13 +26,26 @@ class EntityProxyModel(HierarchicalFilteringProxyModel):
         """
         HierarchicalFilteringProxyModel.__init__(self, parent)
         self._compare_fields = compare_sg_fields
+        self._search_matches = None# set of matching entity ids when the search index is used
+
+    def setSourceModel(self, model):
+        """
+        Overriden base class method to set the source model
+        """
+        prev_model = self.sourceModel()
+        if isinstance(prev_model, (SearchableEntityModel, LazyEntityModel)):
+            prev_model.data_refreshed.disconnect(self._on_source_data_refreshed)
+
+        super(EntityProxyModel, self).setSourceModel(model)
+
+        if isinstance(model, (SearchableEntityModel, LazyEntityModel)):
+            model.data_refreshed.connect(self._on_source_data_refreshed)
 
     def setFilterFixedString(self, pattern):
         """
         Overriden base class method to set the filter fixed string
         """
-        # ensure model is fully loaded before we attempt any searching
-        self.sourceModel().ensure_data_is_loaded()
+        self._prepare_search(QtCore.QRegExp(pattern, self.filterCaseSensitivity(), QtCore.QRegExp.FixedString))
 
         # call base class
         return super(EntityProxyModel, self).setFilterFixedString(pattern)
@@ -39,8 +54,7 @@ class EntityProxyModel(HierarchicalFilteringProxyModel):
         """
         Overriden base class method to set the filter regular expression
         """
-        # ensure model is fully loaded before we attempt any searching
-        self.sourceModel().ensure_data_is_loaded()
+        self._prepare_search(QtCore.QRegExp(reg_exp))
 
         # call base class
         return super(EntityProxyModel, self).setFilterRegExp(reg_exp)
@@ -87,7 +101,13 @@ class EntityProxyModel(HierarchicalFilteringProxyModel):
             # found a match so early out!
             return True
 
-        if self._compare_fields:
+        if self._search_matches is not None:
+            # the search index has already found all matching entities:
+            item = src_idx.model().itemFromIndex(src_idx)
+            sg_data = item.get_sg_data()
+            if sg_data:
+                return sg_data.get("id") in self._search_matches
+        elif self._compare_fields:
             # see if we have sg data:
             item = src_idx.model().itemFromIndex(src_idx)
             sg_data = item.get_sg_data()
@@ -97,6 +117,55 @@ class EntityProxyModel(HierarchicalFilteringProxyModel):
         # default is to not match!
         return False
 
+    def _prepare_search(self, reg_exp):
+        """
+        Prepare the source model to be searched with the specified regular expression.  If the source
+        model can be searched using its search index then only the branches containing matching
+        entities are loaded.  Lazy models are searched by Shotgun in the background and the filter is
+        updated once the search has completed.  Otherwise the entire model is loaded.
+
+        :param reg_exp: The QRegExp that the model is about to be filtered with
+        """
+        self._search_matches = None
+        src_model = self.sourceModel()
+        if not src_model:
+            return
+
+        if reg_exp.isEmpty():
+            # nothing to search for!
+            return
+
+        if isinstance(src_model, LazyEntityModel):
+            # loading the entire tree would defeat the point of the lazy model so only fixed strings
+            # are searched for - other expressions only filter the items that have been loaded:
+            if reg_exp.patternSyntax() == QtCore.QRegExp.FixedString:
+                search_matches = src_model.search(reg_exp.pattern())
+                self._search_matches = search_matches if search_matches is not None else set()
+            return
+
+        if (isinstance(src_model, SearchableEntityModel)
+            and reg_exp.patternSyntax() == QtCore.QRegExp.FixedString):
+            search_index = src_model.get_search_index(self._compare_fields or [])
+            if search_index is not None:
+                self._search_matches = search_index.find(reg_exp.pattern())
+                src_model.load_entities(search_index, self._search_matches)
+                return
+
+        # ensure model is fully loaded before we attempt any searching
+        src_model.ensure_data_is_loaded()
+
+    def _on_source_data_refreshed(self, data_changed=True):
+        """
+        Slot triggered when the source model has been refreshed from Shotgun.  The search index
+        will have been reset so the current search needs to be run again.
+
+        :param data_changed:    True if the data in the source model changed as a result of the refresh
+        """
+        if self._search_matches is None:
+            return
+        self._prepare_search(self.filterRegExp())
+        self.invalidateFilter()
+
     def _sg_data_matches_r(self, sg_data, compare_fields, reg_exp):
         """
         """
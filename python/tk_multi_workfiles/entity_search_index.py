@@ -0,0 +1,146 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Flat search index of the entities in an entity model.
+"""
+
+from .file_search_index import to_search_str
+
+
+def get_sg_value_key(value):
+    """
+    Get a hashable key for a Shotgun field value that can be used to compare values.
+
+    :param value:   The Shotgun field value
+    :returns:       A hashable key for the value
+    """
+    if isinstance(value, dict):
+        return (value.get("type"), value.get("id"))
+    elif isinstance(value, list):
+        return tuple(get_sg_value_key(v) for v in value)
+    return value
+
+
+class EntitySearchIndex(object):
+    """
+    Flat index of all the entities in an entity model that can be searched without the model's tree
+    having to be fully loaded.  The index contains a pre-computed searchable string for each entity
+    together with the path of hierarchy values from the root of the tree to the entity.
+    """
+
+    def __init__(self, sg_entities, hierarchy, compare_fields):
+        """
+        Construction
+
+        :param sg_entities:     List of Shotgun entity dictionaries represented by the entity model
+        :param hierarchy:       List of the fields used to build the hierarchy in the entity model
+        :param compare_fields:  The (possibly nested) list of Shotgun fields that entities should be
+                                matched on in addition to their hierarchy
+        """
+        self._texts = {}# entity id:search text
+        self._paths = {}# entity id:tuple of hierarchy value keys from the root to the entity's parent
+
+        for sg_entity in sg_entities:
+            entity_id = sg_entity.get("id")
+            if entity_id is None:
+                continue
+
+            values = []
+            path = []
+            for field in hierarchy:
+                value = sg_entity.get(field)
+                path.append(get_sg_value_key(value))
+                values.extend(EntitySearchIndex._get_display_values(value))
+            EntitySearchIndex._get_compare_values_r(sg_entity, compare_fields, values)
+
+            # values are separated by a newline so that the search text can't match across them:
+            self._texts[entity_id] = u"\n".join(to_search_str(v) for v in values)
+            self._paths[entity_id] = tuple(path[:-1])
+
+        self._last_query = None
+        self._last_matches = None
+
+    def find(self, query):
+        """
+        Find all entities whose hierarchy or compare fields contain the query.  The search is
+        case-insensitive.
+
+        :param query:   The string to search for
+        :returns:       A set containing the ids of all matching entities
+        """
+        query = to_search_str(query)
+        if query == self._last_query:
+            return self._last_matches
+
+        candidates = self._texts.iterkeys()
+        if self._last_query is not None and query.startswith(self._last_query):
+            # this search extends the last search so the matches must be a subset of the last matches:
+            candidates = self._last_matches
+        matches = set(entity_id for entity_id in candidates if query in self._texts[entity_id])
+
+        self._last_query = query
+        self._last_matches = matches
+        return matches
+
+    def get_path(self, entity_id):
+        """
+        :param entity_id:   The id of the entity to get the path for
+        :returns:           A tuple of the hierarchy value keys (see get_sg_value_key()) from the root of
+                            the tree to the parent of the entity or None if the entity isn't in the index
+        """
+        return self._paths.get(entity_id)
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    @staticmethod
+    def _get_display_values(value):
+        """
+        :param value:   A Shotgun field value
+        :returns:       A list of the values that are displayed in the tree for the field value
+        """
+        if isinstance(value, dict):
+            return [value["name"]] if value.get("name") else []
+        elif isinstance(value, list):
+            values = []
+            for v in value:
+                values.extend(EntitySearchIndex._get_display_values(v))
+            return values
+        elif value is None:
+            return []
+        return [value]
+
+    @staticmethod
+    def _get_compare_values_r(sg_data, compare_fields, values):
+        """
+        Recursively collect the values of the compare fields from the Shotgun data.
+
+        :param sg_data:         The Shotgun data dictionary to collect the values from
+        :param compare_fields:  The (possibly nested) list of fields to collect, e.g.
+                                ["one", "two", {"three":"four", "five":["six", "seven"]}]
+        :param values:          The list the values are appended to
+        """
+        if isinstance(compare_fields, list):
+            for cf in compare_fields:
+                if isinstance(cf, dict):
+                    # e.g. {"three":"four", "five":["six", "seven"]}
+                    for key, value in cf.iteritems():
+                        data = sg_data.get(key)
+                        if data:
+                            EntitySearchIndex._get_compare_values_r(data, value, values)
+                else:
+                    # e.g. "one"
+                    EntitySearchIndex._get_compare_values_r(sg_data, cf, values)
+        elif compare_fields:
+            # e.g. "one"
+            val = sg_data.get(compare_fields)
+            if val != None:
+                values.append(val)
@@ -71,6 +71,8 @@ class EntityTreeForm(QtGui.QWidget):
         self._entity_to_select = None
         # keep track of the currently selected item:
         self._current_item_ref = None
+        # True if the children of the selected item are being loaded in the background:
+        self._selection_load_pending = False
 
         # keep track of expanded items as items in the tree are expanded/collapsed.  We
         # also want to auto-expand root items the first time they appear so track them
@@ -163,8 +165,15 @@ class EntityTreeForm(QtGui.QWidget):
             if self._ui.entity_tree.selectionModel():
                 self._ui.entity_tree.selectionModel().clear()
 
-            # detach the filter model from the view:
+            # disconnect from the entity model as it may outlive this form:
             view_model = self._ui.entity_tree.model()
+            entity_model = get_source_model(view_model) if view_model else None
+            if entity_model:
+                entity_model.modelAboutToBeReset.disconnect(self._model_about_to_reset)
+                entity_model.modelReset.disconnect(self._model_reset)
+                entity_model.data_refreshed.disconnect(self._on_data_refreshed)
+
+            # detach the filter model from the view:
             if view_model:
                 self._ui.entity_tree.setModel(None)
                 if isinstance(view_model, EntityTreeProxyModel):
@@ -344,8 +353,10 @@ class EntityTreeForm(QtGui.QWidget):
         if not idx.isValid():
             return {}
 
-        # first, ensure that all child data has been loaded
-        idx.model().ensure_data_is_loaded(idx)
+        # first, ensure that all child data has been loaded - models that load it in the background
+        # return False in which case the selection is emitted again once it has been loaded:
+        if idx.model().ensure_data_is_loaded(idx) is False:
+            self._selection_load_pending = True
 
         item = self._item_from_index(idx)
         entity_model = get_source_model(idx.model())
@@ -565,6 +576,14 @@ class EntityTreeForm(QtGui.QWidget):
         prev_selected_item = self._reset_selection()
         self._update_selection(prev_selected_item)
 
+        if self._selection_load_pending and prev_selected_item is not None:
+            selected_item = self._get_selected_item()
+            if id(selected_item) == id(prev_selected_item):
+                # the children of the selection may have been loaded so emit the selection again:
+                self._selection_load_pending = False
+                selection_details, breadcrumbs = self.get_selection()
+                self.entity_selected.emit(selection_details, breadcrumbs)
+
     def _expand_root_rows(self):
         """
         Expand all root rows in the Tree if they have never been expanded
@@ -9,6 +9,7 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import stat
 from datetime import datetime
 import copy
 import time
@@ -20,6 +21,12 @@ from sgtk import TankError
 
 from .file_item import FileItem
 from .user_cache import g_user_cache
+from .context_cache import g_context_cache
+from .work_file_index import g_work_file_index
+from .template_walker import TemplateWalker
+from .stat_cache import StatCache
+from .template_field_extractor import g_field_extractor_cache
+from .file_key import g_file_key_builders
 
 from .sg_published_files_model import SgPublishedFilesModel
 
@@ -163,8 +170,11 @@ class FileFinder(QtCore.QObject):
         # get list of fields that should be ignored when comparing work files:
         version_compare_ignore_fields = self._app.get_setting("version_compare_ignore_fields", [])    
 
+        # each file is only stat'ed once during the search:
+        stat_cache = StatCache()
+
         # find all work & publish files and filter out any that should be ignored:
-        work_files = self._find_work_files(context, work_template, version_compare_ignore_fields)
+        work_files = self._find_work_files(context, work_template, version_compare_ignore_fields, stat_cache)
         filtered_work_files = self._filter_work_files(work_files, valid_file_extensions)
         
         published_files = self._find_publishes(publish_filters)
@@ -180,7 +190,9 @@ class FileFinder(QtCore.QObject):
                                                         context, 
                                                         name_map, 
                                                         version_compare_ignore_fields, 
-                                                        filter_file_key)
+                                                        filter_file_key,
+                                                        work_files,
+                                                        stat_cache)
         work_file_items = dict([(k, FileItem(**kwargs)) for k, kwargs in work_file_item_details.iteritems()])
 
         publish_item_details = self._process_publish_files(filtered_published_files, 
@@ -189,7 +201,8 @@ class FileFinder(QtCore.QObject):
                                                          context, 
                                                          name_map, 
                                                          version_compare_ignore_fields,
-                                                         filter_file_key)
+                                                         filter_file_key,
+                                                         stat_cache)
         publish_items = dict([(k, FileItem(**kwargs)) for k, kwargs in publish_item_details.iteritems()])
 
         # and aggregate the results:
@@ -206,24 +219,38 @@ class FileFinder(QtCore.QObject):
         return file_items
 
     def _process_work_files(self, work_files, work_template, context, name_map, version_compare_ignore_fields, 
-                          filter_file_key=None):
+                          filter_file_key=None, work_file_entries=None, stat_cache=None):
         """
         """
         files = {}
+        work_file_entries = work_file_entries or {}
+        stat_cache = stat_cache or StatCache()
+
+        # extract the fields for all work files that weren't already parsed when they were found in
+        # a single batch:
+        extractor = g_field_extractor_cache.get(work_template)
+        parsed_fields = extractor.get_fields_for_paths([wf["path"] for wf in work_files 
+                                                        if not work_file_entries.get(wf["path"])])
+        key_builder = g_file_key_builders.get(work_template, version_compare_ignore_fields)
         
         for work_file in work_files:
             
             # always have the work path:
             work_path = work_file["path"]
+
+            # the file may already have been stat'ed and parsed when it was found:
+            found_entry = work_file_entries.get(work_path)
             
             # get fields for work file:
-            wf_fields = work_template.get_fields(work_path)
+            wf_fields = found_entry[0] if found_entry else parsed_fields.get(work_path)
+            if wf_fields is None:
+                # the path doesn't match the work template!
+                continue
             
             # build the unique file key for the work path.  All files that share the same key are considered
             # to be different versions of the same file.
             #
-            file_key = FileItem.build_file_key(wf_fields, work_template, 
-                                               version_compare_ignore_fields)
+            file_key = key_builder.build(wf_fields)
             if filter_file_key and file_key != filter_file_key:
                 # we can ignore this file completely!
                 continue
@@ -242,7 +269,7 @@ class FileFinder(QtCore.QObject):
                     file_details["task"] = context.task
                 else:
                     # try to create a context from the path and see if that contains a task:
-                    wf_ctx = self._app.sgtk.context_from_path(work_path, context)
+                    wf_ctx = g_context_cache.context_from_path(work_path, context, is_file=True)
                     if wf_ctx and wf_ctx.task:
                         file_details["task"] = wf_ctx.task 
 
@@ -252,17 +279,20 @@ class FileFinder(QtCore.QObject):
             # entity:
             file_details["entity"] = context.entity
 
-            # file modified details:
-            if not file_details["modified_at"]:
-                try:
-                    modified_at = os.path.getmtime(work_path)
-                    file_details["modified_at"] = datetime.fromtimestamp(modified_at, tz=sg_timezone.local)
-                except OSError:
-                    # ignore OSErrors as it's probably a permissions thing!
-                    pass
+            # file modified details - these come from the stat result returned when the file was
+            # found if possible, otherwise the file is stat'ed once for both:
+            if found_entry:
+                modified_at, modified_uid = found_entry[1], found_entry[2]
+            else:
+                st = stat_cache.stat(work_path)
+                modified_at, modified_uid = (st.st_mtime, st.st_uid) if st else (None, None)
+
+            if not file_details["modified_at"] and modified_at is not None:
+                # the FileItem stores the timestamp and only converts it to a datetime when needed:
+                file_details["modified_at"] = modified_at
 
-            if not file_details["modified_by"]:
-                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(work_path)
+            if not file_details["modified_by"] and modified_uid is not None:
+                file_details["modified_by"] = g_user_cache.get_user_details_for_uid(modified_uid)
 
             # make sure all files with the same key have the same name:
             file_details["name"] = name_map.get_name(file_key, work_path, work_template, wf_fields)
@@ -280,13 +310,19 @@ class FileFinder(QtCore.QObject):
         return files
         
     def _process_publish_files(self, sg_publishes, publish_template, work_template, context, name_map, 
-                             version_compare_ignore_fields, filter_file_key=None):
+                             version_compare_ignore_fields, filter_file_key=None, stat_cache=None):
         """
         """
         files = {}
+        stat_cache = stat_cache or StatCache()
         
         # and add in publish details:
         ctx_fields = context.as_template_fields(work_template)
+
+        # extract the fields for all publishes in a single batch:
+        extractor = g_field_extractor_cache.get(publish_template)
+        parsed_fields = extractor.get_fields_for_paths([sg_publish["path"] for sg_publish in sg_publishes])
+        key_builder = g_file_key_builders.get(work_template, version_compare_ignore_fields)
                     
         for sg_publish in sg_publishes:
             file_details = {}
@@ -298,7 +334,10 @@ class FileFinder(QtCore.QObject):
             # The order is important as it ensures that the user is correct if the 
             # publish file is in a user sandbox but we also need to be careful not
             # to overrwrite fields that are being ignored when comparing work files
-            publish_fields = publish_template.get_fields(publish_path)
+            publish_fields = parsed_fields.get(publish_path)
+            if publish_fields is None:
+                # the path doesn't match the publish template!
+                continue
             wp_fields = publish_fields.copy()
             for k, v in ctx_fields.iteritems():
                 if k not in version_compare_ignore_fields:
@@ -306,8 +345,7 @@ class FileFinder(QtCore.QObject):
             
             # build the unique file key for the publish path.  All files that share the same key are considered
             # to be different versions of the same file.
-            file_key = FileItem.build_file_key(wp_fields, work_template, 
-                                               version_compare_ignore_fields)
+            file_key = key_builder.build(wp_fields)
             if filter_file_key and file_key != filter_file_key:
                 # we can ignore this file completely!
                 continue
@@ -333,14 +371,10 @@ class FileFinder(QtCore.QObject):
             file_details["entity"] = context.entity
         
             # local file modified details:
-            if os.path.exists(publish_path):
-                try:
-                    modified_at = os.path.getmtime(publish_path)
-                    file_details["modified_at"] = datetime.fromtimestamp(modified_at, tz=sg_timezone.local)
-                except OSError:
-                    # ignore OSErrors as it's probably a permissions thing!
-                    pass
-                file_details["modified_by"] = g_user_cache.get_file_last_modified_user(publish_path)
+            st = stat_cache.stat(publish_path)
+            if st:
+                file_details["modified_at"] = st.st_mtime
+                file_details["modified_by"] = g_user_cache.get_user_details_for_uid(st.st_uid)
             else:
                 # just use the publish info
                 file_details["modified_at"] = sg_publish.get("published_at")
@@ -374,6 +408,8 @@ class FileFinder(QtCore.QObject):
     def _filter_publishes(self, sg_publishes, publish_template, valid_file_extensions, context):
         """
         """
+        extractor = g_field_extractor_cache.get(publish_template)
+
         # build list of publishes to send to the filter_publishes hook:
         hook_publishes = [{"sg_publish":sg_publish} for sg_publish in sg_publishes]
         
@@ -409,7 +445,7 @@ class FileFinder(QtCore.QObject):
                 continue
     
             # make sure path matches the publish template:            
-            if not publish_template.validate(path):
+            if not extractor.validate(path):
                 continue
     
             # build file details for this publish:
@@ -438,7 +474,8 @@ class FileFinder(QtCore.QObject):
         return published_files
     
         
-    def _find_work_files(self, context, work_template, version_compare_ignore_fields):
+    def _find_work_files(self, context, work_template, version_compare_ignore_fields, stat_cache=None,
+                         found_callback=None):
         """
         Find all work files for the specified context and work template
         
@@ -446,8 +483,15 @@ class FileFinder(QtCore.QObject):
         :param work_template:                   The work template to match found files against
         :param version_compare_ignore_fields:   List of fields to ignore when comparing files in order to find 
                                                 different versions of the same file
-        :returns:                               List of dictionaries, each one containing the details
-                                                of an individual work file        
+        :param stat_cache:                      Optional StatCache that any stat results returned when
+                                                listing the work area will be added to
+        :param found_callback:                  Optional callable that is called with a dictionary
+                                                {path:entry} of work files each time more work files
+                                                are found.  This is called from the calling thread.
+        :returns:                               Dictionary {path:entry} containing all the work files
+                                                found.  Each entry is a tuple (fields, mtime, uid) for
+                                                the file or None if the details for the file aren't
+                                                known yet.
         """
         # find work files that match the current work template:
         work_fields = []
@@ -458,7 +502,7 @@ class FileFinder(QtCore.QObject):
             # when the context object does not have any corresponding objects on 
             # disk / in the path cache. In this case, we cannot continue with any
             # file system resolution, so just exit early insted.
-            return []
+            return {}
 
         # build list of fields to ignore when looking for files:
         skip_fields = list(version_compare_ignore_fields or [])
@@ -471,13 +515,41 @@ class FileFinder(QtCore.QObject):
         # Find all versions so skip the 'version' key if it's present:
         skip_fields += ["version"]
 
-        # find paths:
+        # use the persistent work file index if it's enabled - this only re-lists directories that
+        # have changed since the work area was last searched:
+        if self._app.get_setting("use_work_file_index", False):
+            work_file_entries = g_work_file_index.find_work_files(work_template, context, work_fields, skip_fields)
+            if work_file_entries is not None:
+                if found_callback:
+                    found_callback(work_file_entries)
+                return work_file_entries
+
+        # walk the work area to find all files matching the work template:
+        def _on_dir_found(found_paths):
+            """
+            Add the stat results for the paths found in a directory to the stat cache and pass
+            them on to the callback
+            """
+            if stat_cache:
+                for path, _, st in found_paths:
+                    stat_cache.add(path, st)
+            if found_callback:
+                found_callback(self._work_file_entries_from_paths(found_paths))
+
+        found_paths = TemplateWalker().walk(work_template, work_fields, skip_fields, _on_dir_found)
+        if found_paths is not None:
+            return self._work_file_entries_from_paths(found_paths)
+
+        # the work template can't be walked from the context so fall back to a regular search:
         work_file_paths = self._app.sgtk.paths_from_template(work_template, 
                                                               work_fields, 
                                                               skip_fields, 
                                                               skip_missing_optional_keys=True)
 
-        return work_file_paths
+        work_file_entries = dict.fromkeys(work_file_paths)
+        if found_callback:
+            found_callback(work_file_entries)
+        return work_file_entries
 
         # paths_from_template may have returned additional files that we don't want (aren't valid within this
         # work area) if any of the fields were populated by the context.  Filter the list to remove these
@@ -502,8 +574,22 @@ class FileFinder(QtCore.QObject):
         
         return work_file_paths
         
+    def _work_file_entries_from_paths(self, found_paths):
+        """
+        Convert the paths found by the TemplateWalker into work file entries, skipping any directories.
+
+        :param found_paths: List of (path, fields, stat result) tuples as returned by the TemplateWalker
+        :returns:           Dictionary {path:(fields, mtime, uid)} containing an entry for each work file
+        """
+        return dict((path, (fields, st.st_mtime, st.st_uid)) 
+                    for path, fields, st in found_paths if not stat.S_ISDIR(st.st_mode))
+
     def _filter_work_files(self, work_file_paths, valid_file_extensions):
         """
+        :param work_file_paths:         The work file paths to filter, e.g. as returned by _find_work_files()
+        :param valid_file_extensions:   List of file extensions that work files must have to be kept.
+        :returns:                       List of dictionaries, each one containing the details of an
+                                        individual work file
         """
         # build list of work files to send to the filter_work_files hook:
         hook_work_files = [{"work_file":{"path":path}} for path in work_file_paths]
@@ -565,6 +651,7 @@ class AsyncFileFinder(FileFinder):
             self.aborted = False
 
             self.name_map = FileFinder._FileNameMap()
+            self.stat_cache = StatCache()
 
             self.construct_work_area_task = None
             self.resolve_work_area_task = None
@@ -579,10 +666,14 @@ class AsyncFileFinder(FileFinder):
     work_area_found = QtCore.Signal(object, object)
     work_area_resolved = QtCore.Signal(object, object) # search_id, WorkArea
     files_found = QtCore.Signal(object, object, object) # search_id, file list, WorkArea
+    files_batch_found = QtCore.Signal(object, object, object) # search_id, file list, WorkArea
     publishes_found = QtCore.Signal(object, object, object) # search_id, file list, WorkArea
     search_failed = QtCore.Signal(object, object) # search_id, message
     search_completed = QtCore.Signal(object) # search_id
 
+    # internal signal emitted from a background task when a batch of work items is ready:
+    _work_items_batch_ready = QtCore.Signal(object, object, object) # search_id, work item args, WorkArea
+
     def __init__(self, bg_task_manager, parent=None):
         """
         """
@@ -596,6 +687,10 @@ class AsyncFileFinder(FileFinder):
         self._bg_task_manager.task_failed.connect(self._on_background_task_failed)
         self._bg_task_manager.task_group_finished.connect(self._on_background_search_finished)
 
+        # batches of work items are emitted from background tasks so make sure they are always
+        # handled in the main thread:
+        self._work_items_batch_ready.connect(self._on_work_items_batch_ready, QtCore.Qt.QueuedConnection)
+
     def shut_down(self):
         """
         """
@@ -687,6 +782,9 @@ class AsyncFileFinder(FileFinder):
         """
         """
 
+        # work files are found in batches if a batch size is set:
+        batch_size = self._app.get_setting("work_files_batch_size", 0)
+
         # 2a. Add tasks to find and filter work files:
         for user in search.users:
             user_id = user["id"] if user else None
@@ -695,11 +793,25 @@ class AsyncFileFinder(FileFinder):
             user_work_area = work_area.create_copy_for_user(user) if user else work_area
             search.user_work_areas[user_id] = user_work_area
 
+            if batch_size > 0:
+                # find, filter and build work items in a single task that emits them in batches:
+                find_work_items_task = self._bg_task_manager.add_task(self._task_find_work_items_in_batches,
+                                                                      group=search.id,
+                                                                      priority=AsyncFileFinder._FIND_FILES_PRIORITY,
+                                                                      task_kwargs = {"environment":user_work_area,
+                                                                                     "name_map":search.name_map,
+                                                                                     "stat_cache":search.stat_cache,
+                                                                                     "search_id":search.id,
+                                                                                     "batch_size":batch_size})
+                search.find_work_files_tasks.add(find_work_items_task)
+                continue
+
             # find work files:
             find_work_files_task = self._bg_task_manager.add_task(self._task_find_work_files, 
                                                                   group=search.id,
                                                                   priority=AsyncFileFinder._FIND_FILES_PRIORITY,
-                                                                  task_kwargs = {"environment":user_work_area})
+                                                                  task_kwargs = {"environment":user_work_area,
+                                                                                 "stat_cache":search.stat_cache})
 
             # filter work files:
             filter_work_files_task = self._bg_task_manager.add_task(self._task_filter_work_files,
@@ -714,7 +826,8 @@ class AsyncFileFinder(FileFinder):
                                                                      priority=AsyncFileFinder._FIND_FILES_PRIORITY,
                                                                      upstream_task_ids = [filter_work_files_task],
                                                                      task_kwargs = {"environment":user_work_area,
-                                                                                    "name_map":search.name_map})
+                                                                                    "name_map":search.name_map,
+                                                                                    "stat_cache":search.stat_cache})
             search.find_work_files_tasks.add(process_work_items_task)
 
     def _begin_search_process_publishes(self, search, sg_publishes):
@@ -739,7 +852,8 @@ class AsyncFileFinder(FileFinder):
                                                                         priority=AsyncFileFinder._FIND_PUBLISHES_PRIORITY,
                                                                         upstream_task_ids = [filter_publishes_task],
                                                                         task_kwargs = {"environment":user_work_area,
-                                                                                       "name_map":search.name_map})
+                                                                                       "name_map":search.name_map,
+                                                                                       "stat_cache":search.stat_cache})
 
             search.find_publishes_tasks.add(process_publish_items_task)
 
@@ -826,6 +940,15 @@ class AsyncFileFinder(FileFinder):
             files = [FileItem(**kwargs) for kwargs in work_item_args]
             self.files_found.emit(search_id, files, work_area)
 
+    def _on_work_items_batch_ready(self, search_id, work_item_args, work_area):
+        """
+        Runs in main thread
+        """
+        if search_id not in self._searches:
+            return
+        files = [FileItem(**kwargs) for kwargs in work_item_args]
+        self.files_batch_found.emit(search_id, files, work_area)
+
     def _on_background_task_failed(self, task_id, search_id, msg, stack_trace):
         """
         """
@@ -890,11 +1013,10 @@ class AsyncFileFinder(FileFinder):
     def _task_construct_work_area(self, entity, **kwargs):
         """
         """
-        app = sgtk.platform.current_bundle()
         work_area = None
         if entity:
             # build a context from the search details:
-            context = app.sgtk.context_from_entity_dictionary(entity)
+            context = g_context_cache.context_from_entity(entity)
 
             # build the work area for this context: This may throw, but the background task manager framework
             # will catch
@@ -950,7 +1072,7 @@ class AsyncFileFinder(FileFinder):
                                                         environment.context)
         return {"sg_publishes":filtered_publishes}    
 
-    def _task_process_publish_items(self, sg_publishes, environment, name_map, **kwargs):
+    def _task_process_publish_items(self, sg_publishes, environment, name_map, stat_cache=None, **kwargs):
         """
         """
         publish_items = {}
@@ -961,18 +1083,20 @@ class AsyncFileFinder(FileFinder):
                                                       environment.work_template, 
                                                       environment.context,
                                                       name_map,
-                                                      environment.version_compare_ignore_fields)
+                                                      environment.version_compare_ignore_fields,
+                                                      stat_cache=stat_cache)
         return {"publish_items":publish_items, "environment":environment}
 
-    def _task_find_work_files(self, environment, **kwargs):
+    def _task_find_work_files(self, environment, stat_cache=None, **kwargs):
         """
         """
         #time.sleep(5)
-        work_files = []
+        work_files = {}
         if (environment and environment.context and environment.work_template):
             work_files = self._find_work_files(environment.context, 
                                                environment.work_template, 
-                                               environment.version_compare_ignore_fields)
+                                               environment.version_compare_ignore_fields,
+                                               stat_cache)
         return {"work_files":work_files}
 
 
@@ -982,9 +1106,11 @@ class AsyncFileFinder(FileFinder):
         filtered_work_files = []
         if work_files:
             filtered_work_files = self._filter_work_files(work_files, environment.valid_file_extensions)
-        return {"work_files":filtered_work_files}
+        # pass the found work files on so that any details from the index can be re-used:
+        return {"work_files":filtered_work_files, "work_file_entries":work_files}
 
-    def _task_process_work_items(self, work_files, environment, name_map, **kwargs):
+    def _task_process_work_items(self, work_files, environment, name_map, work_file_entries=None, 
+                                 stat_cache=None, **kwargs):
         """
         """
         work_items = {}
@@ -994,13 +1120,63 @@ class AsyncFileFinder(FileFinder):
                                                   environment.work_template, 
                                                   environment.context,
                                                   name_map,
-                                                  environment.version_compare_ignore_fields)
+                                                  environment.version_compare_ignore_fields,
+                                                  work_file_entries=work_file_entries,
+                                                  stat_cache=stat_cache)
         return {"work_items":work_items, "environment":environment}
 
+    def _task_find_work_items_in_batches(self, environment, name_map, search_id, batch_size, stat_cache=None, 
+                                         **kwargs):
+        """
+        Find, filter and process work files in a single task.  Work items are emitted in batches of
+        up to batch_size items as the work area is scanned and the complete set of work items is
+        returned once the scan has finished.  Note that the filter_work_files hook is run for each
+        batch rather than once for all work files.
+        """
+        work_items = {}
+        if not (environment and environment.context and environment.work_template and name_map):
+            return {"work_items":work_items, "environment":environment}
 
+        def _process_entries(work_file_entries):
+            """
+            Filter and process a batch of found work files
+            """
+            work_files = self._filter_work_files(work_file_entries, environment.valid_file_extensions)
+            batch_items = self._process_work_files(work_files, 
+                                                   environment.work_template, 
+                                                   environment.context,
+                                                   name_map,
+                                                   environment.version_compare_ignore_fields,
+                                                   work_file_entries=work_file_entries,
+                                                   stat_cache=stat_cache)
+            work_items.update(batch_items)
+            return batch_items
+
+        pending_entries = {}
+        def _on_work_files_found(work_file_entries):
+            """
+            Emit all complete batches of work items as soon as they have been found
+            """
+            pending_entries.update(work_file_entries)
+            if len(pending_entries) < batch_size:
+                return
+            pending = pending_entries.items()
+            pending_entries.clear()
+            full_size = len(pending) - len(pending) % batch_size
+            pending_entries.update(pending[full_size:])
+            for i in range(0, full_size, batch_size):
+                batch_items = _process_entries(dict(pending[i:i + batch_size]))
+                if batch_items:
+                    self._work_items_batch_ready.emit(search_id, batch_items.values(), environment)
+
+        self._find_work_files(environment.context, 
+                              environment.work_template, 
+                              environment.version_compare_ignore_fields,
+                              stat_cache,
+                              _on_work_files_found)
+
+        # the remaining work items will be emitted with all the others when the task completes:
+        if pending_entries:
+            _process_entries(pending_entries)
 
-
-
-
-
-
+        return {"work_items":work_items, "environment":environment}
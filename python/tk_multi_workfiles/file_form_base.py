@@ -18,22 +18,12 @@ from itertools import chain
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
-task_manager = sgtk.platform.import_framework("tk-framework-shotgunutils", "task_manager")
-BackgroundTaskManager = task_manager.BackgroundTaskManager
-
-shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
-ShotgunEntityModel = shotgun_model.ShotgunEntityModel
-
-shotgun_globals = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_globals")
-
-from .file_model import FileModel
-from .my_tasks.my_tasks_model import MyTasksModel
+from .model_session import ModelSession, g_model_session
+from .path_cache_sync import g_path_cache_sync
 from .scene_operation import get_current_path, SAVE_FILE_AS_ACTION
 from .file_item import FileItem
 from .work_area import WorkArea
 from .actions.new_task_action import NewTaskAction
-from .user_cache import g_user_cache
-from .util import monitor_qobject_lifetime, resolve_filters
 
 
 class FileFormBase(QtGui.QWidget):
@@ -50,19 +40,20 @@ class FileFormBase(QtGui.QWidget):
         QtGui.QWidget.__init__(self, parent)
 
         self._current_file = None
+        self._path_cache_sync_callback = None
+        self._path_cache_sync_timer = None
 
-        # create a single instance of the task manager that manages all
-        # asynchrounous work/tasks.
-        self._bg_task_manager = BackgroundTaskManager(self, max_threads=8)
-        monitor_qobject_lifetime(self._bg_task_manager, "Main task manager")
-        self._bg_task_manager.start_processing()
-
-        shotgun_globals.register_bg_task_manager(self._bg_task_manager)
+        # use the shared session so that the models can be kept warm between dialog invocations unless
+        # it's already in use by another dialog:
+        self._model_session = g_model_session
+        if not self._model_session.acquire():
+            self._model_session = ModelSession()
+            self._model_session.acquire()
 
-        # build the various models:
-        self._my_tasks_model = self._build_my_tasks_model()
-        self._entity_models = self._build_entity_models()
-        self._file_model = self._build_file_model()
+        self._bg_task_manager = self._model_session.bg_task_manager
+        self._my_tasks_model = self._model_session.my_tasks_model
+        self._entity_models = self._model_session.entity_models
+        self._file_model = self._model_session.file_model
 
         # add refresh action with appropriate keyboard shortcut:
         refresh_action = QtGui.QAction("Refresh", self)
@@ -85,127 +76,21 @@ class FileFormBase(QtGui.QWidget):
         :param event:   Close event
         """
 
-        # clear up the various data models:
-        if self._file_model:
-            self._file_model.destroy()
-        if self._my_tasks_model:
-            self._my_tasks_model.destroy()
-        for _, model in self._entity_models:
-            model.destroy()
-        self._entity_models = []
+        if self._path_cache_sync_timer:
+            self._path_cache_sync_timer.stop()
+        self._path_cache_sync_callback = None
 
-        # and shut down the task manager
-        if self._bg_task_manager:
-            shotgun_globals.unregister_bg_task_manager(self._bg_task_manager)
-            self._bg_task_manager.shut_down()
-            self._bg_task_manager = None
+        # release the models - these will either be kept warm for the next dialog or destroyed:
+        self._file_model = None
+        self._my_tasks_model = None
+        self._entity_models = []
+        self._bg_task_manager = None
+        if self._model_session:
+            self._model_session.release()
+            self._model_session = None
 
         return QtGui.QWidget.closeEvent(self, event)
 
-    def _build_my_tasks_model(self):
-        """
-        Build the My Tasks to be used by the file open/save dialogs.
-
-        :returns:   An instance of MyTasksModel that represents all tasks assigned to the
-                    current user in the current project.  If the current user is not known
-                    or the My Tasks view is disabled in the config then this returns None
-        """
-        if not g_user_cache.current_user:
-            # can't show my tasks if we don't know who 'my' is!
-            return None
-
-        app = sgtk.platform.current_bundle()
-        show_my_tasks = app.get_setting("show_my_tasks", True)
-        if not show_my_tasks:
-            return None
-
-        # get any extra display fields we'll need to retrieve:
-        extra_display_fields = app.get_setting("my_tasks_extra_display_fields")
-        # get the my task filters from the config.
-        my_tasks_filters = app.get_setting("my_tasks_filters")
-
-        # create the model:
-        model = MyTasksModel(app.context.project,
-                             g_user_cache.current_user,
-                             extra_display_fields,
-                             my_tasks_filters,
-                             parent=self,
-                             bg_task_manager=self._bg_task_manager)
-        monitor_qobject_lifetime(model, "My Tasks Model")
-        model.async_refresh()
-        return model
-
-    def _build_entity_models(self):
-        """
-        Build all entity models to be used by the file open/save dialogs.
-
-        :returns:   A list of ShotgunEntityModel instances for each entity (and hierarchy) defined
-                    in the app configuration
-        """
-        app = sgtk.platform.current_bundle()
-
-        entity_models = []
-
-        # set up any defined task trees:
-        entities = app.get_setting("entities", [])
-        for ent in entities:
-            caption = ent.get("caption", None)
-            entity_type = ent.get("entity_type")
-            filters = ent.get("filters", [])
-
-            # resolve any magic tokens in the filter
-            # Note, we always filter on the current project as the app needs templates
-            # in the config to be able to find files and there is currently no way to
-            # get these from a config belonging to a different project!
-            resolved_filters = []
-
-            # we always filter within the current project as it's not currently possible
-            # to manage work files across projects (as we can't access the other project's
-            # templates and folder schema).
-            #
-            # Note that this currently doesn't work for non-project entities!
-            if entity_type == "Project":
-                # special case if the entity type is 'Project' - this will show only
-                # the current project in the tree!
-                resolved_filters.append(["id", "is", app.context.project["id"]])
-            else:
-                # filter entities on the current project:
-                resolved_filters.append(["project", "is", app.context.project])
-
-            resolved_filters.extend(resolve_filters(filters))
-
-            # Get the hierarchy to use for the model for this entity:
-            hierarchy = ent.get("hierarchy")
-            if not hierarchy:
-                app.log_error("No hierarchy found for entity type '%s' - at least one level of "
-                              "hierarchy must be specified in the app configuration.  Skipping!" % entity_type)
-                continue
-
-            # create an entity model for this query:
-            fields = []
-            if entity_type == "Task":
-                # Add so we can filter tasks assigned to the user only on the client side.
-                fields += ["step", "task_assignees"]
-
-            model = ShotgunEntityModel(entity_type, resolved_filters, hierarchy, fields, parent=self,
-                                       bg_task_manager=self._bg_task_manager)
-            monitor_qobject_lifetime(model, "Entity Model")
-            entity_models.append((caption, model))
-            model.async_refresh()
-
-        return entity_models
-
-    def _build_file_model(self):
-        """
-        Build the single file model to be used by the file open/save dialogs.
-
-        :returns:   A FileModel instance that represents all the files found for a set of entities
-                    and users.
-        """
-        file_model = FileModel(self._bg_task_manager, parent=self)
-        monitor_qobject_lifetime(file_model, "File Model")
-        return file_model
-
     def _on_create_new_task(self, entity, step):
         """
         Slot triggered when the user requests that a new task be created.  If a task is created then
@@ -224,12 +109,43 @@ class FileFormBase(QtGui.QWidget):
 
         :param checked:    True if the refresh action is checked - ignored
         """
-        app = sgtk.platform.current_bundle()
-        app.log_debug("Synchronizing remote path cache...")
-        app.sgtk.synchronize_filesystem_structure()
-        app.log_debug("Path cache up to date!")
+        # synchronize the path cache in the background - any searches will wait for it to complete:
+        g_path_cache_sync.start(force=True)
         self._refresh_all_async()
 
+    def _call_after_path_cache_sync(self, callback):
+        """
+        Call a function once the path cache synchronization in progress has finished without blocking
+        the UI.  This replaces any function that is still waiting to be called.
+
+        :param callback:    The function to call or None to cancel the function that is waiting to be
+                            called
+        """
+        self._path_cache_sync_callback = callback
+        if not callback:
+            if self._path_cache_sync_timer:
+                self._path_cache_sync_timer.stop()
+            return
+
+        # poll the synchronization as it runs in a regular thread rather than a Qt one:
+        if not self._path_cache_sync_timer:
+            self._path_cache_sync_timer = QtCore.QTimer(self)
+            self._path_cache_sync_timer.setInterval(250)
+            self._path_cache_sync_timer.timeout.connect(self._on_path_cache_sync_timeout)
+        self._path_cache_sync_timer.start()
+
+    def _on_path_cache_sync_timeout(self):
+        """
+        Slot triggered periodically whilst waiting for the path cache synchronization to finish.
+        """
+        if g_path_cache_sync.is_syncing:
+            return
+        self._path_cache_sync_timer.stop()
+        callback = self._path_cache_sync_callback
+        self._path_cache_sync_callback = None
+        if callback:
+            callback()
+
     def _refresh_all_async(self):
         """
         Asynchrounously refresh all models.
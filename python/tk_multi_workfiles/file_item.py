@@ -11,15 +11,100 @@
 import sgtk
 
 import os
+import time
 from datetime import datetime, timedelta
-import copy
+from tank_vendor.shotgun_api3 import sg_timezone
+
+from .file_key import g_file_key_builders
+from .thumbnail_cache import g_thumbnail_cache
+
+# the unix epoch as a timezone aware datetime:
+_EPOCH = datetime(1970, 1, 1, tzinfo=sg_timezone.utc)
+
+# upper bounds used to invert times and versions in sort keys so that the most recent sort first:
+_MAX_SORT_TIME = 10000000000.0
+_MAX_SORT_VERSION = 9999999999
+
+def _to_timestamp(value):
+    """
+    Convert a date/time to the number of seconds since the epoch.
+
+    :param value:   A datetime instance, a timestamp or None.  Naive datetimes are assumed to be local time
+    :returns:       The timestamp as a float or None if the value was None
+    """
+    if value is None or isinstance(value, (int, long, float)):
+        return value
+    if not isinstance(value, datetime):
+        # not a date/time we can do anything with!
+        return None
+    if value.tzinfo is not None and value.utcoffset() is not None:
+        delta = value - _EPOCH
+        return delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+    return time.mktime(value.timetuple()) + value.microsecond / 1e6
+
+def _from_timestamp(timestamp):
+    """
+    Convert a timestamp to a local timezone aware datetime.
+
+    :param timestamp:   The number of seconds since the epoch or None
+    :returns:           A datetime instance or None if the timestamp was None
+    """
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=sg_timezone.local)
+
+
+class _FileDetails(object):
+    """
+    Compact, read-only storage for the details of either the work file or the publish of a
+    FileItem.  Details that aren't stored in one of the slots are kept in an 'extra' dictionary
+    that is only created if there are any.  Instances are never modified once constructed so they
+    can be shared between FileItem instances.
+    """
+    __slots__ = ("version", "name", "task", "entity", "thumbnail", "editable", "editable_reason",
+                 "modified_at", "modified_by", "published_at", "published_by", "published_file_id",
+                 "description", "extra")
+
+    # map of details dictionary keys to slots where the names differ:
+    _KEY_SLOTS = {"published_file_entity_id":"published_file_id", "publish_description":"description"}
+    _TIMESTAMP_SLOTS = ("modified_at", "published_at")
+
+    def __init__(self, details=None):
+        """
+        Construction
+
+        :param details: Dictionary containing the details to store
+        """
+        for slot in _FileDetails.__slots__:
+            setattr(self, slot, None)
+        for key, value in (details or {}).iteritems():
+            slot = _FileDetails._KEY_SLOTS.get(key, key)
+            if slot in _FileDetails._TIMESTAMP_SLOTS:
+                # dates are stored as timestamps and only converted back to datetimes when needed:
+                value = _to_timestamp(value)
+            if slot != "extra" and slot in _FileDetails.__slots__:
+                setattr(self, slot, value)
+            elif value is not None:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+# shared instance used for FileItems without work file or publish details:
+_NO_DETAILS = _FileDetails()
+
 
 class FileItem(object):
     """
     Encapsulate details about a single version of a work file/publish.  Each instance represents
     a single 'version' but will contain details about both the work/local file and the publish
     for that file if available.
+
+    As there can be tens of thousands of instances, this uses __slots__ and stores all details in
+    compact _FileDetails instances that are shared rather than copied when updating from another
+    FileItem.  Dates are stored as timestamps and only converted to datetimes when requested.
     """
+    __slots__ = ("_key", "_is_local", "_path", "_details", "_is_published", "_publish_path",
+                 "_publish_details", "_thumbnail_path", "_thumbnail_key", "_versions")
 
     @staticmethod
     def build_file_key(fields, template, ignore_fields = None):
@@ -36,7 +121,7 @@ class FileItem(object):
             Notes: 
             - The template key maya_ext has a default value of 'mb'
 
-        Will generate the file key:
+        Will generate a FileKey for the fields:
 
             (('Asset', 'Fred'), ('Step', 'Anm'), ('maya_ext':'mb'), ('name', 'test'), ('sg_asset_type', 'Character'))
 
@@ -53,40 +138,12 @@ class FileItem(object):
                                 Typically this will contain at least 'version' but it 
                                 may also contain other fields (e.g. user initials in
                                 the file name).
-        :returns:               An immutable 'key' that can be used for comparison and
-                                as the key in a dictionary (e.g. a string).
-        """
-        ignore_fields = ignore_fields or []
-        # always want to ignore 'version' and 'extension' if they are present in the fields
-        # dictionary
-        ignore_fields += ["version", "extension"]
-
-        # populate the file key from the fields passed in that are included in
-        # the template, skipping the ignore fields:
-        file_key = {}
-        template_keys = template.keys
-        for name, value in fields.iteritems():
-            if name in ignore_fields:
-                # skip fields that are explicitly ignored
-                continue
-
-            if name not in template_keys:
-                # skip fields that aren't included in the template
-                continue
-
-            file_key[name] = value
-
-        # add in any 'default' values from the template that aren't explicitely ignored
-        # or weren't specified in the input fields:
-        for key in template_keys.values():
-            if (key.name not in ignore_fields
-                and key.default != None
-                and key.name not in file_key):
-                file_key[key.name] = key.default 
-
-        # return an immutable representation of the sorted dictionary:
-        # e.g. (('sequence', 'Sequence01'), ('shot', 'shot_010'), ('name', 'foo'))
-        return tuple(sorted(file_key.iteritems()))
+        :returns:               An immutable, interned FileKey that can be used for comparison
+                                and as the key in a dictionary.
+        """
+        # the key builder for the template works out which fields to include (always ignoring
+        # 'version' and 'extension') and their default values once rather than for every file:
+        return g_file_key_builders.get(template, ignore_fields).build(fields)
 
     def __init__(self, key, is_work_file=False, work_path=None, work_details=None, 
                  is_published=False, publish_path=None, publish_details=None):
@@ -105,16 +162,17 @@ class FileItem(object):
 
         self._is_local = is_work_file
         self._path = work_path
-        self._details = work_details or {}
+        self._details = _FileDetails(work_details) if work_details else _NO_DETAILS
 
         self._is_published = is_published
         self._publish_path = publish_path
-        self._publish_details = publish_details or {}
+        self._publish_details = _FileDetails(publish_details) if publish_details else _NO_DETAILS
 
         self._thumbnail_path = None
-        self._thumbnail_image = None
+        self._thumbnail_key = None
 
-        self._versions = {}
+        # the versions dictionary is shared by all versions of the file:
+        self._versions = None
 
     # ------------------------------------------------------------------------------------------
     # General properties
@@ -132,7 +190,7 @@ class FileItem(object):
         :returns:   The name that identifies this file.  This is either the name specified in
                     the details dictionary or if not specified then the file base name
         """
-        n = self._details.get("name") or self._publish_details.get("name")
+        n = self._details.name or self._publish_details.name
         if not n and self._path:
             n = os.path.basename(self._path)
         return n
@@ -142,21 +200,21 @@ class FileItem(object):
         """
         :returns:   The version number of this file
         """
-        return self._details.get("version") or self._publish_details.get("version", 0)
+        return self._details.version or self._publish_details.version or 0
 
     @property
     def entity(self):
         """
         :returns:   The Shotgun entity dictionary that this file is associated with
         """
-        return self._details.get("entity") or self._publish_details.get("entity")
+        return self._details.entity or self._publish_details.entity
 
     @property
     def task(self):
         """
         :returns:   The Shotgun task entity dictionary that this file is associated with
         """
-        return self._details.get("task") or self._publish_details.get("task")
+        return self._details.task or self._publish_details.task
 
     #@property
     def _get_thumbnail_path(self):
@@ -164,7 +222,7 @@ class FileItem(object):
         :returns:   The path on disk of the thumbnail for this file
         """
         if self._thumbnail_path is None:
-            self._thumbnail_path = self._details.get("thumbnail") or self._publish_details.get("thumbnail")
+            self._thumbnail_path = self._details.thumbnail or self._publish_details.thumbnail
         return self._thumbnail_path
     #@thumbnail_path.setter
     def _set_thumbnail_path(self, value):
@@ -173,21 +231,43 @@ class FileItem(object):
         """
         if value != self.thumbnail_path:
             self._thumbnail_path = value
-            self._thumbnail_image = None
+            self._thumbnail_key = None
     thumbnail_path=property(_get_thumbnail_path, _set_thumbnail_path)
 
+    #@property
+    def _get_thumbnail_key(self):
+        """
+        :returns:   The key of the thumbnail pixmap for this file in the thumbnail cache
+        """
+        return self._thumbnail_key
+    #@thumbnail_key.setter
+    def _set_thumbnail_key(self, value):
+        """
+        :param value:   The key of the pixmap in the thumbnail cache that should be used to represent
+                        this file
+        """
+        self._thumbnail_key = value
+    thumbnail_key=property(_get_thumbnail_key, _set_thumbnail_key)
+
     #@property
     def _get_thumbnail(self):
         """
-        :returns:   The thumbnail QPixmap for this file
+        :returns:   The thumbnail QPixmap for this file or None if there isn't one or it has been
+                    discarded from the thumbnail cache
         """
-        return self._thumbnail_image
+        if self._thumbnail_key is None:
+            return None
+        return g_thumbnail_cache.get(self._thumbnail_key)
     #@thumbnail.setter
     def _set_thumbnail(self, value):
         """
         :param value:   The QPixmap that should be used to represent this file
         """
-        self._thumbnail_image = value
+        if not value or value.isNull():
+            self._thumbnail_key = None
+            return
+        self._thumbnail_key = "pixmap_%s" % value.cacheKey()
+        g_thumbnail_cache.add(self._thumbnail_key, value)
     thumbnail=property(_get_thumbnail, _set_thumbnail)
 
     #@property
@@ -196,12 +276,13 @@ class FileItem(object):
         :returns:   A dictionary of {version:FileItem} containing a map of all other
                     versions of this file
         """
-        return self._versions
+        return self._versions if self._versions is not None else {}
     #@versions.setter
     def _set_versions(self, value):
         """
         :param value:   A dictionary of {version:FileItem} pairs that represent all other
-                        versions of this file
+                        versions of this file.  This is expected to be the same dictionary
+                        for all versions of the file and isn't copied.
         """
         self._versions = value
     versions=property(_get_versions, _set_versions)
@@ -228,7 +309,7 @@ class FileItem(object):
         """
         :returns:   A datetime instance containing the last modified date of the local/work file
         """
-        return self._details.get("modified_at")
+        return _from_timestamp(self._details.modified_at)
 
     @property
     def modified_by(self):
@@ -236,21 +317,21 @@ class FileItem(object):
         :returns:   A Shotgun entity dictionary representing the user who last modified this local/work
                     file
         """
-        return self._details.get("modified_by")
+        return self._details.modified_by
 
     @property
     def editable(self):
         """
         :returns:   True if the local.work file is editable, otherwise False
         """
-        return self._details.get("editable", True)
+        return self._details.editable if self._details.editable is not None else True
 
     @property
     def not_editable_reason(self):
         """
         :returns:   A string describing the reason the local/work file is not editable
         """
-        return self._details.get("editable_reason") or ""
+        return self._details.editable_reason or ""
 
     # ------------------------------------------------------------------------------------------
     # Published file properties
@@ -275,28 +356,28 @@ class FileItem(object):
         :returns:   The id of the PublishedFile entity in Shotgun that represents this published
                     file
         """
-        return self._publish_details.get("published_file_entity_id")
+        return self._publish_details.published_file_id
 
     @property
     def publish_description(self):
         """
         :returns:   The Shotgun description of this published file
         """
-        return self._publish_details.get("publish_description")
+        return self._publish_details.description
 
     @property
     def published_at(self):
         """
         :returns:   A datetime instance containing the date this published file was published
         """
-        return self._publish_details.get("published_at")
+        return _from_timestamp(self._publish_details.published_at)
 
     @property
     def published_by(self):
         """
         :returns:   A Shotgun entity dictionary representing the user who published this file
         """
-        return self._publish_details.get("published_by")
+        return self._publish_details.published_by
 
     # ------------------------------------------------------------------------------------------
     # Public methods
@@ -310,7 +391,8 @@ class FileItem(object):
         """
         self._is_published = publish._is_published
         self._publish_path = publish._publish_path
-        self._publish_details = copy.deepcopy(publish._publish_details or {})
+        # details are never modified so they can be shared rather than copied:
+        self._publish_details = publish._publish_details
 
     def update_from_work_file(self, work_file):
         """
@@ -321,7 +403,7 @@ class FileItem(object):
         """
         self._is_local = work_file._is_local
         self._path = work_file._path
-        self._details = copy.deepcopy(work_file._details or {})
+        self._details = work_file._details
 
     def set_not_work_file(self):
         """
@@ -388,6 +470,20 @@ class FileItem(object):
 
         return details_str
 
+    def format_subtitle(self):
+        """
+        Format a short summary of this file to be used as a subtitle in UI elements.  This contains the
+        version together with who published or last modified the file and when.
+
+        :returns:   Formatted rich-text string containing the summary of the file
+        """
+        subtitle = "v%03d" % self.version
+        if self.is_published:
+            subtitle += "<br>%s" % self.format_published_by_details()
+        elif self.is_local:
+            subtitle += "<br>%s" % self.format_modified_by_details()
+        return subtitle
+
     def format_publish_description(self):
         """
         Format the publish description to be used in UI elements
@@ -505,28 +601,20 @@ class FileItem(object):
                 # same version so we'll need to look further!
                 pass
 
-        # handle if both are publishes or if both are local:
-        diff = timedelta()
+        # handle if both are publishes or if both are local - times are compared using the
+        # stored timestamps to avoid constructing datetimes:
         if self.is_published:
             # both are publishes so just compare publish times:
-            if not self.published_at or not other.published_at:
-                # can't compare!
-                return 0
-            diff = self.published_at - other.published_at
+            self_time = self._publish_details.published_at
+            other_time = other._publish_details.published_at
         else:
             # both are local so compare modified times:
-            if not self.modified_at or not other.modified_at:
-                # can't compare!
-                return 0
-            diff = self.modified_at - other.modified_at
-
-        zero = timedelta(seconds=0)
-        if diff < zero:
-            return -1
-        elif diff > zero:
-            return 1
-        else:
+            self_time = self._details.modified_at
+            other_time = other._details.modified_at
+        if not self_time or not other_time:
+            # can't compare!
             return 0
+        return cmp(self_time, other_time)
 
     def compare_with_publish(self, published_file):
         """
@@ -558,15 +646,17 @@ class FileItem(object):
         # return '0' as the files could still have different contents - in this case, the
         # work file is favoured over the publish!
         local_is_latest = False
-        if self.modified_at and published_file.published_at:
+        modified_at = self._details.modified_at
+        published_at = published_file._publish_details.published_at
+        if modified_at and published_at:
             # check file modification time - we only consider a local version to be 'latest' 
             # if it has a more recent modification time than the published file (with 2mins
             # tollerance)
-            if self.modified_at > published_file.published_at:
+            if modified_at > published_at:
                 local_is_latest = True
             else:
-                diff = published_file.published_at - self.modified_at
-                if diff < timedelta(seconds=120):
+                diff = published_at - modified_at
+                if diff < 120:
                     local_is_latest = True
         else:
             # can't compare times so assume local is more recent than publish:
@@ -574,9 +664,44 @@ class FileItem(object):
 
         return 1 if local_is_latest else -1
 
+    def get_sort_key(self):
+        """
+        Build a key that sorts files in the same order as compare() when sorted in ascending order,
+        without having to compare pairs of files.  All versions of a file are kept together with files
+        ordered by their latest version (most recent first), then by version (latest first) and finally
+        by date (most recent first).
+
+        Note that this approximates the fuzzy compare between work files and publishes by treating
+        work files as 2 minutes more recent than they are.
+
+        :returns:   A string key that can be compared with the sort key of other files
+        """
+        latest_file = self
+        if self.versions:
+            latest_file = self.versions[max(self.versions.iterkeys())]
+        # times are fixed width so that files without a date sort after all dated files and the name
+        # is terminated with a null so that it sorts before any name it's a prefix of:
+        return "%018.6f|%s\x00|%010d|%018.6f" % (_MAX_SORT_TIME - latest_file._get_sort_time(),
+                                                 self.name,
+                                                 _MAX_SORT_VERSION - self.version,
+                                                 _MAX_SORT_TIME - self._get_sort_time())
+
     # ------------------------------------------------------------------------------------------
     # Protected methods
 
+    def _get_sort_time(self):
+        """
+        :returns:   The timestamp used when sorting this file - the publish time for publishes and the
+                    modified time for work files, including the tolerance used by compare_with_publish()
+        """
+        sort_time = 0
+        if self.is_published:
+            sort_time = self._publish_details.published_at or 0
+        elif self._details.modified_at:
+            sort_time = self._details.modified_at + 120
+        # clamp to the range the sort key can represent:
+        return min(max(sort_time, 0), _MAX_SORT_TIME)
+
     def __repr__(self):
         """
         :returns:   A string representation of this instance - useful for debugging
@@ -0,0 +1,183 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Interned keys used to identify all versions of a single file.
+"""
+
+import weakref
+
+from .util import Threaded
+
+
+def _intern_file_key(fields):
+    """
+    Module level function used to re-intern file keys when they are unpickled.
+
+    :param fields:  The sorted tuple of (name, value) pairs for the key
+    :returns:       The interned FileKey for the fields
+    """
+    return g_file_key_registry.intern(fields)
+
+
+class FileKey(object):
+    """
+    Immutable key that matches across all versions of a single file.  Keys are interned so there is
+    only ever a single instance for each unique set of fields and the hash is computed once on
+    construction.
+
+    A FileKey compares equal to, and has the same hash as, the sorted tuple of (name, value) pairs
+    it was built from so it can be used interchangeably with keys built as plain tuples.
+    """
+    __slots__ = ("_fields", "_hash", "__weakref__")
+
+    def __init__(self, fields):
+        """
+        Construction - use FileKeyRegistry.intern() rather than constructing keys directly.
+
+        :param fields:  The sorted tuple of (name, value) pairs for the key
+        """
+        self._fields = fields
+        self._hash = hash(fields)
+
+    @property
+    def fields(self):
+        """
+        :returns:   The sorted tuple of (name, value) pairs for the key
+        """
+        return self._fields
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, FileKey):
+            # keys are interned so different instances are different keys:
+            return False
+        return self._fields == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return "<FileKey %r>" % (self._fields,)
+
+    def __reduce__(self):
+        return (_intern_file_key, (self._fields,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class FileKeyRegistry(Threaded):
+    """
+    Thread-safe registry of all FileKey instances currently in use.  Keys are held weakly so they are
+    released once nothing is using them any more.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._keys = weakref.WeakValueDictionary()# fields:FileKey
+
+    @Threaded.exclusive
+    def intern(self, fields):
+        """
+        Get the unique FileKey for the specified fields, creating it if needed.
+
+        :param fields:  The sorted tuple of (name, value) pairs for the key
+        :returns:       The interned FileKey for the fields
+        """
+        file_key = self._keys.get(fields)
+        if file_key is None:
+            file_key = FileKey(fields)
+            self._keys[fields] = file_key
+        return file_key
+
+
+class FileKeyBuilder(object):
+    """
+    Build file keys for a single template and set of ignore fields.  The template keys that are
+    included in file keys and their default values are worked out once when the builder is created
+    rather than for every file.
+    """
+
+    # fields that are never included in file keys:
+    ALWAYS_IGNORED = ("version", "extension")
+
+    def __init__(self, template, ignore_fields=None):
+        """
+        Construction
+
+        :param template:        The template that represents the files the keys are built for
+        :param ignore_fields:   A list of fields to ignore when building keys
+        """
+        ignore_fields = set(ignore_fields or []) | set(FileKeyBuilder.ALWAYS_IGNORED)
+        template_keys = template.keys
+        self._key_names = frozenset(name for name in template_keys if name not in ignore_fields)
+        # default values for template keys that aren't ignored:
+        self._defaults = dict((key.name, key.default) for key in template_keys.values()
+                              if key.name not in ignore_fields and key.default != None)
+
+    def build(self, fields):
+        """
+        Build the file key for the specified fields.
+
+        :param fields:  A dictionary of fields extracted from a file path
+        :returns:       The interned FileKey for the fields
+        """
+        # start with the default values and then add all fields that are included in the template,
+        # skipping the ignore fields:
+        file_key = self._defaults.copy()
+        key_names = self._key_names
+        for name, value in fields.iteritems():
+            if name in key_names:
+                file_key[name] = value
+        return g_file_key_registry.intern(tuple(sorted(file_key.iteritems())))
+
+
+class FileKeyBuilderCache(Threaded):
+    """
+    Cache of FileKeyBuilder instances, one per template and set of ignore fields.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._builders = {}# (template, ignore fields):FileKeyBuilder
+
+    @Threaded.exclusive
+    def get(self, template, ignore_fields=None):
+        """
+        Get the key builder for the specified template and ignore fields, creating it if needed.
+
+        :param template:        The template that represents the files the keys are built for
+        :param ignore_fields:   A list of fields to ignore when building keys
+        :returns:               A FileKeyBuilder instance
+        """
+        cache_key = (template, frozenset(ignore_fields or []))
+        builder = self._builders.get(cache_key)
+        if not builder:
+            builder = FileKeyBuilder(template, ignore_fields)
+            self._builders[cache_key] = builder
+        return builder
+
+# single global instances of the file key registry and key builder cache
+g_file_key_registry = FileKeyRegistry()
+g_file_key_builders = FileKeyBuilderCache()
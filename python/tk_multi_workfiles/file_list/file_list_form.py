@@ -17,7 +17,7 @@ import weakref
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
-from ..file_model import FileModel
+from ..file_model import FileModel, FileModelBase
 from ..ui.file_list_form import Ui_FileListForm
 from .file_proxy_model import FileProxyModel
 from .file_list_item_delegate import FileListItemDelegate
@@ -99,6 +99,14 @@ class FileListForm(QtGui.QWidget):
         self._item_delegate = FileListItemDelegate(self._ui.file_list_view)
         self._ui.file_list_view.setItemDelegate(self._item_delegate)
 
+        # the source model is told which groups are visible in the list view so that it can prioritize
+        # thumbnails for them.  This is updated shortly after the view is scrolled, resized or changed:
+        self._visible_groups_timer = QtCore.QTimer(self)
+        self._visible_groups_timer.setSingleShot(True)
+        self._visible_groups_timer.setInterval(100)
+        self._visible_groups_timer.timeout.connect(self._update_visible_groups)
+        self._ui.file_list_view.verticalScrollBar().valueChanged.connect(self._visible_groups_timer.start)
+
     def shut_down(self):
         """
         Clean up as much as we can to help the gc once the widget is finished with.
@@ -110,6 +118,12 @@ class FileListForm(QtGui.QWidget):
             self._current_item_ref = None
             self._file_filters = None
 
+            # stop tracking the visible groups:
+            self._visible_groups_timer.stop()
+            src_model = get_source_model(self._ui.file_list_view.model())
+            if isinstance(src_model, FileModelBase):
+                src_model.set_visible_groups([], id(self))
+
             # clear the selection:
             if self._ui.file_list_view.selectionModel():
                 self._ui.file_list_view.selectionModel().clear()
@@ -243,10 +257,13 @@ class FileListForm(QtGui.QWidget):
                                           show_work_files=self._show_work_files,
                                           show_publishes=self._show_publishes)
             filter_model.rowsInserted.connect(self._on_filter_model_rows_inserted)
+            filter_model.rowsRemoved.connect(self._visible_groups_timer.start)
+            filter_model.layoutChanged.connect(self._visible_groups_timer.start)
+            filter_model.modelReset.connect(self._visible_groups_timer.start)
             filter_model.setSourceModel(model)
     
             # set automatic sorting on the model:
-            filter_model.sort(0, QtCore.Qt.DescendingOrder)
+            filter_model.sort(0, QtCore.Qt.AscendingOrder)
             filter_model.setDynamicSortFilter(True)
     
             # connect the views to the filtered model:        
@@ -277,7 +294,10 @@ class FileListForm(QtGui.QWidget):
                         False if this method ignores the event 
         """
         if obj == self._ui.file_list_view.viewport():
-            if (event.type() == QtCore.QEvent.MouseButtonDblClick
+            if event.type() in (QtCore.QEvent.Resize, QtCore.QEvent.Show, QtCore.QEvent.Hide):
+                # the groups visible in the view may have changed:
+                self._visible_groups_timer.start()
+            elif (event.type() == QtCore.QEvent.MouseButtonDblClick
                 and event.button() != QtCore.Qt.LeftButton):
                 # supress double-clicks that aren't from the left mouse button as this
                 # can feel very odd to the user!
@@ -442,6 +462,36 @@ class FileListForm(QtGui.QWidget):
         prev_selected_item = self._get_selected_item()
         self._update_selection(prev_selected_item)
 
+        # the groups visible in the view may have changed:
+        self._visible_groups_timer.start()
+
+    def _update_visible_groups(self):
+        """
+        Tell the source model which groups are currently visible in the list view.  A group is visible
+        if any part of it, from the group header to its last file, intersects the view's viewport.
+        """
+        view = self._ui.file_list_view
+        view_model = view.model()
+        src_model = get_source_model(view_model)
+        if not isinstance(src_model, FileModelBase):
+            return
+
+        visible_group_indexes = []
+        if view.isVisible():
+            viewport_rect = view.viewport().rect()
+            for row in range(view_model.rowCount()):
+                group_idx = view_model.index(row, 0)
+                group_rect = view.visualRect(group_idx)
+                child_count = view_model.rowCount(group_idx)
+                if child_count:
+                    last_child_rect = view.visualRect(view_model.index(child_count - 1, 0, group_idx))
+                    if last_child_rect.isValid():
+                        group_rect = group_rect.united(last_child_rect)
+                if group_rect.intersects(viewport_rect):
+                    visible_group_indexes.append(map_to_source(group_idx))
+
+        src_model.set_visible_groups(visible_group_indexes, id(self))
+
     def _on_search_changed(self, search_text):
         """
         Slot triggered when the search text has been changed.
@@ -14,10 +14,10 @@
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
-from ..file_model import FileModel
+from ..file_model import FileModel, FileModelBase
 from .file_group_widget import FileGroupWidget
 from .file_widget import FileWidget
-from ..util import get_model_data, get_model_str
+from ..util import get_model_data, get_model_str, map_to_source
 from ..framework_qtwidgets import GroupedListViewItemDelegate
 
 class FileListItemDelegate(GroupedListViewItemDelegate):
@@ -68,16 +68,18 @@ class FileListItemDelegate(GroupedListViewItemDelegate):
             show_subtitle = True
             file_item = get_model_data(model_index, FileModel.FILE_ITEM_ROLE)
             if file_item:
-                # build labels:
+                # build labels - the subtitle is formatted and cached by the model the first time
+                # it's requested:
                 label = "<b>%s<b>" % file_item.name
-                subtitle += "v%03d" % file_item.version
-                if file_item.is_published:
-                    subtitle += "<br>%s" % file_item.format_published_by_details()
-                elif file_item.is_local:
-                    subtitle += "<br>%s" % file_item.format_modified_by_details()
+                subtitle = get_model_data(model_index, FileModel.SUBTITLE_ROLE) or file_item.format_subtitle()
 
                 # retrieve the icon:
                 icon = file_item.thumbnail
+                if not icon and file_item.is_published and file_item.thumbnail_path:
+                    # this file is being shown so its thumbnail should be downloaded next:
+                    src_index = map_to_source(model_index)
+                    if isinstance(src_index.model(), FileModelBase):
+                        src_index.model().prioritize_thumbnail(src_index)
                 is_publish = file_item.is_published
                 is_editable = file_item.editable
 
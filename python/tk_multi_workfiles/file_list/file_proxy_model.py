@@ -12,7 +12,7 @@
 import sgtk
 from sgtk.platform.qt import QtCore
 
-from ..file_model import FileModel
+from ..file_model import FileModel, FileModelBase
 from ..framework_qtwidgets import HierarchicalFilteringProxyModel
 from ..util import get_model_data, get_model_str
 
@@ -44,6 +44,15 @@ class FileProxyModel(HierarchicalFilteringProxyModel):
         self._show_publishes = show_publishes
         self._show_workfiles = show_work_files
 
+        # items are sorted using the sort keys provided by the model rather than by comparing pairs of
+        # items in python.  Note that the keys are built so that the items should be sorted in ascending
+        # order:
+        self.setSortRole(FileModel.SORT_ROLE)
+
+        # the ids of the users to filter by - rebuilt only when the list of users changes:
+        self._filter_users = None
+        self._filter_user_ids = set()
+
     #@property
     def _get_show_publishes(self):
         return self._show_publishes
@@ -100,8 +109,11 @@ class FileProxyModel(HierarchicalFilteringProxyModel):
         # try to get the work area and see if this item should be filtered:
         work_area = get_model_data(src_idx, FileModel.WORK_AREA_ROLE)
         if work_area and work_area.context and work_area.context.user:
-            user_ids = set(u["id"] for u in self._filters.users if u)
-            if work_area.context.user["id"] not in user_ids:
+            users = self._filters.users
+            if users is not self._filter_users:
+                self._filter_users = users
+                self._filter_user_ids = set(u["id"] for u in users if u)
+            if work_area.context.user["id"] not in self._filter_user_ids:
                 return False
 
         # get the file item and see if it should be filtered:
@@ -113,15 +125,19 @@ class FileProxyModel(HierarchicalFilteringProxyModel):
                 return False
 
             if not self._filters.show_all_versions:
-                # Filter based on latest version - need to check if this is the latest 
-                # version of the file:
-                all_versions = file_item.versions
-
-                visible_versions = [v for v, f in all_versions.iteritems() 
-                                        if (f.is_local and self._show_workfiles) 
-                                            or (f.is_published and self._show_publishes)]
-
-                if not visible_versions or file_item.version != max(visible_versions):
+                # Filter based on latest version - need to check if this is the latest
+                # visible version of the file.  The model keeps track of the latest work
+                # file and publish versions of each file so there's no need to look at
+                # all the versions:
+                latest_versions = get_model_data(src_idx, FileModel.LATEST_VERSIONS_ROLE)
+                latest_work_file_version, latest_publish_version = latest_versions or (None, None)
+
+                latest_version = latest_work_file_version if self._show_workfiles else None
+                if (self._show_publishes and latest_publish_version is not None
+                    and (latest_version is None or latest_publish_version > latest_version)):
+                    latest_version = latest_publish_version
+
+                if latest_version is None or file_item.version != latest_version:
                     return False
 
 
@@ -136,6 +152,12 @@ class FileProxyModel(HierarchicalFilteringProxyModel):
 
         # check
         if file_item:
+            src_model = self.sourceModel()
+            if (reg_exp.patternSyntax() == QtCore.QRegExp.FixedString
+                and isinstance(src_model, FileModelBase)):
+                # use the search index in the model - this also matches publish descriptions and
+                # user names:
+                return file_item in src_model.find_files(reg_exp.pattern())
             if reg_exp.indexIn(file_item.name) != -1:
                 return True
         else:
@@ -144,63 +166,3 @@ class FileProxyModel(HierarchicalFilteringProxyModel):
 
         # default is to not match:
         return False
-
-    def lessThan(self, left_src_idx, right_src_idx):
-        """
-        Overriden from base class - called to compare two indexes when the model is being 
-        sorted.
-
-        :param left_src_idx:    The left index in the source model to compare
-        :param right_src_idx:   The right index in the source model to compare
-        :returns:               True of the source item for the left index is considered 
-                                less than the source item for the right index, otherwise
-                                False
-        """
-        if not left_src_idx.parent().isValid():
-            # this is a root item so just leave the items in row 
-            # order they are in in the source model:
-            if self.sortOrder() == QtCore.Qt.AscendingOrder:
-                return left_src_idx.row() < right_src_idx.row()
-            else:
-                return right_src_idx.row() < left_src_idx.row()
-
-        # get the items:        
-        left_item = get_model_data(left_src_idx, FileModel.FILE_ITEM_ROLE)
-        right_item = get_model_data(right_src_idx, FileModel.FILE_ITEM_ROLE)
-
-        # handle the case where one or both items are not file items:
-        if not left_item:
-            if not right_item:
-                # sort in alphabetical order:
-                is_less_than = get_model_str(left_src_idx).lower() < get_model_str(right_src_idx).lower()
-                if self.sortOrder() == QtCore.Qt.AscendingOrder:
-                    return is_less_than
-                else:
-                    return not is_less_than
-            else:
-                return False
-        elif not right_item:
-            return True
-
-        if left_item.key != right_item.key:
-            # items represent different files but we want to group all file versions together. 
-            # Therefore, we find the maximum version for each file and compare those instead.
-            if left_item.versions and right_item.versions:
-                max_left_version = left_item.versions[max(left_item.versions.keys())]
-                max_right_version = right_item.versions[max(right_item.versions.keys())]
-                return max_left_version.compare(max_right_version) < 0
-
-        # compare the two files!
-        compare_res = left_item.compare(right_item)
-        if compare_res != 0:
-            return compare_res < 0
-
-        # exactly the same modified dates so compare names:
-        # - Note, files are sorted in reverse-date order (newest first) but we want files
-        # with exactly the same modified date & time (an edge case) to be in alphabetical
-        # order.  Because of this we reverse this comparison.
-        return not (left_item.name < right_item.name)
-
-
-
-
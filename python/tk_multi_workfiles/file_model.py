@@ -16,21 +16,54 @@ from sgtk.platform.qt import QtGui, QtCore
 from .file_finder import AsyncFileFinder
 from .user_cache import g_user_cache
 from .file_search_cache import FileSearchCache
+from .file_search_index import FileSearchIndex
+from .thumbnail_cache import g_thumbnail_cache, g_thumbnail_disk_cache, build_thumbnail_image
+from .thumbnail_scheduler import ThumbnailScheduler
 
 shotgun_data = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_data")
 ShotgunDataRetriever = shotgun_data.ShotgunDataRetriever
 
 
-class FileModel(QtGui.QStandardItemModel):
+class _FileModelItemRef(weakref.ref):
     """
-    The FileModel maintains a model of all files (work files and publishes) found for a matrix of
-    entities and users.  Details of each 'version' of a file are contained in a FileItem instance
-    and presented as a single model item.
+    Weak reference to a file model item that also stores where the reference is held in the current
+    item map so that the entry can be removed directly when the model item is released.
+    """
+    __slots__ = ("group_key", "file_key", "version")
+
+    def __new__(cls, model_item, callback, group_key, file_key, version):
+        """
+        :param model_item:  The file model item to reference
+        :param callback:    The callback to call when the model item is released
+        :param group_key:   The key of the group the model item belongs to
+        :param file_key:    The key of the file the model item represents
+        :param version:     The version of the file the model item represents
+        """
+        item_ref = weakref.ref.__new__(cls, model_item, callback)
+        item_ref.group_key = group_key
+        item_ref.file_key = file_key
+        item_ref.version = version
+        return item_ref
+
+    def __init__(self, model_item, callback, *args):
+        weakref.ref.__init__(self, model_item, callback)
+
+
+class FileModelBase(object):
+    """
+    Base class containing the logic to maintain a model of all files (work files and publishes) found
+    for a matrix of entities and users.  Details of each 'version' of a file are contained in a FileItem
+    instance and presented as a single model item.
 
     File items are grouped into groups that represent both the entity and the user that the files
     were found for (the WorkArea).
 
     Additional items are added to a group to represent additional hierarchy in the model.
+
+    The logic is independent of how the model items are stored - derived classes must also derive from
+    a Qt model class and provide the _GroupModelItem, _FileModelItem and _FolderModelItem classes as
+    well as invisibleRootItem(), appendRow() and insertRow() methods that behave in the same way as
+    their QStandardItemModel equivalents.
     """
 
     class SearchDetails(object):
@@ -71,246 +104,27 @@ class FileModel(QtGui.QStandardItemModel):
     WORK_AREA_ROLE = _BASE_ROLE     + 3     # WorkArea data
     SEARCH_STATUS_ROLE = _BASE_ROLE + 4     # search status data
     SEARCH_MSG_ROLE = _BASE_ROLE    + 5     # search message data
+    SUBTITLE_ROLE = _BASE_ROLE      + 6     # formatted subtitle for a file
+    LATEST_VERSIONS_ROLE = _BASE_ROLE + 7   # (latest work file version, latest publish version) of a file
+    SORT_ROLE = _BASE_ROLE          + 8     # key used to sort items
 
-    class _BaseModelItem(QtGui.QStandardItem):
-        """
-        Base model item for storage of the file data in the model.
-        """
-
-        def __init__(self, typ, text=None):
-            """
-            :param typ:     The type of item this represents (see enumeration of node types above)
-            :param text:    String used for the label/display role for this item
-            """
-            QtGui.QStandardItem.__init__(self, text or "")
-            self._type = typ
-
-        def data(self, role):
-            """
-            Return the data from the item for the specified role.
-
-            :param role:    The role to return data for.
-            :returns:       Data for the specified role
-            """
-            if role == FileModel.NODE_TYPE_ROLE:
-                return self._type
-            else:
-                # just return the default implementation:
-                return QtGui.QStandardItem.data(self, role)
-
-        def setData(self, value, role):
-            """
-            Set the data on the item for the specified role
-
-            :param value:   The value to set the data with
-            :param role:    The role to set the data for
-            """
-            if role == FileModel.NODE_TYPE_ROLE:
-                # do nothing as the data can't be set:
-                pass
-            else:
-                # call the base implementation:
-                QtGui.QStandardItem.setData(self, value, role)
-
-    class _FileModelItem(_BaseModelItem):
-        """
-        Model item that represents a single FileItem in the model
-        """
-
-        def __init__(self, file_item, work_area):
-            """
-            :param file_item:    The FileItem instance this model item represents
-            :param work_area:    The WorkArea this file item belongs to
-            """
-            FileModel._BaseModelItem.__init__(self, typ=FileModel.FILE_NODE_TYPE)
-            self._file_item = file_item
-            self._work_area = work_area
-
-        @property
-        def file_item(self):
-            """
-            :returns:    The file item this model item represents
-            """
-            return self._file_item
-
-        @property
-        def work_area(self):
-            """
-            :returns:    The work area the file belongs to
-            """
-            return self._work_area
-
-        def data(self, role):
-            """
-            Return the data from the item for the specified role.
-
-            :param role:    The role to return data for.
-            :returns:       Data for the specified role
-            """
-            if role == QtCore.Qt.DisplayRole:
-                return "%s, v%0d" % (self._file_item.name, self._file_item.version)
-            elif role == FileModel.FILE_ITEM_ROLE:
-                return self._file_item
-            elif role == FileModel.WORK_AREA_ROLE:
-                return self._work_area
-            else:
-                # just return the default implementation:
-                return FileModel._BaseModelItem.data(self, role)
-
-        def setData(self, value, role):
-            """
-            Set the data on the item for the specified role
-
-            :param value:   The value to set the data with
-            :param role:    The role to set the data for
-            """
-            if role == QtCore.Qt.DisplayRole:
-                # do nothing as it can't be set!
-                pass
-            elif role == FileModel.FILE_ITEM_ROLE:
-                self._file_item = value
-                self.emitDataChanged()
-            elif role == FileModel.WORK_AREA_ROLE:
-                self._work_area = value
-                self.emitDataChanged()
-            else:
-                # call the base implementation:
-                FileModel._BaseModelItem.setData(self, value, role)
-
-    class _FolderModelItem(_BaseModelItem):
-        """
-        Model item that represents a folder in the model.  These are used when a group has entity
-        children that need to be represented in the model.
-        """
-
-        def __init__(self, name, entity):
-            """
-            :param name:    The name to use for the model item display role
-            :param entity:  A Shotgun entity dictionary for the entity that this folder item represents
-            """
-            FileModel._BaseModelItem.__init__(self, typ=FileModel.FOLDER_NODE_TYPE, text=name)
-            self._entity = entity
-
-        @property
-        def entity(self):
-            """
-            :returns:   An entity dictionary representing the entity represented by this item
-            """
-            return self._entity
-
-    class _GroupModelItem(_BaseModelItem):
-        """
-        Model item that represents a group in the model.  A group is a per-user, per-entity item that contains
-        the files found for the group as well as any additional child entities.
-        """
-
-        def __init__(self, name, key, work_area=None):
-            """
-            :param name:        The name to use for the model items display role
-            :param key:         A unique key representing this group
-            :param work_area:   A WorkArea instance that this group represents
-            """
-            FileModel._BaseModelItem.__init__(self, typ=FileModel.GROUP_NODE_TYPE, text=name)
-
-            self._search_status = FileModel.SEARCH_COMPLETED
-            self._search_msg = ""
-            self._key = key
-            self._work_area = work_area
-
-        @property
-        def key(self):
-            """
-            :returns:   The unique key for this group
-            """
-            return self._key
-
-        # @property
-        def _get_work_area(self):
-            """
-            :returns:   The WorkArea instance associated with this item
-            """
-            return self._work_area
-
-        # @work_area.setter
-        def _set_work_area(self, work_area):
-            """
-            Set the work area associated with this item
-
-            :param work_area:   The WorkArea to associate with this item
-            """
-            self._work_area = work_area
-            self.emitDataChanged()
-
-        work_area = property(_get_work_area, _set_work_area)
-
-        def set_search_status(self, status, msg=None):
-            """
-            Set the search status for this item and emit a dataChanged signal to indicate it's changed.
-
-            :param status:  The search status (see the search status enumeration above) to update this item with
-            :param msg:     The status message if any to update this item with
-            """
-            self._search_status = status
-            self._search_msg = msg
-            self.emitDataChanged()
-
-        def data(self, role):
-            """
-            Return the data from the item for the specified role.
-
-            :param role:    The role to return data for.
-            :returns:       Data for the specified role
-            """
-            if role == FileModel.SEARCH_STATUS_ROLE:
-                return self._search_status
-            elif role == FileModel.SEARCH_MSG_ROLE:
-                return self._search_msg
-            elif role == FileModel.WORK_AREA_ROLE:
-                return self._work_area
-            else:
-                # just return the default implementation:
-                return FileModel._BaseModelItem.data(self, role)
-
-        def setData(self, value, role):
-            """
-            Set the data on the item for the specified role
-
-            :param value:   The value to set the data with
-            :param role:    The role to set the data for
-            """
-            if role == FileModel.SEARCH_STATUS_ROLE:
-                self._search_status = value
-                self.emitDataChanged()
-            elif role == FileModel.SEARCH_MSG_ROLE:
-                self._search_msg = value
-                self.emitDataChanged()
-            elif role == FileModel.WORK_AREA_ROLE:
-                self._work_area = value
-                self.emitDataChanged()
-            else:
-                # call the base implementation:
-                FileModel._BaseModelItem.setData(self, value, role)
-
-    # Signal emitted when sandboxes are used, but before we know which ones
-    uses_user_sandboxes = QtCore.Signal(object) # Work area that uses sandboxes.
-    # Signal emitted when the sandbox_users_found when users were found in the sandbox.
-    sandbox_users_found = QtCore.Signal(list)# list of users
-
-    def __init__(self, bg_task_manager, parent):
+    def __init__(self, bg_task_manager):
         """
         :param bg_task_manager: A BackgroundTaskManager instance that will be used for all background/threaded
                                 work that needs undertaking
-        :param parent:          The parent QObject for this instance
         """
-        QtGui.QStandardItemModel.__init__(self, parent)
-
         self._app = sgtk.platform.current_bundle()
         self._published_file_type = sgtk.util.get_published_file_entity_type(self._app.sgtk)
 
         # sg data retriever is used to download thumbnails in the background
         self._sg_data_retriever = ShotgunDataRetriever(bg_task_manager=bg_task_manager)
-        self._sg_data_retriever.work_completed.connect(self._on_data_retriever_work_completed)
-        self._sg_data_retriever.work_failure.connect(self._on_data_retriever_work_failed)
+
+        # thumbnail requests are merged and prioritized by the thumbnail scheduler:
+        self._thumbnail_scheduler = ThumbnailScheduler(self._sg_data_retriever, self._published_file_type)
+        self._thumbnail_scheduler.thumbnail_downloaded.connect(self._on_thumbnail_downloaded)
+
+        # the keys of the groups visible in each view that shows this model:
+        self._visible_group_keys = {}# viewer id:set(group keys)
 
         # details about the current entities and users that are represented
         # in this model.
@@ -320,14 +134,43 @@ class FileModel(QtGui.QStandardItemModel):
         self._in_progress_searches = {}
         self._search_cache = FileSearchCache()
 
-        # self._current_item_map[search_id][file.key][file.version] = model._FileModelItem
+        # full-text index of all files in the model used when filtering:
+        self._search_index = FileSearchIndex()
+
+        self._group_item_map = {}# group key:_GroupModelItem
+
+        # self._current_item_map[group_key][file.key][file.version] = _FileModelItemRef(model._FileModelItem)
         self._current_item_map = {}
-        # self._pending_thumbnail_requests[request_id] = (group_key, file_key, file_version)
-        self._pending_thumbnail_requests = {}
+
+        # entries are removed from the current item map as soon as the model item is released.  Note that
+        # the callback only holds a weak reference to the model to avoid a reference cycle:
+        model_ref = weakref.ref(self)
+        def on_file_model_item_released(item_ref):
+            model = model_ref()
+            if model:
+                model._untrack_current_file_item(item_ref)
+        self._on_file_model_item_released = on_file_model_item_released
+
+        # downloaded thumbnails are scaled in background tasks:
+        # self._pending_thumbnail_tasks[task_id] = [(group_key, file_key, file_version), ...]
+        self._pending_thumbnail_tasks = {}
+        self._pending_thumbnail_owners = set()# owners of all pending thumbnail tasks
+        self._thumbnail_task_group = object()
+        self._bg_task_manager = bg_task_manager
+        self._bg_task_manager.task_completed.connect(self._on_background_task_completed)
+        self._bg_task_manager.task_failed.connect(self._on_background_task_failed)
+
+        # limit the memory used by thumbnails:
+        thumbnail_cache_size = self._app.get_setting("thumbnail_cache_size", 128)
+        g_thumbnail_cache.set_max_size(thumbnail_cache_size * 1024 * 1024)
+        # and the disk space used to keep scaled thumbnails between sessions:
+        thumbnail_disk_cache_size = self._app.get_setting("thumbnail_disk_cache_size", 256)
+        g_thumbnail_disk_cache.set_max_size(thumbnail_disk_cache_size * 1024 * 1024)
 
         # we'll need a file finder to be able to find files:
         self._finder = AsyncFileFinder(bg_task_manager, self)
         self._finder.files_found.connect(self._on_finder_files_found)
+        self._finder.files_batch_found.connect(self._on_finder_files_batch_found)
         self._finder.publishes_found.connect(self._on_finder_publishes_found)
         self._finder.search_completed.connect(self._on_finder_search_completed)
         self._finder.search_failed.connect(self._on_finder_search_failed)
@@ -342,12 +185,24 @@ class FileModel(QtGui.QStandardItemModel):
         # clear the model:
         self.clear()
 
+        # stop the thumbnail scheduler:
+        if self._thumbnail_scheduler:
+            self._thumbnail_scheduler.thumbnail_downloaded.disconnect(self._on_thumbnail_downloaded)
+            self._thumbnail_scheduler.shut_down()
+            self._thumbnail_scheduler = None
+
         # stop the data retriever:
         if self._sg_data_retriever:
             self._sg_data_retriever.stop()
             self._sg_data_retriever.deleteLater()
             self._sg_data_retriever = None
 
+        # disconnect from the background task manager:
+        if self._bg_task_manager:
+            self._bg_task_manager.task_completed.disconnect(self._on_background_task_completed)
+            self._bg_task_manager.task_failed.disconnect(self._on_background_task_failed)
+            self._bg_task_manager = None
+
         # clean up the cache:
         if self._search_cache:
             self._search_cache.clear()
@@ -356,6 +211,7 @@ class FileModel(QtGui.QStandardItemModel):
         # disconnect and clean up the file finder:
         if self._finder:
             self._finder.files_found.disconnect(self._on_finder_files_found)
+            self._finder.files_batch_found.disconnect(self._on_finder_files_batch_found)
             self._finder.publishes_found.disconnect(self._on_finder_publishes_found)
             self._finder.search_completed.disconnect(self._on_finder_search_completed)
             self._finder.search_failed.disconnect(self._on_finder_search_failed)
@@ -392,6 +248,20 @@ class FileModel(QtGui.QStandardItemModel):
         return self._find_current_items(None, file_item.key, file_item.version if not ignore_version else None)
 
     # Interface for modifying the entities in the model:
+    @property
+    def cached_file_count(self):
+        """
+        :returns:   The number of file versions held in the model's search cache
+        """
+        return self._search_cache.get_file_count() if self._search_cache else 0
+
+    @property
+    def is_searching(self):
+        """
+        :returns:   True if any searches are in progress, otherwise False
+        """
+        return bool(self._in_progress_searches)
+
     def set_entity_searches(self, searches):
         """
         Set the entity searches that the model should populate itself with.  The model will
@@ -464,19 +334,68 @@ class FileModel(QtGui.QStandardItemModel):
         # in pre-1.1.2 PySide that can result in crashes!
         self._clear_children_r(self.invisibleRootItem())
 
-        # clean up the current-item map
+        # clean up the group and current-item maps and the search index
+        self._group_item_map = {}
         self._current_item_map = {}
+        self._search_index.clear()
 
-    # ------------------------------------------------------------------------------------------
-    # protected methods
+    def find_files(self, search_text):
+        """
+        Find all files in the model whose name, publish description or user names contain all of the
+        whitespace separated terms in the search text.
 
-    def _safe_remove_row(self, row, parent_item=None):
+        :param search_text: The text to search for
+        :returns:           A set of the FileItem instances that match the search text
         """
-        Remove the specified row from the parent item in a PySide/Shoboken friendly way by removing
-        all its children first in a bottom-up fashion.
+        return self._search_index.find(search_text)
+
+    def set_visible_groups(self, group_indexes, viewer_id):
+        """
+        Set the groups that are currently visible in a view.  Thumbnails for files in groups that aren't
+        visible in any view are only downloaded once the group becomes visible.
+
+        :param group_indexes:   List of QModelIndex instances of all group items visible in the view
+        :param viewer_id:       A unique id for the view (e.g. id(view)) so that the visible groups can
+                                be tracked for multiple views showing this model
+        """
+        group_keys = set()
+        for index in group_indexes:
+            group_item = self.itemFromIndex(index)
+            if isinstance(group_item, self._GroupModelItem):
+                group_keys.add(group_item.key)
+        self._visible_group_keys[viewer_id] = group_keys
+
+        all_group_keys = set()
+        for keys in self._visible_group_keys.values():
+            all_group_keys.update(keys)
+        self._thumbnail_scheduler.set_visible_groups(all_group_keys)
+
+    def prioritize_thumbnail(self, index):
+        """
+        Download the thumbnail for the file at the specified index before any others, e.g. because the
+        file is currently being shown in a view.
+
+        :param index:   The QModelIndex of the file item to download the thumbnail for
+        """
+        model_item = self.itemFromIndex(index)
+        if not isinstance(model_item, self._FileModelItem):
+            return
+        group_item = model_item.parent()
+        file_item = model_item.file_item
+        if not group_item or not file_item:
+            return
+        self._thumbnail_scheduler.prioritize((group_item.key, file_item.key, file_item.version))
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    def _safe_remove_row(self, row, parent_item=None):
+        """
+        Remove the specified row from the parent item in a PySide/Shoboken friendly way by removing
+        all its children first in a bottom-up fashion.
 
         :param row:         The row to remove
-        :param parent_item: The parent QStandardItem of the item to remove.  If None then the row
+        :param parent_item: The parent model item of the item to remove.  If None then the row
                             is removed from the root item.
         """
         parent_item = parent_item or self.invisibleRootItem()
@@ -490,11 +409,42 @@ class FileModel(QtGui.QStandardItemModel):
         # and remove the row:
         parent_item.removeRow(row)
 
+    def _safe_remove_rows(self, rows, parent_item=None):
+        """
+        Remove the specified rows from the parent item in a PySide/Shoboken friendly way.  Each run of
+        contiguous rows is removed with a single call so that views are notified of a range of removed
+        rows rather than each row individually.
+
+        :param rows:        The rows to remove
+        :param parent_item: The parent model item of the items to remove.  If None then the rows
+                            are removed from the root item.
+        """
+        parent_item = parent_item or self.invisibleRootItem()
+
+        # build runs of contiguous rows, last run first so that removing a run doesn't change the
+        # rows of the runs still to be removed:
+        runs = []# [[first row, last row]]
+        for row in sorted(set(rows), reverse=True):
+            if runs and runs[-1][0] == row + 1:
+                runs[-1][0] = row
+            else:
+                runs.append([row, row])
+
+        for first_row, last_row in runs:
+            # safely remove all children of the items:
+            for row in range(first_row, last_row + 1):
+                item = parent_item.child(row)
+                if item:
+                    self._clear_children_r(item)
+
+            # and remove the rows:
+            parent_item.removeRows(first_row, last_row - first_row + 1)
+
     def _clear_children_r(self, parent_item):
         """
         Recursively clear the children from the specified parent item in a bottom-up fashion
 
-        :param parent_item: The parent QStandardItem to remove all children for
+        :param parent_item: The parent model item to remove all children for
         """
         num_rows = parent_item.rowCount()
         if num_rows == 0:
@@ -509,12 +459,12 @@ class FileModel(QtGui.QStandardItemModel):
         # remove all children:
         parent_item.removeRows(0, num_rows)
 
-    def _item_generator(self, parent_item, item_type=QtGui.QStandardItem):
+    def _item_generator(self, parent_item, item_type=object):
         """
         Item generator that yields all items under the specified parent that are of
         the specified type.
 
-        :param parent_item: The parent QStandardItem to search under
+        :param parent_item: The parent model item to search under
         :param item_type:   The class type of the model items to generate
         :returns:           A generator that yields all child items of the parent that
                             are of the specified type
@@ -530,7 +480,7 @@ class FileModel(QtGui.QStandardItemModel):
 
         :returns:   A generator that yields all _GroupModelItems in the model
         """
-        return self._item_generator(self.invisibleRootItem(), FileModel._GroupModelItem)
+        return self._item_generator(self.invisibleRootItem(), self._GroupModelItem)
 
     def _file_items(self, parent_item):
         """
@@ -540,7 +490,7 @@ class FileModel(QtGui.QStandardItemModel):
         :param parent_item: The parent item to yield _FileModelItems for
         :returns:           A generator that yields all _FileModelItems under the specified parent
         """
-        return self._item_generator(parent_item, FileModel._FileModelItem)
+        return self._item_generator(parent_item, self._FileModelItem)
 
     def _gen_entity_key(self, entity_dict):
         """
@@ -561,13 +511,9 @@ class FileModel(QtGui.QStandardItemModel):
         """
         if not self._current_searches:
             # nothing to do!
+            self.searches_completed.emit()
             return
 
-        # get existing groups:
-        group_map = {}
-        for group_item in self._group_items():
-            group_map[group_item.key] = group_item
-
         for search in self._current_searches:
             if not search.entity:
                 continue
@@ -578,9 +524,9 @@ class FileModel(QtGui.QStandardItemModel):
             for user in self._current_users:
                 user_key = self._gen_entity_key(user)
                 group_key = (entity_key, user_key)
-                group_item = group_map.get(group_key)
+                group_item = self._group_item_map.get(group_key)
                 if group_item:
-                    group_item.set_search_status(FileModel.SEARCHING)
+                    group_item.set_search_status(FileModelBase.SEARCHING)
 
                 # and dirty the search cache:
                 self._search_cache.set_dirty(search.entity, user)
@@ -590,6 +536,10 @@ class FileModel(QtGui.QStandardItemModel):
             self._in_progress_searches[search_id] = search
             self._app.log_debug("File Model: Started search %d..." % search_id)
 
+        if not self._in_progress_searches:
+            # nothing was searched for:
+            self.searches_completed.emit()
+
     def _stop_in_progress_searches(self):
         """
         Stop all in-progress searches
@@ -599,10 +549,12 @@ class FileModel(QtGui.QStandardItemModel):
         for search_id in search_ids:
             self._finder.stop_search(search_id)
 
-        # any pending thumbnail requests can also be stopped:
-        for request_id in self._pending_thumbnail_requests:
-            self._sg_data_retriever.stop_work(request_id)
-        self._pending_thumbnail_requests = {}
+        # any pending thumbnail requests and tasks can also be stopped:
+        self._thumbnail_scheduler.stop_all()
+        if self._pending_thumbnail_tasks:
+            self._bg_task_manager.stop_task_group(self._thumbnail_task_group)
+            self._pending_thumbnail_tasks = {}
+            self._pending_thumbnail_owners = set()
 
     def _update_groups(self):
         """
@@ -615,9 +567,7 @@ class FileModel(QtGui.QStandardItemModel):
         model.
         """
         # get existing groups:
-        group_map = {}
-        for group_item in self._group_items():
-            group_map[group_item.key] = group_item
+        group_map = dict(self._group_item_map)
 
         valid_group_keys = set()
         if self._current_searches and self._current_users:
@@ -656,8 +606,9 @@ class FileModel(QtGui.QStandardItemModel):
                         cached_result = self._search_cache.find(search.entity, user)
                         if (user_key == primary_user_key or cached_result):
                             # always add a group for the primary user or if we already have a cached result:
-                            group_item = FileModel._GroupModelItem(search.name, group_key)
+                            group_item = self._GroupModelItem(search.name, group_key)
                             self.insertRow(previous_valid_row + 1, group_item)
+                            self._group_item_map[group_key] = group_item
 
                             if cached_result:
                                 # we have a cached result so populate the group:
@@ -678,11 +629,9 @@ class FileModel(QtGui.QStandardItemModel):
         # remove any groups that are no longer needed:
         for group_key, group_item in group_map.iteritems():
             if group_key not in valid_group_keys:
+                del(self._group_item_map[group_key])
                 self._safe_remove_row(group_item.row())
 
-        # and clean up the file-to-item map:
-        self._cleanup_current_item_map()
-
     def _update_group_child_entity_items(self, parent_item, child_details):
         """
         Update the non-file child entity items for a group item.  This adds/removes rows accordingly
@@ -698,7 +647,7 @@ class FileModel(QtGui.QStandardItemModel):
         current_entity_row_map = {}
         for ri in range(parent_item.rowCount()):
             child_item = parent_item.child(ri)
-            if isinstance(child_item, FileModel._FolderModelItem):
+            if isinstance(child_item, self._FolderModelItem):
                 child_name = child_item.text()
                 child_entity = child_item.entity
                 child_key = (child_name, self._gen_entity_key(child_entity))
@@ -722,18 +671,19 @@ class FileModel(QtGui.QStandardItemModel):
         rows_to_remove = set([row for key, row in current_entity_row_map.iteritems()
                               if key not in valid_gen_entity_keys])
         # and remove them:
-        for row in sorted(rows_to_remove, reverse=True):
-            self._safe_remove_row(row, parent_item)
+        if rows_to_remove:
+            self._safe_remove_rows(rows_to_remove, parent_item)
 
         # finally, add in new rows:
         if entities_to_add:
             new_rows = []
             for name, entity in entities_to_add:
-                folder_item = FileModel._FolderModelItem(name, entity)
+                folder_item = self._FolderModelItem(name, entity)
                 new_rows.append(folder_item)
             parent_item.appendRows(new_rows)
 
-    def _process_files(self, files, work_area, group_item, have_local=True, have_publishes=True):
+    def _process_files(self, files, work_area, group_item, have_local=True, have_publishes=True, 
+                       is_partial=False):
         """
         Update the file items under the specified parent.  This adds/removes/updates file model items
         as needed effectively performing an in-place refresh.  This avoids having to do a complete
@@ -746,11 +696,18 @@ class FileModel(QtGui.QStandardItemModel):
 
         e.g. if updating publishes only, it will never remove file items that only represent work files.
 
+        If the files are only a partial set of the files found by a search, e.g. a batch of work files
+        found while the search is still in progress, then existing items are only ever added to or
+        updated.  Anything that needs removing will be removed once the complete set of files is processed.
+        Only the existing items for the files being processed are looked at so the cost of a partial update
+        depends on the number of files rather than the number of items already in the group.
+
         :param files:           A list of FileItem instances representing the files to process
         :param work_area:       A WorkArea instance representing the work area the files were found in
         :param group_item:      The _GroupModelItem the files should be updated for
         :param have_local:      True if the files list contains details about work files, false otherwise
         :param have_publishes:  True if the files list contains details about publishes, false otherwise
+        :param is_partial:      True if the files list is only part of the files found by the search
         """
         if not have_local and not have_publishes:
             # nothing to do then!
@@ -761,7 +718,16 @@ class FileModel(QtGui.QStandardItemModel):
         prev_local_file_versions = set()
         prev_publish_file_versions = set()
 
-        for model_item in self._file_items(group_item):
+        if is_partial:
+            # only need the existing items for the files being processed:
+            existing_model_items = []
+            for file_item in files:
+                existing_model_items.extend(self._find_current_items(group_item.key, file_item.key,
+                                                                     file_item.version))
+        else:
+            existing_model_items = self._file_items(group_item)
+
+        for model_item in existing_model_items:
             file_item = model_item.file_item
             file_version_key = (file_item.key, file_item.version)
             existing_file_item_map[file_version_key] = (file_item, model_item)
@@ -772,7 +738,10 @@ class FileModel(QtGui.QStandardItemModel):
 
         # build a list of existing files that we should keep in the model:
         file_versions_to_keep = set()
-        if have_local and not have_publishes:
+        if is_partial:
+            # keep everything that's already in the model
+            file_versions_to_keep = set(existing_file_item_map.keys())
+        elif have_local and not have_publishes:
             # keep all publishes that aren't local
             file_versions_to_keep = prev_publish_file_versions
         elif not have_local and have_publishes:
@@ -802,13 +771,7 @@ class FileModel(QtGui.QStandardItemModel):
             # if this is from a published file then we want to retrieve the thumbnail
             # if one is available:
             if file_item.is_published and file_item.thumbnail_path and not file_item.thumbnail:
-                # request the thumbnail using the data retriever:
-                request_id = self._sg_data_retriever.request_thumbnail(file_item.thumbnail_path,
-                                                                       self._published_file_type,
-                                                                       file_item.published_file_id,
-                                                                       "image",
-                                                                       load_image=True)
-                self._pending_thumbnail_requests[request_id] = (group_item.key, file_item.key, file_item.version)
+                self._request_thumbnail(group_item.key, file_item)
 
         # figure out if any existing items are no longer needed:
         valid_file_versions = set(valid_files.keys())
@@ -827,31 +790,34 @@ class FileModel(QtGui.QStandardItemModel):
                 file_item, model_item = existing_file_item_map[file_version_key]
                 file_item.set_not_published()
 
-        # update the cache - it's important this is done _before_ adding/updating the model items:
-        self._search_cache.add(work_area, valid_files.values())
+        # update the cache - it's important this is done _before_ adding/updating the model items.  For a
+        # partial update, the files are merged into the files already in the cache:
+        self._search_cache.add(work_area, valid_files.values(), merge=is_partial)
+
+        # update the index of the latest versions for the files in the group.  This is used when filtering
+        # the model so it's also important this is done _before_ adding the model items:
+        self._update_latest_versions(group_item, work_area, set(f.key for f in valid_files.itervalues()),
+                                     clear=not is_partial)
 
         # now lets remove, add and update items as needed:
         # 1. Remove items that are no longer needed:
         if rows_to_remove:
-            for row in sorted(rows_to_remove, reverse=True):
-                self._safe_remove_row(row, group_item)
+            self._safe_remove_rows(rows_to_remove, group_item)
 
         # 2. Add new items:
         if files_to_add:
             new_items = []
             for file_item in files_to_add:
-                model_item = FileModel._FileModelItem(file_item, work_area)
+                model_item = self._FileModelItem(file_item, work_area)
                 new_items.append(model_item)
                 # and track this item:
                 self._track_current_file_item(model_item, group_item)
             if new_items:
                 group_item.appendRows(new_items)
 
-        # 3. Update all items in this group:
-        self._update_group_file_items(group_item)
-
-        # and clean up the file-to-item map:
-        self._cleanup_current_item_map()
+        # 3. Update all items in this group - for a partial update, only the items that share a key
+        # with one of the files need updating:
+        self._update_group_file_items(group_item, set(f.key for f in files) if is_partial else None)
 
     def _track_current_file_item(self, file_model_item, group_model_item):
         """
@@ -863,10 +829,38 @@ class FileModel(QtGui.QStandardItemModel):
         """
         file_item = file_model_item.file_item
 
-        # self._current_item_map[group_key][file_key][file_version] = weakref.ref(_FileModelItem)
+        # self._current_item_map[group_key][file_key][file_version] = _FileModelItemRef(_FileModelItem)
         file_map = self._current_item_map.setdefault(group_model_item.key, {})
         version_map = file_map.setdefault(file_item.key, {})
-        version_map[file_item.version] = weakref.ref(file_model_item)
+        version_map[file_item.version] = _FileModelItemRef(file_model_item, self._on_file_model_item_released,
+                                                           group_model_item.key, file_item.key,
+                                                           file_item.version)
+
+        # and add it to the search index:
+        self._search_index.add((group_model_item.key, file_item.key, file_item.version), file_item)
+
+    def _untrack_current_file_item(self, item_ref):
+        """
+        Remove the entry for a released _FileModelItem from the current item map.  This is called by
+        the weak reference callback so only the entry for the released item is touched rather than
+        having to rebuild the whole map.
+
+        :param item_ref:    The _FileModelItemRef of the _FileModelItem that was released
+        """
+        file_map = self._current_item_map.get(item_ref.group_key)
+        version_map = file_map.get(item_ref.file_key) if file_map else None
+        if not version_map or version_map.get(item_ref.version) is not item_ref:
+            # the entry has already been removed or replaced by a newer item:
+            return
+
+        del(version_map[item_ref.version])
+        if not version_map:
+            del(file_map[item_ref.file_key])
+            if not file_map:
+                del(self._current_item_map[item_ref.group_key])
+
+        # the file is also no longer searchable:
+        self._search_index.remove((item_ref.group_key, item_ref.file_key, item_ref.version))
 
     def _find_version_items(self, version_map, file_version):
         """
@@ -933,25 +927,6 @@ class FileModel(QtGui.QStandardItemModel):
                 found_items.extend(self._find_file_items(file_map, file_key, file_version))
         return found_items
 
-    def _cleanup_current_item_map(self):
-        """
-        Cleanup the current item map by removing any entries that are no longer valid, e.g. the weakref
-        to the _FileModelItem is None.
-        """
-        new_item_map = {}
-        for group_key, file_map in self._current_item_map.iteritems():
-            new_file_map = {}
-            for file_key, version_map in file_map.iteritems():
-                new_version_map = {}
-                for version, item_ref in version_map.iteritems():
-                    if item_ref and item_ref():
-                        new_version_map[version] = item_ref
-                if new_version_map:
-                    new_file_map[file_key] = new_version_map
-            if new_file_map:
-                new_item_map[group_key] = new_file_map
-        self._current_item_map = new_item_map
-
     def _on_finder_work_area_found(self, search_id, work_area):
         """
         Slot triggered when the finder finds a work area. This will
@@ -1000,6 +975,18 @@ class FileModel(QtGui.QStandardItemModel):
                                work_area.context.user["name"] if work_area.context.user else "Unknown"))
         self._process_found_files(search_id, file_list, work_area, have_local=True, have_publishes=False)
 
+    def _on_finder_files_batch_found(self, search_id, file_list, work_area):
+        """
+        Slot triggered when the finder has found a batch of work files for a search that is still in
+        progress.  The complete list of work files will be reported once they have all been found.
+
+        :param search_id:    The id of the search that the work files were found for
+        :param file_list:    The list of FileItems that were found
+        :param work_area:    The work area that the files were found in
+        """
+        self._process_found_files(search_id, file_list, work_area, have_local=True, have_publishes=False,
+                                  is_partial=True)
+
     def _on_finder_publishes_found(self, search_id, file_list, work_area):
         """
         Slot triggered when the finder has found some publishes for a search
@@ -1013,7 +1000,8 @@ class FileModel(QtGui.QStandardItemModel):
                                work_area.context.user["name"] if work_area.context.user else "Unknown"))
         self._process_found_files(search_id, file_list, work_area, have_local=False, have_publishes=True)
 
-    def _process_found_files(self, search_id, file_list, work_area, have_local, have_publishes):
+    def _process_found_files(self, search_id, file_list, work_area, have_local, have_publishes, 
+                             is_partial=False):
         """
         Process files/publishes found by the finder.  This ensures that the parent _GroupModelItem for the
         search entity+user exists and then updates the group with files that were found.
@@ -1023,6 +1011,7 @@ class FileModel(QtGui.QStandardItemModel):
         :param work_area:       The work area that the files were found in
         :param have_local:      True if work files were found, otherwise false
         :param have_publishes:  True if publishes were found, otherwise false
+        :param is_partial:      True if the files are only part of the files found by the search
         """
         if search_id not in self._in_progress_searches:
             # ignore result
@@ -1032,13 +1021,9 @@ class FileModel(QtGui.QStandardItemModel):
 
         # find the group item for this search:
         group_key = (self._gen_entity_key(search.entity), self._gen_entity_key(search_user))
-        found_group = False
-        for group_item in self._group_items():
-            if group_item.key == group_key:
-                found_group = True
-                break
+        group_item = self._group_item_map.get(group_key)
 
-        if found_group:
+        if group_item:
             # and make sure the work area is up-to-date:
             group_item.work_area = work_area
         else:
@@ -1047,15 +1032,16 @@ class FileModel(QtGui.QStandardItemModel):
                 return
 
             # we don't have a group item for this search so lets add one now:
-            group_item = FileModel._GroupModelItem(search.name, group_key, work_area)
+            group_item = self._GroupModelItem(search.name, group_key, work_area)
             # (TODO) need to insert it into the right place in the list!
             self.appendRow(group_item)
+            self._group_item_map[group_key] = group_item
 
             # add children
             self._update_group_child_entity_items(group_item, search.child_entities or [])
 
         # process files:
-        self._process_files(file_list, work_area, group_item, have_local, have_publishes)
+        self._process_files(file_list, work_area, group_item, have_local, have_publishes, is_partial)
 
     def _on_finder_search_completed(self, search_id):
         """
@@ -1065,7 +1051,7 @@ class FileModel(QtGui.QStandardItemModel):
         :param search_id:   The id of the search that has completed
         """
         self._app.log_debug("File Model: Search %s completed" % search_id)
-        self._process_search_completion(search_id, FileModel.SEARCH_COMPLETED)
+        self._process_search_completion(search_id, FileModelBase.SEARCH_COMPLETED)
 
     def _on_finder_search_failed(self, search_id, error_msg):
         """
@@ -1075,7 +1061,7 @@ class FileModel(QtGui.QStandardItemModel):
         :param error_msg:   The error message reported by the search
         """
         self._app.log_debug("File Model: Search %d failed - %s" % (search_id, error_msg))
-        self._process_search_completion(search_id, FileModel.SEARCH_FAILED, error_msg)
+        self._process_search_completion(search_id, FileModelBase.SEARCH_FAILED, error_msg)
 
     def _process_search_completion(self, search_id, status, error_msg=None):
         """
@@ -1094,99 +1080,227 @@ class FileModel(QtGui.QStandardItemModel):
         search = self._in_progress_searches[search_id]
         del(self._in_progress_searches[search_id])
 
-        group_map = {}
-        for group_item in self._group_items():
-            group_map[group_item.key] = group_item
-
         entity_key = self._gen_entity_key(search.entity)
         for user in self._current_users:
             group_key = (entity_key, self._gen_entity_key(user))
-            group_item = group_map.get(group_key)
+            group_item = self._group_item_map.get(group_key)
             if not group_item:
                 continue
             group_item.set_search_status(status, error_msg)
 
             # clean the search cache entry for this item assuming the search completed successfully!
-            if status == FileModel.SEARCH_COMPLETED:
+            if status == FileModelBase.SEARCH_COMPLETED:
                 self._search_cache.set_dirty(search.entity, user, is_dirty=False)
 
-    def _on_data_retriever_work_completed(self, uid, request_type, data):
+        if not self._in_progress_searches:
+            self.searches_completed.emit()
+
+    def _request_thumbnail(self, group_key, file_item):
         """
-        Slot triggered when the data-retriever has finished doing some work.  The data retriever is currently
-        just used to download thumbnails for published files so this will be triggered when a new thumbnail
-        has been downloaded and loaded from disk.
+        Request the thumbnail for a published file.  The thumbnail disk cache is checked in a background
+        task and if the scaled thumbnail is found then it's loaded from there, otherwise it's downloaded
+        using the thumbnail scheduler.
 
-        :param uid:             The unique id representing a task being executed by the data retriever
-        :param request_type:    A string representing the type of request that has been completed
-        :param data:            The result from completing the work
+        :param group_key:   The key of the group the file is in
+        :param file_item:   The FileItem to request the thumbnail for
         """
-        if uid not in self._pending_thumbnail_requests:
-            # the completed work is of no interest to us!
+        owner = (group_key, file_item.key, file_item.version)
+        if owner in self._pending_thumbnail_owners or self._thumbnail_scheduler.has_request(owner):
+            # the thumbnail is already being looked for!
             return
-        (group_key, file_key, file_version) = self._pending_thumbnail_requests[uid]
-        del(self._pending_thumbnail_requests[uid])
-
-        # extract the thumbnail path and QImage from the data/result
-        thumb_path = data.get("thumb_path")
-        thumb_image = data.get("image")
-        if not thumb_path or not thumb_image:
+        task_id = self._bg_task_manager.add_task(self._task_load_cached_thumbnail,
+                                                 group=self._thumbnail_task_group,
+                                                 task_kwargs = {"published_file_id":file_item.published_file_id,
+                                                                "url":file_item.thumbnail_path})
+        self._pending_thumbnail_tasks[task_id] = [owner]
+        self._pending_thumbnail_owners.add(owner)
+
+    def _on_thumbnail_downloaded(self, owners, thumb_path, published_file_id, url):
+        """
+        Slot triggered when the thumbnail scheduler has downloaded a thumbnail for one or more files.  The
+        thumbnail is then loaded and scaled in a background task.
+
+        :param owners:              List of (group key, file key, file version) tuples the thumbnail is for
+        :param thumb_path:          The path on disk of the downloaded thumbnail
+        :param published_file_id:   The id of the publish the thumbnail was downloaded for
+        :param url:                 The url the thumbnail was downloaded from
+        """
+        # load and scale the thumbnail in a background task:
+        task_id = self._bg_task_manager.add_task(self._task_build_thumbnail,
+                                                 group=self._thumbnail_task_group,
+                                                 task_kwargs = {"thumb_path":thumb_path,
+                                                                "published_file_id":published_file_id,
+                                                                "url":url})
+        self._pending_thumbnail_tasks[task_id] = owners
+        self._pending_thumbnail_owners.update(owners)
+
+    def _task_build_thumbnail(self, thumb_path, published_file_id, url):
+        """
+        Background task that loads and scales a downloaded thumbnail and adds the scaled thumbnail to
+        the thumbnail disk cache.
+
+        :param thumb_path:          The path on disk of the downloaded thumbnail
+        :param published_file_id:   The id of the publish the thumbnail was downloaded for
+        :param url:                 The url the thumbnail was downloaded from
+        :returns:                   Dictionary containing the key of the thumbnail in the thumbnail cache and
+                                    the scaled QImage if a pixmap isn't already cached for the key
+        """
+        add_to_disk_cache = (published_file_id
+                             and not g_thumbnail_disk_cache.contains(published_file_id, url))
+        thumb_key, thumb_image = build_thumbnail_image(thumb_path, use_cache=not add_to_disk_cache)
+        if add_to_disk_cache and thumb_image:
+            g_thumbnail_disk_cache.add(published_file_id, url, thumb_key, thumb_image)
+        return {"thumb_key":thumb_key, "thumb_image":thumb_image}
+
+    def _task_load_cached_thumbnail(self, published_file_id, url):
+        """
+        Background task that loads a scaled thumbnail from the thumbnail disk cache.
+
+        :param published_file_id:   The id of the publish the thumbnail is for
+        :param url:                 The url the thumbnail is downloaded from
+        :returns:                   Dictionary containing the key of the thumbnail in the thumbnail cache and
+                                    the QImage if a pixmap isn't already cached for the key.  If the thumbnail
+                                    isn't in the disk cache then the dictionary contains the publish id and
+                                    url the thumbnail needs to be downloaded for instead
+        """
+        thumb_path, thumb_key = g_thumbnail_disk_cache.find(published_file_id, url)
+        if not thumb_path:
+            return {"thumb_key":None, "thumb_image":None,
+                    "download":(url, published_file_id)}
+        if g_thumbnail_cache.contains(thumb_key):
+            return {"thumb_key":thumb_key, "thumb_image":None}
+        thumb_image = QtGui.QImage(thumb_path)
+        if thumb_image.isNull():
+            return {"thumb_key":None, "thumb_image":None}
+        return {"thumb_key":thumb_key, "thumb_image":thumb_image}
+
+    def _on_background_task_completed(self, task_id, group, result):
+        """
+        Slot triggered when a background task has completed.  If the task was one that scaled a
+        thumbnail then the thumbnail is converted to a pixmap and all items for the file are updated.
+
+        :param task_id: The id of the task that completed
+        :param group:   The group the task was in
+        :param result:  The result returned by the task
+        """
+        if task_id not in self._pending_thumbnail_tasks:
+            # the completed task is of no interest to us!
             return
-
-        # find all file items for this file:
-        model_items = self._find_current_items(group_key, file_key, file_version)
-        if not model_items:
+        owners = self._pending_thumbnail_tasks[task_id]
+        del(self._pending_thumbnail_tasks[task_id])
+        self._pending_thumbnail_owners.difference_update(owners)
+
+        thumb_key = result.get("thumb_key")
+        thumb_image = result.get("thumb_image")
+        if result.get("download"):
+            # the thumbnail isn't in the disk cache so request it using the thumbnail scheduler:
+            url, published_file_id = result["download"]
+            for owner in owners:
+                self._thumbnail_scheduler.request(owner, url, published_file_id)
+            return
+        if not thumb_key:
+            return
+        if thumb_image:
+            # pixmaps can only be created on the main thread:
+            g_thumbnail_cache.add(thumb_key, QtGui.QPixmap.fromImage(thumb_image))
+        elif not g_thumbnail_cache.contains(thumb_key):
+            # the cached pixmap has been discarded in the meantime!
             return
 
-        # find the work area associated with the group:
-        work_area = None
-        for group_item in self._group_items():
-            if group_item.key == group_key:
-                work_area = group_item.work_area
-                break
+        for (group_key, file_key, file_version) in owners:
+            # find all file items for this file:
+            model_items = self._find_current_items(group_key, file_key, file_version)
+            if not model_items:
+                continue
 
-        # prepare a pixmap from the thumbnail image:
-        thumb = self._build_thumbnail(thumb_image)
-        if not thumb:
-            return
+            # find the work area associated with the group:
+            group_item = self._group_item_map.get(group_key)
+            work_area = group_item.work_area if group_item else None
 
-        # update all files and items with this thumbnail:
-        for model_item in model_items:
-            file_item = model_item.file_item
-            file_item.thumbnail = thumb
-            model_item.emitDataChanged()
+            # update all files and items with this thumbnail:
+            for model_item in model_items:
+                file_item = model_item.file_item
+                file_item.thumbnail_key = thumb_key
+                model_item.emitDataChanged()
 
-            if work_area:
-                # update thumbnails on all file versions:
-                self._update_version_thumbnails(file_item.key, group_key, work_area)
+                if work_area:
+                    # update thumbnails on all file versions:
+                    self._update_version_thumbnails(file_item.key, group_key, work_area)
 
-    def _on_data_retriever_work_failed(self, uid, error_msg):
+    def _on_background_task_failed(self, task_id, group, msg, stack_trace):
         """
-        Slot triggered when the data retriever fails to do some work!
+        Slot triggered when a background task fails for some reason!
+
+        :param task_id:     The id of the task that failed
+        :param group:       The group the task was in
+        :param msg:         The error message for the failed task
+        :param stack_trace: The stack trace of the failure
+        """
+        if task_id not in self._pending_thumbnail_tasks:
+            return
+        owners = self._pending_thumbnail_tasks[task_id]
+        del(self._pending_thumbnail_tasks[task_id])
+        self._pending_thumbnail_owners.difference_update(owners)
+        self._app.log_debug("File Model: Failed to build thumbnail: %s" % msg)
 
-        :param uid:         The unique id representing the task that the data retriever failed on
-        :param error_msg:   The error message for the failed task
+    def _update_latest_versions(self, group_item, work_area, file_keys, clear=False):
         """
-        if uid in self._pending_thumbnail_requests:
-            del(self._pending_thumbnail_requests[uid])
-        self._app.log_debug("File Model: Failed to find thumbnail for id %s: %s" % (uid, error_msg))
+        Update the index of the latest work file and publish versions of each file in a group so that
+        the latest version of a file can be found without having to look at all of its versions.
 
-    def _update_group_file_items(self, group_item):
+        :param group_item:  The _GroupModelItem representing the group in the model
+        :param work_area:   The WorkArea instance that all files in the group belong to
+        :param file_keys:   The set of file keys to update the index for
+        :param clear:       If True then the index is cleared first so that it only contains the
+                            specified file keys
+        """
+        latest_versions = group_item.latest_versions
+        if clear:
+            latest_versions.clear()
+
+        for file_key in file_keys:
+            latest_work_file_version = None
+            latest_publish_version = None
+            file_versions = self._search_cache.find_file_versions(work_area, file_key) or {}
+            for version, file_item in file_versions.iteritems():
+                if file_item.is_local and (latest_work_file_version is None
+                                           or version > latest_work_file_version):
+                    latest_work_file_version = version
+                if file_item.is_published and (latest_publish_version is None
+                                                or version > latest_publish_version):
+                    latest_publish_version = version
+
+            if latest_work_file_version is None and latest_publish_version is None:
+                latest_versions.pop(file_key, None)
+            else:
+                latest_versions[file_key] = (latest_work_file_version, latest_publish_version)
+
+    def _update_group_file_items(self, group_item, file_keys=None):
         """
         Update all file model items within the specified group model item.  This updates each file's
-        tooltip, associated versions and thumbnail and ensures that the correct dataChanged signal is
-        emitted for them.
+        associated versions and thumbnail, drops any tooltip and subtitle cached for the file model item
+        and ensures that the correct dataChanged signal is emitted for them.
 
         :param group_item:  The _GroupModelItem representing the group in the model
+        :param file_keys:   Optional set of file keys to limit the update to.  If None then all file
+                            model items in the group are updated.
         """
         work_area = group_item.work_area
         if not work_area:
             return
 
+        if file_keys is None:
+            file_model_items = list(self._file_items(group_item))
+        else:
+            # look up the items for the file keys directly rather than iterating over the whole group:
+            file_model_items = []
+            for file_key in file_keys:
+                file_model_items.extend(self._find_current_items(group_item.key, file_key, None))
+
         # get a unique list of all file keys under the group:
         unique_file_keys = set()
-        for item in self._file_items(group_item):
-            file_item = item.file_item
-            unique_file_keys.add(file_item.key)
+        for item in file_model_items:
+            unique_file_keys.add(item.file_item.key)
 
         if not unique_file_keys:
             return
@@ -1197,25 +1311,33 @@ class FileModel(QtGui.QStandardItemModel):
             file_versions = self._search_cache.find_file_versions(work_area, file_key) or {}
 
             # update thumbnail and versions for each version:
-            thumb = None
+            thumb_key = None
             for _, version in sorted(file_versions.iteritems(), reverse=False):
                 if version.thumbnail_path:
                     # this file version should have a thumbnail!
-                    thumb = version.thumbnail
+                    thumb_key = version.thumbnail_key
                 else:
                     # lets use the current thumbnail for this version:
-                    version.thumbnail = thumb
+                    version.thumbnail_key = thumb_key
 
                 # store the file versions on the file as well:
                 version.versions = file_versions
 
-        # update tooltips on all file items:
-        for file_model_item in self._file_items(group_item):
+        # the details of the files may have changed so update them in the search index:
+        for file_model_item in file_model_items:
             file_item = file_model_item.file_item
-            tooltip = ""
-            if file_item:
-                tooltip = file_item.format_tooltip()
-            file_model_item.setToolTip(tooltip)
+            self._search_index.add((group_item.key, file_item.key, file_item.version), file_item)
+
+        if file_keys is not None:
+            # only emit data changed signals for the items that were updated - this also drops the
+            # tooltip and subtitle cached for each item:
+            for file_model_item in file_model_items:
+                file_model_item.emitDataChanged()
+            return
+
+        # drop the cached tooltips and subtitles so they are rebuilt when they are next requested:
+        for file_model_item in file_model_items:
+            file_model_item.clear_display_cache()
 
         # emit data changed signal for all items in the group:
         row_count = group_item.rowCount()
@@ -1233,77 +1355,323 @@ class FileModel(QtGui.QStandardItemModel):
         :param work_area:   A WorkArea instance that all files in this group belong to
         """
         file_versions = self._search_cache.find_file_versions(work_area, file_key) or {}
-        thumb = None
+        thumb_key = None
         for _, version in sorted(file_versions.iteritems(), reverse=False):
             if version.thumbnail_path:
                 # this file version should have a thumbnail!
-                thumb = version.thumbnail
+                thumb_key = version.thumbnail_key
             else:
-                if version.thumbnail != thumb:
+                if version.thumbnail_key != thumb_key:
                     # lets use the current thumbnail for this version:
-                    version.thumbnail = thumb
+                    version.thumbnail_key = thumb_key
 
                     # emit a data changed signal for any model items that are affected:
                     version_items = self._find_current_items(group_key, version.key, version.version)
                     for item in version_items:
                         item.emitDataChanged()
 
-    def _build_thumbnail(self, thumb_path_or_image):
+
+class FileModel(FileModelBase, QtGui.QStandardItemModel):
+    """
+    The FileModel maintains a model of all files (work files and publishes) found for a matrix of
+    entities and users, storing each group, folder and file as a QStandardItem.
+    """
+
+    class _BaseModelItem(QtGui.QStandardItem):
+        """
+        Base model item for storage of the file data in the model.
         """
-        Build a thumbnail from the specified path or QImage with uniform dimensions.
 
-        :param thumb_path_or_image: A string representing the path on disk of the thumbnail to load
-                                    or a QImage containing the thumbnail to use.
-        :returns:                   A QPixmap of size 576/374 pixels containing the scaled thumbnail
+        def __init__(self, typ, text=None):
+            """
+            :param typ:     The type of item this represents (see enumeration of node types above)
+            :param text:    String used for the label/display role for this item
+            """
+            QtGui.QStandardItem.__init__(self, text or "")
+            self._type = typ
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == FileModel.NODE_TYPE_ROLE:
+                return self._type
+            else:
+                # just return the default implementation:
+                return QtGui.QStandardItem.data(self, role)
+
+        def setData(self, value, role):
+            """
+            Set the data on the item for the specified role
+
+            :param value:   The value to set the data with
+            :param role:    The role to set the data for
+            """
+            if role == FileModel.NODE_TYPE_ROLE:
+                # do nothing as the data can't be set:
+                pass
+            else:
+                # call the base implementation:
+                QtGui.QStandardItem.setData(self, value, role)
+
+    class _FileModelItem(_BaseModelItem):
+        """
+        Model item that represents a single FileItem in the model
         """
-        # load the thumbnail
-        thumb = QtGui.QPixmap(thumb_path_or_image)
-        if not thumb or thumb.isNull():
-            return
 
-        # make sure the thumbnail is a good size with the correct aspect ratio:
-        MAX_WIDTH = 576 # 96
-        MAX_HEIGHT = 374 # 64
-        ASPECT = float(MAX_WIDTH) / MAX_HEIGHT
-
-        thumb_sz = thumb.size()
-        thumb_aspect = float(thumb_sz.width()) / thumb_sz.height()
-        max_thumb_sz = QtCore.QSize(MAX_WIDTH, MAX_HEIGHT)
-        if thumb_aspect >= ASPECT:
-            # scale based on width:
-            if thumb_sz.width() > MAX_WIDTH:
-                thumb_sz *= (float(MAX_WIDTH) / thumb_sz.width())
+        def __init__(self, file_item, work_area):
+            """
+            :param file_item:    The FileItem instance this model item represents
+            :param work_area:    The WorkArea this file item belongs to
+            """
+            FileModel._BaseModelItem.__init__(self, typ=FileModel.FILE_NODE_TYPE)
+            self._file_item = file_item
+            self._work_area = work_area
+            # tooltip, subtitle and sort key are only built when first requested:
+            self._tooltip = None
+            self._subtitle = None
+            self._sort_key = None
+
+        @property
+        def file_item(self):
+            """
+            :returns:    The file item this model item represents
+            """
+            return self._file_item
+
+        @property
+        def work_area(self):
+            """
+            :returns:    The work area the file belongs to
+            """
+            return self._work_area
+
+        def clear_display_cache(self):
+            """
+            Drop the cached tooltip, subtitle and sort key so that they are rebuilt when next requested.
+            """
+            self._tooltip = None
+            self._subtitle = None
+            self._sort_key = None
+
+        def emitDataChanged(self):
+            """
+            Overriden from base class.  Drops the cached tooltip, subtitle and sort key before emitting the
+            dataChanged signal for the item.
+            """
+            self.clear_display_cache()
+            FileModel._BaseModelItem.emitDataChanged(self)
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == QtCore.Qt.DisplayRole:
+                return "%s, v%0d" % (self._file_item.name, self._file_item.version)
+            elif role == QtCore.Qt.ToolTipRole:
+                if self._tooltip is None:
+                    self._tooltip = self._file_item.format_tooltip()
+                return self._tooltip
+            elif role == FileModel.SUBTITLE_ROLE:
+                if self._subtitle is None:
+                    self._subtitle = self._file_item.format_subtitle()
+                return self._subtitle
+            elif role == FileModel.SORT_ROLE:
+                if self._sort_key is None:
+                    # files are sorted after any folders:
+                    self._sort_key = "1|%s" % self._file_item.get_sort_key()
+                return self._sort_key
+            elif role == FileModel.FILE_ITEM_ROLE:
+                return self._file_item
+            elif role == FileModel.WORK_AREA_ROLE:
+                return self._work_area
+            elif role == FileModel.LATEST_VERSIONS_ROLE:
+                group_item = self.parent()
+                if isinstance(group_item, FileModel._GroupModelItem):
+                    return group_item.latest_versions.get(self._file_item.key)
+                return None
             else:
-                max_thumb_sz *= (float(thumb_sz.width()) / MAX_WIDTH)
-        else:
-            # scale based on height:
-            if thumb_sz.height() > MAX_HEIGHT:
-                thumb_sz *= (float(MAX_HEIGHT) / thumb_sz.height())
+                # just return the default implementation:
+                return FileModel._BaseModelItem.data(self, role)
+
+        def setData(self, value, role):
+            """
+            Set the data on the item for the specified role
+
+            :param value:   The value to set the data with
+            :param role:    The role to set the data for
+            """
+            if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole, FileModel.SUBTITLE_ROLE,
+                        FileModel.LATEST_VERSIONS_ROLE, FileModel.SORT_ROLE):
+                # do nothing as these can't be set!
+                pass
+            elif role == FileModel.FILE_ITEM_ROLE:
+                self._file_item = value
+                self.emitDataChanged()
+            elif role == FileModel.WORK_AREA_ROLE:
+                self._work_area = value
+                self.emitDataChanged()
+            else:
+                # call the base implementation:
+                FileModel._BaseModelItem.setData(self, value, role)
+
+    class _FolderModelItem(_BaseModelItem):
+        """
+        Model item that represents a folder in the model.  These are used when a group has entity
+        children that need to be represented in the model.
+        """
+
+        def __init__(self, name, entity):
+            """
+            :param name:    The name to use for the model item display role
+            :param entity:  A Shotgun entity dictionary for the entity that this folder item represents
+            """
+            FileModel._BaseModelItem.__init__(self, typ=FileModel.FOLDER_NODE_TYPE, text=name)
+            self._entity = entity
+
+        @property
+        def entity(self):
+            """
+            :returns:   An entity dictionary representing the entity represented by this item
+            """
+            return self._entity
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == FileModel.SORT_ROLE:
+                # folders are sorted alphabetically before any files:
+                return "0|%s" % (self.text() or "").lower()
             else:
-                max_thumb_sz *= (float(thumb_sz.height()) / MAX_HEIGHT)
-
-        if thumb_sz != thumb.size():
-            thumb = thumb.scaled(thumb_sz.width(), thumb_sz.height(),
-                                 QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
-
-        # create base pixmap with the correct aspect ratio that the thumbnail will fit in
-        # and fill it with a transparent colour:
-        thumb_base = QtGui.QPixmap(max_thumb_sz)
-        thumb_base.fill(QtGui.QColor(QtCore.Qt.transparent))
-
-        # create a painter to paint into this pixmap:
-        painter = QtGui.QPainter(thumb_base)
-        try:
-            painter.setRenderHint(QtGui.QPainter.Antialiasing)
-
-            # paint the thumbnail into this base making sure it's centered:
-            diff = max_thumb_sz - thumb.size()
-            offset = diff / 2
-            brush = QtGui.QBrush(thumb)
-            painter.setBrush(brush)
-            painter.translate(offset.width(), offset.height())
-            painter.drawRect(0, 0, thumb.width(), thumb.height())
-        finally:
-            painter.end()
-
-        return thumb_base
+                # just return the default implementation:
+                return FileModel._BaseModelItem.data(self, role)
+
+    class _GroupModelItem(_BaseModelItem):
+        """
+        Model item that represents a group in the model.  A group is a per-user, per-entity item that contains
+        the files found for the group as well as any additional child entities.
+        """
+
+        def __init__(self, name, key, work_area=None):
+            """
+            :param name:        The name to use for the model items display role
+            :param key:         A unique key representing this group
+            :param work_area:   A WorkArea instance that this group represents
+            """
+            FileModel._BaseModelItem.__init__(self, typ=FileModel.GROUP_NODE_TYPE, text=name)
+
+            self._search_status = FileModel.SEARCH_COMPLETED
+            self._search_msg = ""
+            self._key = key
+            self._work_area = work_area
+            self._latest_versions = {}# file key:(latest work file version, latest publish version)
+
+        @property
+        def key(self):
+            """
+            :returns:   The unique key for this group
+            """
+            return self._key
+
+        @property
+        def latest_versions(self):
+            """
+            :returns:   Dictionary of the latest work file and publish versions for each file in this group
+            """
+            return self._latest_versions
+
+        # @property
+        def _get_work_area(self):
+            """
+            :returns:   The WorkArea instance associated with this item
+            """
+            return self._work_area
+
+        # @work_area.setter
+        def _set_work_area(self, work_area):
+            """
+            Set the work area associated with this item
+
+            :param work_area:   The WorkArea to associate with this item
+            """
+            self._work_area = work_area
+            self.emitDataChanged()
+
+        work_area = property(_get_work_area, _set_work_area)
+
+        def set_search_status(self, status, msg=None):
+            """
+            Set the search status for this item and emit a dataChanged signal to indicate it's changed.
+
+            :param status:  The search status (see the search status enumeration above) to update this item with
+            :param msg:     The status message if any to update this item with
+            """
+            self._search_status = status
+            self._search_msg = msg
+            self.emitDataChanged()
+
+        def data(self, role):
+            """
+            Return the data from the item for the specified role.
+
+            :param role:    The role to return data for.
+            :returns:       Data for the specified role
+            """
+            if role == FileModel.SEARCH_STATUS_ROLE:
+                return self._search_status
+            elif role == FileModel.SEARCH_MSG_ROLE:
+                return self._search_msg
+            elif role == FileModel.WORK_AREA_ROLE:
+                return self._work_area
+            elif role == FileModel.SORT_ROLE:
+                # groups are kept in the order they are in the model:
+                return self.row()
+            else:
+                # just return the default implementation:
+                return FileModel._BaseModelItem.data(self, role)
+
+        def setData(self, value, role):
+            """
+            Set the data on the item for the specified role
+
+            :param value:   The value to set the data with
+            :param role:    The role to set the data for
+            """
+            if role == FileModel.SEARCH_STATUS_ROLE:
+                self._search_status = value
+                self.emitDataChanged()
+            elif role == FileModel.SEARCH_MSG_ROLE:
+                self._search_msg = value
+                self.emitDataChanged()
+            elif role == FileModel.WORK_AREA_ROLE:
+                self._work_area = value
+                self.emitDataChanged()
+            else:
+                # call the base implementation:
+                FileModel._BaseModelItem.setData(self, value, role)
+
+    # Signal emitted when sandboxes are used, but before we know which ones
+    uses_user_sandboxes = QtCore.Signal(object) # Work area that uses sandboxes.
+    # Signal emitted when the sandbox_users_found when users were found in the sandbox.
+    sandbox_users_found = QtCore.Signal(list)# list of users
+    # Signal emitted when all in-progress searches have completed.
+    searches_completed = QtCore.Signal()
+
+    def __init__(self, bg_task_manager, parent):
+        """
+        :param bg_task_manager: A BackgroundTaskManager instance that will be used for all background/threaded
+                                work that needs undertaking
+        :param parent:          The parent QObject for this instance
+        """
+        QtGui.QStandardItemModel.__init__(self, parent)
+        FileModelBase.__init__(self, bg_task_manager)
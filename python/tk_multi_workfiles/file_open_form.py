@@ -25,6 +25,8 @@ from .file_form_base import FileFormBase
 from .ui.file_open_form import Ui_FileOpenForm
 
 from .work_area import WorkArea
+from .context_cache import g_context_cache
+from .path_cache_sync import g_path_cache_sync
 from .util import  get_template_user_keys
 
 
@@ -134,13 +136,27 @@ class FileOpenForm(FileFormBase):
         """
         Slot triggered whenever the work area is changed in the browser.
         """
+        self._update_work_area(entity)
+
+        if not self._navigating:
+            destination_label = breadcrumbs[-1].label if breadcrumbs else "..."
+            self._ui.nav.add_destination(destination_label, breadcrumbs)
+        self._ui.breadcrumbs.set(breadcrumbs)
+
+    def _update_work_area(self, entity):
+        """
+        Update the new file button for the work area of the specified entity.
+
+        :param entity:  The entity the work area is for or None
+        """
         env_details = None
         if entity:
             # (AD) - we need to build a context and construct the environment details
-            # instance for it but this may be slow enough that we should cache it!
-            # Keep an eye on it and consider threading if it's noticeably slow!
-            app = sgtk.platform.current_bundle()
-            context = app.sgtk.context_from_entity_dictionary(entity)
+            # instance for it.  Both the context and the settings are cached but keep an
+            # eye on it and consider threading if it's noticeably slow!
+            # Don't block the UI if the path cache is being synchronized - just update
+            # the work area again once it has been:
+            context = g_context_cache.context_from_entity(entity, wait_for_sync=False)
             try:
                 env_details = WorkArea(context)
             except sgtk.TankError:
@@ -152,10 +168,10 @@ class FileOpenForm(FileFormBase):
 
         self._update_new_file_btn(env_details)
 
-        if not self._navigating:
-            destination_label = breadcrumbs[-1].label if breadcrumbs else "..."
-            self._ui.nav.add_destination(destination_label, breadcrumbs)
-        self._ui.breadcrumbs.set(breadcrumbs)
+        if entity and g_path_cache_sync.is_syncing:
+            self._call_after_path_cache_sync(lambda: self._update_work_area(entity))
+        else:
+            self._call_after_path_cache_sync(None)
 
     def _on_browser_file_double_clicked(self, file, env):
         """
@@ -25,6 +25,8 @@ from sgtk import TankError
 from .file_form_base import FileFormBase
 from .ui.file_save_form import Ui_FileSaveForm
 from .work_area import WorkArea
+from .context_cache import g_context_cache
+from .path_cache_sync import g_path_cache_sync
 from .file_item import FileItem
 from .file_finder import FileFinder
 from .util import value_to_str
@@ -59,6 +61,11 @@ class FileSaveForm(FileFormBase):
         self._preview_task = None
         self._navigating = False
 
+        # the task manager may outlive this form so make sure to disconnect from it when the form is
+        # closed:
+        self._bg_task_manager.task_completed.connect(self._on_preview_generation_complete)
+        self._bg_task_manager.task_failed.connect(self._on_preview_generation_failed)
+
         font_colour = self.palette().text().color()
         if font_colour.value() < 0.5:
             # make preview text colour 40% lighter
@@ -162,6 +169,14 @@ class FileSaveForm(FileFormBase):
         # clean up the browser:
         self._ui.browser.shut_down()
 
+        # stop any preview task and disconnect from the task manager:
+        if self._bg_task_manager:
+            if self._preview_task:
+                self._bg_task_manager.stop_task(self._preview_task)
+                self._preview_task = None
+            self._bg_task_manager.task_completed.disconnect(self._on_preview_generation_complete)
+            self._bg_task_manager.task_failed.disconnect(self._on_preview_generation_failed)
+
         # be sure to call the base clase implementation
         return FileFormBase.closeEvent(self, event)
 
@@ -227,8 +242,6 @@ class FileSaveForm(FileFormBase):
         ext_idx = self._ui.file_type_menu.currentIndex()
         ext = self._extension_choices[ext_idx] if ext_idx >= 0 else ""
 
-        self._bg_task_manager.task_completed.connect(self._on_preview_generation_complete)
-        self._bg_task_manager.task_failed.connect(self._on_preview_generation_failed)
         self._bg_task_manager.start_processing()
 
         # create the preview task:
@@ -466,10 +479,25 @@ class FileSaveForm(FileFormBase):
         """
         Invoked when the selection changes in My Tasks or one of the entity views.
         """
-        env = None
+        self._update_work_area(entity)
+
+        if not self._navigating:
+            destination_label = breadcrumbs[-1].label if breadcrumbs else "..."
+            self._ui.nav.add_destination(destination_label, breadcrumbs)
+        self._ui.breadcrumbs.set(breadcrumbs)
+
+
+    def _update_work_area(self, entity):
+        """
+        Update the form for the work area of the specified entity.
+
+        :param entity:  The entity the work area is for or None
+        """
         if entity:
             app = sgtk.platform.current_bundle()
-            context = app.sgtk.context_from_entity_dictionary(entity)
+            # don't block the UI if the path cache is being synchronized - just update the work
+            # area again once it has been:
+            context = g_context_cache.context_from_entity(entity, wait_for_sync=False)
 
             try:
                 env = WorkArea(context)
@@ -480,11 +508,10 @@ class FileSaveForm(FileFormBase):
                 self._on_work_area_changed(env)
                 self._start_preview_update()
 
-        if not self._navigating:
-            destination_label = breadcrumbs[-1].label if breadcrumbs else "..."
-            self._ui.nav.add_destination(destination_label, breadcrumbs)
-        self._ui.breadcrumbs.set(breadcrumbs)
-
+        if entity and g_path_cache_sync.is_syncing:
+            self._call_after_path_cache_sync(lambda: self._update_work_area(entity))
+        else:
+            self._call_after_path_cache_sync(None)
 
     def _on_navigate(self, breadcrumb_trail):
         """
@@ -51,7 +51,7 @@ class FileSearchCache(Threaded):
         self._cache = {}
 
     @Threaded.exclusive
-    def add(self, work_area, files, is_dirty=None):
+    def add(self, work_area, files, is_dirty=None, merge=False):
         """
         Add the specified files to the cache along with the work area they were found in
 
@@ -62,6 +62,8 @@ class FileSearchCache(Threaded):
         :param is_dirty:    True if this cache entry should be marked as dirty, False if not.  If
                             is_dirty is None then the previous value will be used or True if there
                             is no previous value.
+        :param merge:       If True then the files are added to the files already cached for the work
+                            area rather than replacing them.
         """
         # find the current entry if there is one - this also returns the cache key:
         key, current_entry = self._find_entry(work_area)
@@ -73,8 +75,12 @@ class FileSearchCache(Threaded):
                 # default dirty to True
                 is_dirty = True
 
-        # build the new cache entry from the list of files:
-        new_entry = FileSearchCache._CacheEntry()
+        if merge and current_entry:
+            # update the current entry in place:
+            new_entry = current_entry
+        else:
+            # build the new cache entry from the list of files:
+            new_entry = FileSearchCache._CacheEntry()
         new_entry.work_area = work_area
         new_entry.is_dirty = is_dirty
         for file_item in files:
@@ -161,6 +167,17 @@ class FileSearchCache(Threaded):
             return
         entry.is_dirty = dirty
 
+    @Threaded.exclusive
+    def get_file_count(self):
+        """
+        :returns:   The total number of file versions in the cache
+        """
+        count = 0
+        for entry in self._cache.itervalues():
+            for file_info in entry.file_info.itervalues():
+                count += len(file_info.versions)
+        return count
+
     @Threaded.exclusive
     def clear(self):
         """
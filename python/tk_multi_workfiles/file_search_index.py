@@ -0,0 +1,208 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+In-memory full-text index used to search files by name, publish description and user.
+"""
+
+_EMPTY_SET = frozenset()
+
+
+def to_search_str(value):
+    """
+    Convert a value to a lower-case unicode string that can be searched.
+
+    :param value:   The string value to convert
+    :returns:       The lower-case unicode string
+    """
+    if not value:
+        return u""
+    if isinstance(value, str):
+        value = value.decode("utf-8", "replace")
+    return unicode(value).lower()
+
+
+def _get_trigrams(text):
+    """
+    :param text:    The text to return the trigrams for
+    :returns:       A set of all the three-character sequences contained in the text
+    """
+    return set(text[i:i+3] for i in range(len(text) - 2))
+
+
+class FileSearchIndex(object):
+    """
+    Full-text index of the files in a file model.  Files are searched by their name, publish description
+    and the names of the users that last modified or published them.
+
+    The text for each file is indexed by trigram so that a search only needs to check files that contain
+    all trigrams of a search term.  The matches for the last search are also kept up to date as files are
+    added and removed so that a search that extends the last search (e.g. as the user types) only needs
+    to check the files that matched the last search.
+
+    Files are indexed on behalf of an 'owner' which is a (group key, file key, file version) tuple
+    identifying the model item the file is for.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        self._texts = {}# FileItem:search text
+        self._owners = {}# owner:FileItem
+        self._trigram_index = {}# trigram:set(FileItem)
+
+        self._last_raw_query = None
+        self._last_query = None
+        self._last_terms = None
+        self._last_matches = None
+
+    def clear(self):
+        """
+        Clear the index
+        """
+        self._texts = {}
+        self._owners = {}
+        self._trigram_index = {}
+        self._last_raw_query = None
+        self._last_query = None
+        self._last_terms = None
+        self._last_matches = None
+
+    def add(self, owner, file_item):
+        """
+        Add a file to the index or update it if it's already in the index.
+
+        :param owner:       Tuple (group key, file key, file version) the file is indexed for
+        :param file_item:   The FileItem to index
+        """
+        text = FileSearchIndex._get_search_text(file_item)
+        prev_file_item = self._owners.get(owner)
+        if prev_file_item is file_item and self._texts.get(file_item) == text:
+            # nothing has changed!
+            return
+        if prev_file_item is not None:
+            self._remove_file_item(prev_file_item)
+
+        self._owners[owner] = file_item
+        self._texts[file_item] = text
+        for trigram in _get_trigrams(text):
+            self._trigram_index.setdefault(trigram, set()).add(file_item)
+
+        # keep the last matches up to date:
+        if self._last_matches is not None and self._matches(text, self._last_terms):
+            self._last_matches.add(file_item)
+
+    def remove(self, owner):
+        """
+        Remove a file from the index.
+
+        :param owner:   Tuple (group key, file key, file version) the file was indexed for
+        """
+        file_item = self._owners.pop(owner, None)
+        if file_item is not None:
+            self._remove_file_item(file_item)
+
+    def find(self, query):
+        """
+        Find all files that match the query.  The query is split into whitespace separated terms and a
+        file matches if all of the terms are found in its name, publish description or user names.  The
+        search is case-insensitive.
+
+        :param query:   The query string to search for
+        :returns:       A set containing all matching FileItems
+        """
+        if self._last_raw_query is not None and query == self._last_raw_query:
+            # this is typically called for every file in the model with the same query:
+            return self._last_matches
+
+        raw_query = query
+        query = to_search_str(query)
+        terms = set(query.split())
+
+        if query == self._last_query:
+            self._last_raw_query = raw_query
+            return self._last_matches
+
+        candidates = None
+        if self._last_query is not None and query.startswith(self._last_query):
+            # this search extends the last search so the matches must be a subset of the last matches:
+            candidates = self._last_matches
+        else:
+            # find the files that contain all trigrams of the search terms:
+            trigram_sets = []
+            for term in terms:
+                trigram_sets.extend(self._trigram_index.get(trigram, _EMPTY_SET)
+                                    for trigram in _get_trigrams(term))
+            if trigram_sets:
+                trigram_sets.sort(key=len)
+                candidates = set(trigram_sets[0])
+                for trigram_set in trigram_sets[1:]:
+                    if not candidates:
+                        break
+                    candidates &= trigram_set
+            else:
+                # there are no terms or they are all too short for the trigram index so all files
+                # need to be checked:
+                candidates = self._texts
+
+        matches = set(f for f in candidates if self._matches(self._texts[f], terms))
+
+        self._last_raw_query = raw_query
+        self._last_query = query
+        self._last_terms = terms
+        self._last_matches = matches
+        return matches
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    @staticmethod
+    def _get_search_text(file_item):
+        """
+        :param file_item:   The FileItem to get the search text for
+        :returns:           The lower-case text the file can be searched by
+        """
+        parts = [file_item.name, file_item.publish_description]
+        for user in (file_item.modified_by, file_item.published_by):
+            if user and user.get("name"):
+                parts.append(user["name"])
+        # parts are separated by a newline so that search terms can't match across them:
+        return u"\n".join(to_search_str(part) for part in parts if part)
+
+    @staticmethod
+    def _matches(text, terms):
+        """
+        :param text:    The search text for a file
+        :param terms:   The search terms
+        :returns:       True if the text contains all of the search terms, otherwise False
+        """
+        for term in terms:
+            if term not in text:
+                return False
+        return True
+
+    def _remove_file_item(self, file_item):
+        """
+        Remove a file from the index
+
+        :param file_item:   The FileItem to remove
+        """
+        text = self._texts.pop(file_item, None)
+        if text is None:
+            return
+        for trigram in _get_trigrams(text):
+            trigram_set = self._trigram_index.get(trigram)
+            if trigram_set is not None:
+                trigram_set.discard(file_item)
+                if not trigram_set:
+                    del(self._trigram_index[trigram])
+        if self._last_matches is not None:
+            self._last_matches.discard(file_item)
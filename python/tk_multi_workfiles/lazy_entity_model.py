@@ -0,0 +1,666 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Entity model that queries Shotgun one level of the hierarchy at a time.
+"""
+
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+
+from .entity_search_index import get_sg_value_key
+
+shotgun_globals = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_globals")
+
+
+class LazyEntityModel(QtGui.QStandardItemModel):
+    """
+    Model representing a hierarchy of Shotgun entities, similar to the ShotgunEntityModel, where each
+    level of the hierarchy is only queried when its parent item is expanded.  The upper levels of the
+    hierarchy are queried using grouped summary queries so only the entities in the leaf level of the
+    hierarchy are ever retrieved from Shotgun.  Searches are run by Shotgun and only the branches
+    containing matching entities are added to the tree.
+
+    All queries are run in the background - data_refreshed is emitted whenever the results of a query
+    have been added to the model.
+
+    The model provides the subset of the ShotgunEntityModel interface used by the entity tree views.
+    """
+
+    class _LevelItem(QtGui.QStandardItem):
+        """
+        Model item representing a single value of one of the upper levels of the hierarchy.
+        """
+        def __init__(self, text, value, path, filters):
+            """
+            :param text:    The text to display for the item
+            :param value:   The Shotgun field value the item represents
+            :param path:    Tuple of the value keys (see get_sg_value_key()) from the root of the tree
+                            to this item
+            :param filters: Shotgun filters for the entities below this item
+            """
+            QtGui.QStandardItem.__init__(self, text)
+            self.value = value
+            self.path = path
+            self.filters = filters
+
+        def get_sg_data(self):
+            """
+            :returns:   None as level items don't represent Shotgun entities directly
+            """
+            return None
+
+    class _EntityItem(QtGui.QStandardItem):
+        """
+        Model item representing a single entity in the leaf level of the hierarchy.
+        """
+        def __init__(self, text, sg_data):
+            """
+            :param text:    The text to display for the item
+            :param sg_data: The Shotgun data for the entity
+            """
+            QtGui.QStandardItem.__init__(self, text)
+            self.sg_data = sg_data
+
+        def get_sg_data(self):
+            """
+            :returns:   The Shotgun data for the entity
+            """
+            return self.sg_data
+
+    # Signal emitted when data has been loaded from Shotgun
+    data_refreshed = QtCore.Signal(bool)# modifications made
+    # Signal emitted when loading data from Shotgun failed
+    data_refresh_fail = QtCore.Signal(str)# error message
+
+    def __init__(self, entity_type, filters, hierarchy, fields, parent, bg_task_manager):
+        """
+        Construction
+
+        :param entity_type:     The type of the entities in the leaf level of the hierarchy
+        :param filters:         Shotgun filters for the entities
+        :param hierarchy:       List of the fields used to build the hierarchy, e.g.
+                                ["entity.Shot.sg_sequence", "entity", "step", "content"]
+        :param fields:          Additional fields to retrieve for the entities
+        :param parent:          The parent QObject for this instance
+        :param bg_task_manager: A BackgroundTaskManager instance that will be used to query Shotgun
+                                in the background
+        """
+        QtGui.QStandardItemModel.__init__(self, parent)
+
+        self._app = sgtk.platform.current_bundle()
+        self._entity_type = entity_type
+        self._filters = list(filters or [])
+        self._hierarchy = list(hierarchy)
+        self._fields = list(set(self._hierarchy) | set(fields or []))
+
+        self._level_items = {}# path:_LevelItem
+        self._entity_items = {}# entity id:_EntityItem
+        self._fetched_paths = set()# paths of the items whose children have been queried
+        self._loaded_paths = set()# paths of the items whose entire branch has been queried
+        self._pending_fetches = {}# task id:path
+        self._pending_loads = {}# task id:path
+
+        self._search_text = None
+        self._search_matches = None
+        self._search_task = None
+
+        self._bg_task_group = object()
+        self._bg_search_group = object()
+        self._bg_task_manager = bg_task_manager
+        self._bg_task_manager.task_completed.connect(self._on_background_task_completed)
+        self._bg_task_manager.task_failed.connect(self._on_background_task_failed)
+
+    def destroy(self):
+        """
+        Called to clean-up and shutdown any internal objects when the model has been finished
+        with.
+        """
+        if self._bg_task_manager:
+            self._bg_task_manager.stop_task_group(self._bg_task_group)
+            self._bg_task_manager.stop_task_group(self._bg_search_group)
+            self._bg_task_manager.task_completed.disconnect(self._on_background_task_completed)
+            self._bg_task_manager.task_failed.disconnect(self._on_background_task_failed)
+            self._bg_task_manager = None
+        self._pending_fetches = {}
+        self._pending_loads = {}
+        self._clear()
+
+    def get_entity_type(self):
+        """
+        :returns:   The type of the entities in the leaf level of the hierarchy
+        """
+        return self._entity_type
+
+    def get_entity(self, item):
+        """
+        Get the Shotgun entity represented by an item in the model.
+
+        :param item:    The model item to get the entity for
+        :returns:       The Shotgun entity dictionary for a leaf item, the field value for an upper level
+                        item if the value is an entity, otherwise None
+        """
+        if isinstance(item, LazyEntityModel._EntityItem):
+            return item.sg_data
+        if isinstance(item, LazyEntityModel._LevelItem):
+            value = item.value
+            if isinstance(value, dict) and "type" in value and "id" in value:
+                return value
+        return None
+
+    def item_from_entity(self, entity_type, entity_id):
+        """
+        Find the item in the model representing the specified entity.  Only entities in branches of
+        the tree that have been loaded can be found.
+
+        :param entity_type: The type of the entity to find
+        :param entity_id:   The id of the entity to find
+        :returns:           The model item representing the entity if found, otherwise None
+        """
+        if entity_type != self._entity_type:
+            return None
+        return self._entity_items.get(entity_id)
+
+    def async_refresh(self):
+        """
+        Asynchronously refresh the model.  All levels of the tree that have already been queried are
+        queried again and updated with the results.
+        """
+        self._bg_task_manager.stop_task_group(self._bg_task_group)
+        self._pending_fetches = {}
+        self._pending_loads = {}
+        self._loaded_paths = set()
+
+        # query the root level and all levels that have been queried before:
+        paths = sorted(self._fetched_paths | set([()]), key=len)
+        self._fetched_paths = set()
+        for path in paths:
+            self._fetch(path)
+
+        # and run the current search again:
+        if self._search_text is not None:
+            self._start_search(self._search_text)
+
+    def ensure_data_is_loaded(self, index=None):
+        """
+        Ensure that all data below the specified index has been loaded.  All entities below the index
+        are queried from Shotgun in a single background query and data_refreshed is emitted once they
+        have been added to the model.
+
+        :param index:   The QModelIndex to load the data for.  If None then the entire tree will be loaded.
+        :returns:       True if all data below the index has already been loaded, False if it is being
+                        loaded in the background
+        """
+        path = ()
+        if index and index.isValid():
+            item = self.itemFromIndex(index)
+            if not isinstance(item, LazyEntityModel._LevelItem):
+                # entities don't have children!
+                return True
+            path = item.path
+
+        if self._is_branch_loaded(path):
+            return True
+        if path in self._pending_loads.values():
+            return False
+
+        filters = self._get_filters(path)
+        if filters is None:
+            # the item no longer exists!
+            return True
+        task_id = self._bg_task_manager.add_task(self._task_query_branch,
+                                                 group=self._bg_task_group,
+                                                 task_kwargs = {"filters":filters})
+        self._pending_loads[task_id] = path
+        return False
+
+    def search(self, text):
+        """
+        Search Shotgun in the background for the entities whose hierarchy values contain the text.  The
+        branches containing the matching entities are added to the tree and data_refreshed is emitted
+        once the search has completed.
+
+        :param text:    The text to search for
+        :returns:       A set containing the ids of the matching entities or None if the search is still
+                        in progress
+        """
+        if text == self._search_text:
+            return self._search_matches
+        self._search_text = text
+        self._search_matches = None
+        self._start_search(text)
+        return self._search_matches
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        """
+        Overriden from base class - items in the upper levels of the hierarchy have children until
+        they have been queried and found not to have any.
+
+        :param parent:  The QModelIndex to check
+        :returns:       True if the index has children, otherwise False
+        """
+        item = self.itemFromIndex(parent) if parent.isValid() else None
+        if isinstance(item, LazyEntityModel._LevelItem) and item.path not in self._fetched_paths:
+            return True
+        return QtGui.QStandardItemModel.hasChildren(self, parent)
+
+    def canFetchMore(self, parent):
+        """
+        Overriden from base class - the children of upper level items can be fetched if they haven't
+        been queried yet.
+
+        :param parent:  The QModelIndex to check
+        :returns:       True if the children of the index haven't been queried yet, otherwise False
+        """
+        item = self.itemFromIndex(parent) if parent.isValid() else None
+        if not isinstance(item, LazyEntityModel._LevelItem):
+            return False
+        return item.path not in self._fetched_paths and item.path not in self._pending_fetches.values()
+
+    def fetchMore(self, parent):
+        """
+        Overriden from base class - starts querying the children of the index in the background.
+
+        :param parent:  The QModelIndex to fetch the children for
+        """
+        if not self.canFetchMore(parent):
+            return
+        self._fetch(self.itemFromIndex(parent).path)
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    def _clear(self):
+        """
+        Clear the model and all the items it contains.
+        """
+        self.invisibleRootItem().removeRows(0, self.rowCount())
+        self._level_items = {}
+        self._entity_items = {}
+        self._fetched_paths = set()
+        self._loaded_paths = set()
+        self._search_text = None
+        self._search_matches = None
+        self._search_task = None
+
+    def _is_branch_loaded(self, path):
+        """
+        :param path:    The path of an item in the tree
+        :returns:       True if all entities below the item have been loaded, otherwise False
+        """
+        for depth in range(len(path) + 1):
+            if path[:depth] in self._loaded_paths:
+                return True
+        return False
+
+    def _get_parent_item(self, path):
+        """
+        :param path:    The path of the item to find
+        :returns:       The item for the path, the root item for an empty path or None if there isn't
+                        an item for the path
+        """
+        if not path:
+            return self.invisibleRootItem()
+        return self._level_items.get(path)
+
+    def _get_filters(self, path):
+        """
+        :param path:    The path of an item in the tree
+        :returns:       The Shotgun filters for all entities below the item
+        """
+        if not path:
+            return list(self._filters)
+        item = self._level_items.get(path)
+        return list(item.filters) if item else None
+
+    def _fetch(self, path):
+        """
+        Start querying the children of the item with the specified path in the background.
+
+        :param path:    The path of the item to query the children for
+        """
+        filters = self._get_filters(path)
+        if filters is None:
+            # the item no longer exists!
+            return
+        task_id = self._bg_task_manager.add_task(self._task_query_level,
+                                                 group=self._bg_task_group,
+                                                 task_kwargs = {"depth":len(path), "filters":filters})
+        self._pending_fetches[task_id] = path
+
+    def _start_search(self, text):
+        """
+        Start searching Shotgun for the entities matching the text in the background, replacing any
+        search that is already in progress.
+
+        :param text:    The text to search for
+        """
+        self._bg_task_manager.stop_task_group(self._bg_search_group)
+        self._search_task = None
+
+        search_filters = []
+        for field in self._hierarchy:
+            data_type = self._get_field_data_type(field)
+            if data_type in ("entity", "multi_entity"):
+                search_filters.append([field, "name_contains", text])
+            elif data_type == "text":
+                search_filters.append([field, "contains", text])
+        if not search_filters:
+            # none of the fields can be searched!
+            self._search_matches = set()
+            return
+
+        filters = self._filters + [{"filter_operator":"any", "filters":search_filters}]
+        self._search_task = self._bg_task_manager.add_task(self._task_query_branch,
+                                                           group=self._bg_search_group,
+                                                           task_kwargs = {"filters":filters})
+
+    def _get_field_data_type(self, field):
+        """
+        :param field:   A (possibly deep-linked) field of the entities in the model, e.g.
+                        "entity.Shot.sg_sequence"
+        :returns:       The Shotgun data type of the field or None if it isn't known
+        """
+        entity_type = self._entity_type
+        parts = field.split(".")
+        if len(parts) >= 3:
+            entity_type, field = parts[-2], parts[-1]
+        try:
+            return shotgun_globals.get_data_type(entity_type, field)
+        except Exception:
+            return None
+
+    def _task_query_branch(self, filters, **kwargs):
+        """
+        Background task that queries all the entities in a branch of the hierarchy from Shotgun.
+
+        :param filters: The Shotgun filters for the entities
+        :returns:       A dictionary containing a list of the Shotgun entities under 'entities'
+        """
+        return {"entities":self._app.shotgun.find(self._entity_type, filters, self._fields)}
+
+    def _task_query_level(self, depth, filters, **kwargs):
+        """
+        Background task that queries a single level of the hierarchy from Shotgun.
+
+        :param depth:   The depth in the hierarchy of the level to query
+        :param filters: The Shotgun filters for the parent of the level
+        :returns:       A dictionary containing either a list of the Shotgun entities in the level
+                        under 'entities' for the leaf level of the hierarchy or a list of (value, name)
+                        tuples for each value in the level under 'groups'
+        """
+        if depth >= len(self._hierarchy) - 1:
+            # the leaf level needs the full entities:
+            return {"entities":self._app.shotgun.find(self._entity_type, filters, self._fields)}
+
+        # all other levels only need the distinct values for the field:
+        field = self._hierarchy[depth]
+        result = self._app.shotgun.summarize(self._entity_type, filters,
+                                             summary_fields=[{"field":"id", "type":"count"}],
+                                             grouping=[{"field":field, "type":"exact", "direction":"asc"}])
+        groups = [(group.get("group_value"), group.get("group_name"))
+                  for group in (result or {}).get("groups", [])]
+        return {"groups":groups}
+
+    def _on_background_task_completed(self, task_id, group, result):
+        """
+        Slot triggered when a background task has completed.
+
+        :param task_id: The id of the task that completed
+        :param group:   The group the task was in
+        :param result:  The result returned by the task
+        """
+        if group == self._bg_search_group and task_id == self._search_task:
+            # add the branches containing the matching entities:
+            self._search_task = None
+            sg_entities = result["entities"]
+            self._search_matches = set(sg_entity.get("id") for sg_entity in sg_entities)
+            self._add_entities((), sg_entities, is_complete=False)
+            self.data_refreshed.emit(True)
+            return
+
+        if group != self._bg_task_group:
+            # the completed task is of no interest to us!
+            return
+
+        if task_id in self._pending_loads:
+            path = self._pending_loads.pop(task_id)
+            if self._get_parent_item(path) is None:
+                # the item no longer exists!
+                return
+            modified = self._add_entities(path, result["entities"])
+            self.data_refreshed.emit(modified)
+            return
+
+        if task_id not in self._pending_fetches:
+            return
+        path = self._pending_fetches.pop(task_id)
+        parent_item = self._get_parent_item(path)
+        if parent_item is None:
+            # the item no longer exists!
+            return
+
+        if "entities" in result:
+            modified = self._update_entity_items(parent_item, result["entities"], remove_missing=True)
+        else:
+            modified = self._update_level_items(parent_item, path, result["groups"], remove_missing=True)
+        self._fetched_paths.add(path)
+
+        self.data_refreshed.emit(modified)
+
+    def _on_background_task_failed(self, task_id, group, msg, stack_trace):
+        """
+        Slot triggered when a background task fails for some reason!
+
+        :param task_id:     The id of the task that failed
+        :param group:       The group the task was in
+        :param msg:         The error message for the failed task
+        :param stack_trace: The stack trace of the failed task
+        """
+        if group == self._bg_search_group and task_id == self._search_task:
+            # treat a failed search as not matching anything:
+            self._search_task = None
+            self._search_matches = set()
+            self._app.log_debug("Entity Model: Failed to search %s entities: %s\n%s" % (self._entity_type, msg, stack_trace))
+            self.data_refreshed.emit(False)
+            return
+
+        if group != self._bg_task_group:
+            return
+        if task_id in self._pending_loads:
+            del(self._pending_loads[task_id])
+        elif task_id in self._pending_fetches:
+            del(self._pending_fetches[task_id])
+        else:
+            return
+        self._app.log_debug("Entity Model: Failed to query %s entities: %s\n%s" % (self._entity_type, msg, stack_trace))
+        self.data_refresh_fail.emit(msg)
+
+    def _add_entities(self, path, sg_entities, is_complete=True):
+        """
+        Add entities to the branch of the tree below the item with the specified path, creating any
+        items needed for the upper levels of the hierarchy.
+
+        :param path:        The path of the item to add the entities below
+        :param sg_entities: List of Shotgun entity dictionaries to add
+        :param is_complete: True if the entities are all of the entities in the branch, False if they
+                            are only some of them (e.g. the results of a search) in which case the rest
+                            of the branch will still be queried when it is expanded
+        :returns:           True if any items were added or removed, otherwise False
+        """
+        parent_item = self._get_parent_item(path)
+        if parent_item is None:
+            return False
+
+        depth = len(path)
+        if depth >= len(self._hierarchy) - 1:
+            modified = self._update_entity_items(parent_item, sg_entities)
+        else:
+            # group the entities by their value for this level:
+            field = self._hierarchy[depth]
+            grouped_entities = {}# value key:(value, [sg entities])
+            for sg_entity in sg_entities:
+                value = sg_entity.get(field)
+                grouped_entities.setdefault(get_sg_value_key(value), (value, []))[1].append(sg_entity)
+
+            modified = self._update_level_items(parent_item, path,
+                                                [(value, None) for value, _ in grouped_entities.values()])
+            for key, (_, child_entities) in grouped_entities.iteritems():
+                if self._add_entities(path + (key, ), child_entities, is_complete):
+                    modified = True
+
+        if is_complete:
+            self._fetched_paths.add(path)
+            self._loaded_paths.add(path)
+        return modified
+
+    def _update_level_items(self, parent_item, path, groups, remove_missing=False):
+        """
+        Update the upper level items under a parent item.
+
+        :param parent_item:     The item to update the children of
+        :param path:            The path of the parent item
+        :param groups:          List of (value, name) tuples for the values the children should represent
+        :param remove_missing:  If True then any children that aren't in the list of values are removed
+        :returns:               True if any items were added or removed, otherwise False
+        """
+        field = self._hierarchy[len(path)]
+        parent_filters = self._get_filters(path)
+        modified = False
+
+        keys = set()
+        new_items = []
+        for value, name in groups:
+            key = get_sg_value_key(value)
+            keys.add(key)
+            child_path = path + (key, )
+            if child_path in self._level_items:
+                continue
+
+            filter_value = value
+            if isinstance(value, dict) and "type" in value and "id" in value:
+                filter_value = {"type":value["type"], "id":value["id"]}
+            child_item = LazyEntityModel._LevelItem(LazyEntityModel._get_display_name(value, name),
+                                                    value,
+                                                    child_path,
+                                                    parent_filters + [[field, "is", filter_value]])
+            child_item.setEditable(False)
+            self._level_items[child_path] = child_item
+            new_items.append(child_item)
+
+        if remove_missing:
+            modified = self._remove_child_items(parent_item, keys)
+
+        if new_items:
+            parent_item.appendRows(new_items)
+            modified = True
+        return modified
+
+    def _update_entity_items(self, parent_item, sg_entities, remove_missing=False):
+        """
+        Update the leaf level items under a parent item.
+
+        :param parent_item:     The item to update the children of
+        :param sg_entities:     List of Shotgun entity dictionaries the children should represent
+        :param remove_missing:  If True then any children that aren't in the list of entities are removed
+        :returns:               True if any items were added or removed, otherwise False
+        """
+        field = self._hierarchy[-1]
+        modified = False
+
+        ids = set()
+        new_items = []
+        for sg_entity in sg_entities:
+            entity_id = sg_entity.get("id")
+            ids.add(entity_id)
+            item = self._entity_items.get(entity_id)
+            if item is not None:
+                if item.index().parent() == parent_item.index():
+                    # just update the data for the existing item:
+                    item.sg_data = sg_entity
+                    continue
+                # the entity has moved to a different branch of the tree:
+                old_parent_item = item.parent() or self.invisibleRootItem()
+                old_parent_item.removeRow(item.row())
+
+            item = LazyEntityModel._EntityItem(LazyEntityModel._get_display_name(sg_entity.get(field)),
+                                               sg_entity)
+            item.setEditable(False)
+            self._entity_items[entity_id] = item
+            new_items.append(item)
+
+        if remove_missing:
+            modified = self._remove_child_items(parent_item, ids)
+
+        if new_items:
+            parent_item.appendRows(new_items)
+            modified = True
+        return modified
+
+    def _remove_child_items(self, parent_item, keys_to_keep):
+        """
+        Remove all children of an item that aren't in a set of keys.
+
+        :param parent_item:     The item to remove the children of
+        :param keys_to_keep:    Set of the value keys (for level items) or entity ids (for entity items)
+                                of the children to keep
+        :returns:               True if any children were removed, otherwise False
+        """
+        rows_to_remove = []
+        for row in range(parent_item.rowCount()):
+            child_item = parent_item.child(row)
+            if isinstance(child_item, LazyEntityModel._LevelItem):
+                if child_item.path[-1] not in keys_to_keep:
+                    rows_to_remove.append(row)
+                    self._forget_branch(child_item)
+            elif isinstance(child_item, LazyEntityModel._EntityItem):
+                entity_id = child_item.sg_data.get("id")
+                if entity_id not in keys_to_keep:
+                    rows_to_remove.append(row)
+                    if self._entity_items.get(entity_id) is child_item:
+                        del(self._entity_items[entity_id])
+
+        # remove rows from the bottom up so that the row indices remain valid:
+        for row in reversed(rows_to_remove):
+            parent_item.removeRow(row)
+        return bool(rows_to_remove)
+
+    def _forget_branch(self, item):
+        """
+        Remove all references to the items in a branch of the tree that is about to be removed.
+
+        :param item:    The level item at the root of the branch
+        """
+        for row in range(item.rowCount()):
+            child_item = item.child(row)
+            if isinstance(child_item, LazyEntityModel._LevelItem):
+                self._forget_branch(child_item)
+            elif isinstance(child_item, LazyEntityModel._EntityItem):
+                entity_id = child_item.sg_data.get("id")
+                if self._entity_items.get(entity_id) is child_item:
+                    del(self._entity_items[entity_id])
+        self._level_items.pop(item.path, None)
+        self._fetched_paths.discard(item.path)
+        self._loaded_paths.discard(item.path)
+
+    @staticmethod
+    def _get_display_name(value, default_name=None):
+        """
+        :param value:           A Shotgun field value
+        :param default_name:    The name to use if one can't be determined from the value
+        :returns:               The name to display for the value
+        """
+        if isinstance(value, dict):
+            return value.get("name") or default_name or "%s %s" % (value.get("type"), value.get("id"))
+        elif value is None:
+            return default_name or "Unassigned"
+        elif isinstance(value, basestring):
+            return value
+        return default_name or str(value)
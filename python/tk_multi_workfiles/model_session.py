@@ -0,0 +1,421 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Session that owns the models used by the file open & save dialogs so that they can be kept
+warm between dialog invocations.
+"""
+
+import sgtk
+from sgtk.platform.qt import QtCore
+
+task_manager = sgtk.platform.import_framework("tk-framework-shotgunutils", "task_manager")
+BackgroundTaskManager = task_manager.BackgroundTaskManager
+
+shotgun_globals = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_globals")
+
+from .file_model import FileModel
+from .array_file_model import ArrayFileModel
+from .my_tasks.my_tasks_model import MyTasksModel
+from .searchable_entity_model import SearchableEntityModel
+from .lazy_entity_model import LazyEntityModel
+from .user_cache import g_user_cache
+from .util import monitor_qobject_lifetime, resolve_filters
+
+
+class ModelSession(object):
+    """
+    Owns the background task manager and the My Tasks, entity and file models used by a file
+    dialog.  A session can be kept warm once the dialog that was using it has been closed so that
+    the models, their caches and the worker threads are reused the next time a dialog is shown.
+    Warm sessions are shut down after they have been idle for a while or if the file model's cache
+    grows too large.
+    """
+
+    def __init__(self, keep_warm=False):
+        """
+        Construction
+
+        :param keep_warm:   True if the models should be kept alive once the session has been
+                            released, otherwise they are destroyed as soon as it is released
+        """
+        self._keep_warm = keep_warm
+        self._in_use = False
+        self._is_prewarming = False
+        self._session_key = None
+        self._idle_timer = None
+        self._dialog_models_built = False
+
+        self._bg_task_manager = None
+        self._my_tasks_model = None
+        self._entity_models = []
+        self._file_model = None
+
+    @property
+    def bg_task_manager(self):
+        """
+        :returns:   The BackgroundTaskManager used for all background work in the session
+        """
+        return self._bg_task_manager
+
+    @property
+    def my_tasks_model(self):
+        """
+        :returns:   The MyTasksModel for the session or None if My Tasks aren't shown
+        """
+        return self._my_tasks_model
+
+    @property
+    def entity_models(self):
+        """
+        :returns:   A list of (caption, model) tuples for each entity tab in the session
+        """
+        return self._entity_models
+
+    @property
+    def file_model(self):
+        """
+        :returns:   The file model for the session
+        """
+        return self._file_model
+
+    def acquire(self):
+        """
+        Acquire the session for use by a dialog.  If the session is warm then the existing models are
+        reused and refreshed in the background, otherwise new models are built.
+
+        :returns:   True if the session was acquired, False if it's already in use by another dialog
+        """
+        if self._is_prewarming:
+            # the file search is still being prewarmed so just hand the session over as it is:
+            self._stop_prewarm()
+        elif not self._acquire_session():
+            return False
+
+        if self._dialog_models_built:
+            # revalidate the warm models in the background:
+            app = sgtk.platform.current_bundle()
+            app.log_debug("Reusing warm models for the file dialog")
+            if self._my_tasks_model:
+                self._my_tasks_model.async_refresh()
+            for _, entity_model in self._entity_models:
+                entity_model.async_refresh()
+        else:
+            self._my_tasks_model = self._build_my_tasks_model()
+            self._entity_models = self._build_entity_models()
+            self._dialog_models_built = True
+        return True
+
+    def release(self):
+        """
+        Release the session once the dialog using it has been closed.  The models are either kept
+        warm until the session is idle for too long or destroyed immediately.
+        """
+        if not self._in_use:
+            return
+        self._in_use = False
+
+        app = sgtk.platform.current_bundle()
+        max_files = app.get_setting("warm_models_max_files", 100000)
+        if (not self._can_keep_warm()
+            or (self._file_model and self._file_model.cached_file_count > max_files)):
+            self.shut_down()
+            return
+
+        # stop any searches that are still running - the search cache is kept so the results will
+        # be available immediately the next time the session is acquired:
+        if self._file_model:
+            self._file_model.set_entity_searches([])
+
+        # shut down the session if it isn't used again for a while:
+        if not self._idle_timer:
+            self._idle_timer = QtCore.QTimer()
+            self._idle_timer.setSingleShot(True)
+            self._idle_timer.timeout.connect(self._on_idle_timeout)
+        self._idle_timer.start(app.get_setting("warm_models_idle_timeout", 0) * 1000)
+
+    def prewarm(self, context):
+        """
+        Build the models and search for the files in the specified context in the background so that
+        the next dialog is populated as soon as it's shown.  The session is released and kept warm once
+        the search has completed or is handed over to a dialog that acquires it before then.  Only the
+        file model is used so the My Tasks and entity models aren't built or refreshed until a dialog
+        acquires the session.
+
+        :param context: The context to search for files in
+        """
+        if (self._in_use and not self._is_prewarming) or not self._can_keep_warm():
+            # the session is being used by a dialog!
+            return
+
+        search_entity = context.task or context.entity or context.project
+        if not search_entity:
+            if self._is_prewarming:
+                # the search for the previous context is no longer needed:
+                self._stop_prewarm()
+                self.release()
+            return
+
+        app = sgtk.platform.current_bundle()
+        app.log_debug("Prewarming the file search for %s" % context)
+        if self._is_prewarming:
+            # replace the search that is still running for the previous context:
+            self._stop_prewarm()
+        else:
+            self._acquire_session()
+        self._is_prewarming = True
+
+        # search for the files in the context - the results are stored in the file model's search cache:
+        search_label = search_entity.get("name")
+        if search_entity["type"] == "Task" and context.step:
+            search_label = "%s - %s" % (context.step.get("name"), search_label)
+        details = FileModel.SearchDetails(search_label)
+        details.entity = search_entity
+        details.is_leaf = True
+        self._file_model.searches_completed.connect(self._on_prewarm_searches_completed)
+        self._file_model.set_entity_searches([details])
+
+    def shut_down(self):
+        """
+        Destroy all models and shut down the background task manager.
+        """
+        if self._idle_timer:
+            self._idle_timer.stop()
+        self._stop_prewarm()
+
+        # clear up the various data models:
+        if self._file_model:
+            self._file_model.destroy()
+            self._file_model = None
+        if self._my_tasks_model:
+            self._my_tasks_model.destroy()
+            self._my_tasks_model = None
+        for _, model in self._entity_models:
+            model.destroy()
+        self._entity_models = []
+        self._dialog_models_built = False
+
+        # and shut down the task manager
+        if self._bg_task_manager:
+            shotgun_globals.unregister_bg_task_manager(self._bg_task_manager)
+            self._bg_task_manager.shut_down()
+            self._bg_task_manager = None
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    def _acquire_session(self):
+        """
+        Mark the session as in use, building the background task manager and file model if they don't
+        already exist.  The session is shut down first if it was built for a different project or user.
+
+        :returns:   True if the session was acquired, False if it's already in use
+        """
+        if self._in_use:
+            return False
+        self._in_use = True
+
+        if self._idle_timer:
+            self._idle_timer.stop()
+
+        session_key = self._get_session_key()
+        if self._bg_task_manager and session_key != self._session_key:
+            # the models were built for a different project or user:
+            self.shut_down()
+        self._session_key = session_key
+
+        if not self._bg_task_manager:
+            self._build_models()
+        return True
+
+    def _can_keep_warm(self):
+        """
+        :returns:   True if the models can be kept warm once the session has been released, otherwise
+                    False
+        """
+        app = sgtk.platform.current_bundle()
+        return (self._keep_warm
+                and app.get_setting("warm_models_idle_timeout", 0) > 0
+                and not app.use_debug_dialog)
+
+    def _stop_prewarm(self):
+        """
+        Stop tracking the prewarm search.
+        """
+        if not self._is_prewarming:
+            return
+        self._is_prewarming = False
+        if self._file_model:
+            self._file_model.searches_completed.disconnect(self._on_prewarm_searches_completed)
+
+    def _on_prewarm_searches_completed(self):
+        """
+        Slot triggered when the prewarm search has completed.
+        """
+        if not self._is_prewarming:
+            return
+        self._stop_prewarm()
+        self.release()
+
+    def _on_idle_timeout(self):
+        """
+        Slot triggered when the session has been idle for too long.
+        """
+        if self._in_use:
+            return
+        app = sgtk.platform.current_bundle()
+        app.log_debug("Shutting down idle warm models for the file dialog")
+        self.shut_down()
+
+    def _get_session_key(self):
+        """
+        :returns:   A key identifying the project and user the models are built for
+        """
+        app = sgtk.platform.current_bundle()
+        project = app.context.project
+        current_user = g_user_cache.current_user
+        return (project["id"] if project else None, current_user["id"] if current_user else None)
+
+    def _build_models(self):
+        """
+        Build the background task manager and the file model for the session.  The My Tasks and
+        entity models are built when the session is first acquired by a dialog.
+        """
+        # create a single instance of the task manager that manages all
+        # asynchrounous work/tasks.
+        self._bg_task_manager = BackgroundTaskManager(None, max_threads=8)
+        monitor_qobject_lifetime(self._bg_task_manager, "Main task manager")
+        self._bg_task_manager.start_processing()
+
+        shotgun_globals.register_bg_task_manager(self._bg_task_manager)
+
+        # build the file model:
+        self._file_model = self._build_file_model()
+
+    def _build_my_tasks_model(self):
+        """
+        Build the My Tasks model to be used by the file open/save dialogs.
+
+        :returns:   An instance of MyTasksModel that represents all tasks assigned to the
+                    current user in the current project.  If the current user is not known
+                    or the My Tasks view is disabled in the config then this returns None
+        """
+        if not g_user_cache.current_user:
+            # can't show my tasks if we don't know who 'my' is!
+            return None
+
+        app = sgtk.platform.current_bundle()
+        show_my_tasks = app.get_setting("show_my_tasks", True)
+        if not show_my_tasks:
+            return None
+
+        # get any extra display fields we'll need to retrieve:
+        extra_display_fields = app.get_setting("my_tasks_extra_display_fields")
+        # get the my task filters from the config.
+        my_tasks_filters = app.get_setting("my_tasks_filters")
+
+        # create the model:
+        model = MyTasksModel(app.context.project,
+                             g_user_cache.current_user,
+                             extra_display_fields,
+                             my_tasks_filters,
+                             parent=None,
+                             bg_task_manager=self._bg_task_manager)
+        monitor_qobject_lifetime(model, "My Tasks Model")
+        model.async_refresh()
+        return model
+
+    def _build_entity_models(self):
+        """
+        Build all entity models to be used by the file open/save dialogs.
+
+        :returns:   A list of (caption, model) tuples containing a SearchableEntityModel or, for entities
+                    with a lazy hierarchy, a LazyEntityModel for each entity (and hierarchy) defined in
+                    the app configuration
+        """
+        app = sgtk.platform.current_bundle()
+
+        # models can be loaded the first time they are shown rather than all at once:
+        lazy_load = app.get_setting("lazy_load_entity_models", False)
+
+        entity_models = []
+
+        # set up any defined task trees:
+        entities = app.get_setting("entities", [])
+        for ent in entities:
+            caption = ent.get("caption", None)
+            entity_type = ent.get("entity_type")
+            filters = ent.get("filters", [])
+
+            # resolve any magic tokens in the filter
+            # Note, we always filter on the current project as the app needs templates
+            # in the config to be able to find files and there is currently no way to
+            # get these from a config belonging to a different project!
+            resolved_filters = []
+
+            # we always filter within the current project as it's not currently possible
+            # to manage work files across projects (as we can't access the other project's
+            # templates and folder schema).
+            #
+            # Note that this currently doesn't work for non-project entities!
+            if entity_type == "Project":
+                # special case if the entity type is 'Project' - this will show only
+                # the current project in the tree!
+                resolved_filters.append(["id", "is", app.context.project["id"]])
+            else:
+                # filter entities on the current project:
+                resolved_filters.append(["project", "is", app.context.project])
+
+            resolved_filters.extend(resolve_filters(filters))
+
+            # Get the hierarchy to use for the model for this entity:
+            hierarchy = ent.get("hierarchy")
+            if not hierarchy:
+                app.log_error("No hierarchy found for entity type '%s' - at least one level of "
+                              "hierarchy must be specified in the app configuration.  Skipping!" % entity_type)
+                continue
+
+            # create an entity model for this query:
+            fields = []
+            if entity_type == "Task":
+                # Add so we can filter tasks assigned to the user only on the client side.
+                fields += ["step", "task_assignees"]
+
+            if ent.get("lazy_hierarchy", False):
+                # each level of the hierarchy is queried when its parent is expanded:
+                model = LazyEntityModel(entity_type, resolved_filters, hierarchy, fields, parent=None,
+                                        bg_task_manager=self._bg_task_manager)
+            else:
+                model = SearchableEntityModel(entity_type, resolved_filters, hierarchy, fields, parent=None,
+                                              bg_task_manager=self._bg_task_manager, defer_load=lazy_load)
+            monitor_qobject_lifetime(model, "Entity Model")
+            entity_models.append((caption, model))
+            model.async_refresh()
+
+        return entity_models
+
+    def _build_file_model(self):
+        """
+        Build the single file model to be used by the file open/save dialogs.
+
+        :returns:   A FileModel or ArrayFileModel instance that represents all the files found for a set
+                    of entities and users.
+        """
+        app = sgtk.platform.current_bundle()
+        if app.get_setting("use_array_file_model", False):
+            file_model = ArrayFileModel(self._bg_task_manager, parent=None)
+        else:
+            file_model = FileModel(self._bg_task_manager, parent=None)
+        monitor_qobject_lifetime(file_model, "File Model")
+        return file_model
+
+
+# the session shared by all dialogs that can be kept warm between dialog invocations:
+g_model_session = ModelSession(keep_warm=True)
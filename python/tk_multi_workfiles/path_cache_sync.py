@@ -0,0 +1,127 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Background synchronization of the path cache with Shotgun.
+"""
+
+import threading
+import time
+
+import sgtk
+
+from .util import Threaded
+
+
+class PathCacheSync(Threaded):
+    """
+    Synchronizes the path cache with Shotgun in a background thread so that the dialogs can be shown
+    without waiting for it.  A synchronization is skipped if the last successful one happened recently
+    enough.  Anything that needs the path cache to be up to date (e.g. building a context for an entity)
+    should call wait() first.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._last_sync_time = None
+        self._sync_count = 0
+        self._sync_thread = None
+        # set whenever a synchronization isn't in progress:
+        self._sync_done = threading.Event()
+        self._sync_done.set()
+
+    @property
+    def is_syncing(self):
+        """
+        :returns:   True if a synchronization is in progress, otherwise False
+        """
+        return not self._sync_done.is_set()
+
+    @property
+    def sync_count(self):
+        """
+        :returns:   The number of times the path cache has been synchronized successfully.  This can
+                    be used to tell if anything built from the path cache might be out of date.
+        """
+        return self._sync_count
+
+    @Threaded.exclusive
+    def start(self, force=False):
+        """
+        Start synchronizing the path cache in a background thread.  This does nothing if a
+        synchronization is already in progress.
+
+        :param force:   If True then the path cache is synchronized even if the last successful
+                        synchronization happened within the interval specified by the
+                        'path_cache_sync_interval' setting
+        """
+        if self._sync_thread:
+            # already synchronizing!
+            return
+
+        app = sgtk.platform.current_bundle()
+        sync_interval = app.get_setting("path_cache_sync_interval", 300)
+        if not force and self._last_sync_time is not None:
+            sync_age = time.time() - self._last_sync_time
+            if sync_age < sync_interval:
+                app.log_debug("Path cache was synchronized %d seconds ago - skipping!" % sync_age)
+                return
+
+        self._sync_done.clear()
+        self._sync_thread = threading.Thread(target=self._run_sync, args=(app, ))
+        self._sync_thread.daemon = True
+        self._sync_thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Wait for any synchronization that is in progress to complete.
+
+        :param timeout: The maximum number of seconds to wait or None to wait until the
+                        synchronization has completed
+        :returns:       True if no synchronization is in progress, False if the wait timed out
+        """
+        return self._sync_done.wait(timeout)
+
+    def _run_sync(self, app):
+        """
+        Synchronize the path cache - run in a background thread.
+
+        :param app: The app instance to synchronize the path cache for
+        """
+        succeeded = False
+        try:
+            app.log_debug("Synchronizing remote path cache...")
+            app.sgtk.synchronize_filesystem_structure()
+            app.log_debug("Path cache up to date!")
+            succeeded = True
+        except Exception, e:
+            app.log_warning("Failed to synchronize the path cache: %s" % e)
+        finally:
+            self._on_sync_finished(succeeded)
+
+    @Threaded.exclusive
+    def _on_sync_finished(self, succeeded):
+        """
+        Called when a synchronization has finished.
+
+        :param succeeded:   True if the path cache was synchronized successfully, otherwise False
+        """
+        if succeeded:
+            self._last_sync_time = time.time()
+            self._sync_count += 1
+        self._sync_thread = None
+        self._sync_done.set()
+
+
+# single global instance of the path cache sync
+g_path_cache_sync = PathCacheSync()
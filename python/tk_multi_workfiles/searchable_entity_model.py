@@ -0,0 +1,198 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Shotgun entity model that can be searched without having to load the entire tree.
+"""
+
+import sgtk
+
+from .entity_search_index import EntitySearchIndex, get_sg_value_key
+
+shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
+ShotgunEntityModel = shotgun_model.ShotgunEntityModel
+
+
+class SearchableEntityModel(ShotgunEntityModel):
+    """
+    Specialisation of the Shotgun entity model that keeps a flat search index of all the entities it
+    represents.  The tree is loaded lazily as it's expanded so rather than loading the entire tree in
+    order to search it, the index is searched and only the branches containing matching entities are
+    loaded.
+
+    Loading of the model can also be deferred until it is needed, e.g. until the tab it is shown in
+    is first shown.
+    """
+
+    def __init__(self, entity_type, filters, hierarchy, fields, *args, **kwargs):
+        """
+        Construction - see ShotgunEntityModel for a description of the parameters.
+
+        :param defer_load:  If True then the model won't load or refresh any data until load()
+                            is called.  Defaults to False
+        """
+        # the base class loads the data during construction so this needs to be set first:
+        self._is_loaded = not kwargs.pop("defer_load", False)
+        self._deferred_load_args = None
+
+        ShotgunEntityModel.__init__(self, entity_type, filters, hierarchy, fields, *args, **kwargs)
+        self._entity_type = entity_type
+        self._entity_hierarchy = list(hierarchy)
+        self._sg_entities = None
+        self._search_index = None
+        self._search_index_fields = None
+
+    @property
+    def is_loaded(self):
+        """
+        :returns:   True if the model has loaded its data, False if loading has been deferred
+                    until load() is called
+        """
+        return self._is_loaded
+
+    def load(self):
+        """
+        Load the data for the model from the cache and refresh it from Shotgun if loading was
+        deferred when the model was constructed.  Does nothing if the model is already loaded.
+        """
+        if self._is_loaded:
+            return
+        self._is_loaded = True
+        if self._deferred_load_args:
+            args, kwargs = self._deferred_load_args
+            self._deferred_load_args = None
+            ShotgunEntityModel._load_data(self, *args, **kwargs)
+        self.async_refresh()
+
+    def get_entity_type(self):
+        """
+        Overriden from base class - returns the type of the entities represented by the model, even
+        if the model hasn't been loaded yet.
+
+        :returns:   The Shotgun entity type
+        """
+        return self._entity_type
+
+    def async_refresh(self):
+        """
+        Overriden from base class - the refresh is ignored if the model hasn't been loaded yet as
+        the model will be refreshed when it is loaded.
+        """
+        if not self._is_loaded:
+            return
+        ShotgunEntityModel.async_refresh(self)
+
+    def get_search_index(self, compare_fields):
+        """
+        Get the search index for the entities in the model.  The index is built the first time it's
+        requested after the model has been refreshed from Shotgun.
+
+        :param compare_fields:  The (possibly nested) list of Shotgun fields that entities should be
+                                matched on in addition to their hierarchy
+        :returns:               An EntitySearchIndex instance or None if the entities in the model aren't
+                                known yet
+        """
+        if self._sg_entities is None:
+            return None
+        if self._search_index is None or self._search_index_fields != compare_fields:
+            self._search_index = EntitySearchIndex(self._sg_entities, self._entity_hierarchy, compare_fields)
+            self._search_index_fields = compare_fields
+        return self._search_index
+
+    def load_entities(self, search_index, entity_ids):
+        """
+        Make sure that the branches of the tree containing the specified entities are loaded without
+        loading any other branches.
+
+        :param search_index:    The EntitySearchIndex returned by get_search_index()
+        :param entity_ids:      The ids of the entities to load the branches for
+        """
+        # find the unique paths to the parents of all entities:
+        paths = set()
+        for entity_id in entity_ids:
+            path = search_index.get_path(entity_id)
+            if path is not None:
+                paths.add(path)
+        if not paths:
+            return
+
+        # load the tree one level at a time so that each branch is only loaded once:
+        loaded_items = {(): self.invisibleRootItem()}
+        fully_loaded_prefixes = set()
+        for depth in range(max(len(path) for path in paths) + 1):
+            child_item_maps = {}
+            next_loaded_items = {}
+            for item in loaded_items.itervalues():
+                if self.canFetchMore(item.index()):
+                    self.fetchMore(item.index())
+            for path in paths:
+                if len(path) <= depth:
+                    continue
+                parent_item = loaded_items.get(path[:depth])
+                if parent_item is None:
+                    continue
+                child_item_map = child_item_maps.get(path[:depth])
+                if child_item_map is None:
+                    child_item_map = self._get_child_item_map(parent_item)
+                    child_item_maps[path[:depth]] = child_item_map
+                child_item = child_item_map.get(path[depth])
+                if child_item is None:
+                    # couldn't find the branch so fall back to loading everything below the parent:
+                    if path[:depth] not in fully_loaded_prefixes:
+                        self.ensure_data_is_loaded(parent_item.index())
+                        fully_loaded_prefixes.add(path[:depth])
+                    continue
+                next_loaded_items[path[:depth + 1]] = child_item
+            loaded_items = next_loaded_items
+
+        # finally, make sure the parents of the entities have loaded their children:
+        for item in loaded_items.itervalues():
+            if self.canFetchMore(item.index()):
+                self.fetchMore(item.index())
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    def _load_data(self, *args, **kwargs):
+        """
+        Overriden from base class - loading is deferred until load() is called if the model was
+        constructed with defer_load=True.
+        """
+        if not self._is_loaded:
+            self._deferred_load_args = (args, kwargs)
+            return
+        return ShotgunEntityModel._load_data(self, *args, **kwargs)
+
+    def _before_data_processing(self, data):
+        """
+        Overriden from base class - called with the data retrieved from Shotgun before it is processed
+        by the model.  Used to keep track of the entities so that the search index can be built.
+
+        :param data:    List of Shotgun entity dictionaries
+        :returns:       The data to be processed by the model
+        """
+        data = ShotgunEntityModel._before_data_processing(self, data)
+        self._sg_entities = list(data or [])
+        self._search_index = None
+        return data
+
+    def _get_child_item_map(self, parent_item):
+        """
+        :param parent_item: The model item to get the children of
+        :returns:           A dictionary mapping the key of the Shotgun field value represented by each
+                            child item (see get_sg_value_key()) to the child item
+        """
+        child_item_map = {}
+        for row in range(parent_item.rowCount()):
+            child_item = parent_item.child(row)
+            field_data = child_item.data(ShotgunEntityModel.SG_ASSOCIATED_FIELD_ROLE)
+            if field_data:
+                child_item_map.setdefault(get_sg_value_key(field_data.get("value")), child_item)
+        return child_item_map
@@ -0,0 +1,74 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Cache of file stat results used during a single search.
+"""
+
+import os
+
+from .util import Threaded
+
+
+class StatCache(Threaded):
+    """
+    Thread-safe cache of os.stat results.  A single instance is used for the lifetime of a search
+    so that each path is stat'ed exactly once, however many times its existence, modified time or
+    owner are needed.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._stats = {}# path:stat result or None if the path doesn't exist
+
+    def stat(self, path):
+        """
+        Get the stat result for the specified path, only calling os.stat the first time the path
+        is requested.
+
+        :param path:    The path to get the stat result for
+        :returns:       The stat result for the path or None if it doesn't exist or can't be accessed
+        """
+        found, st = self._get(path)
+        if found:
+            return st
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            # either the path doesn't exist or it's a permissions thing!
+            st = None
+        self.add(path, st)
+        return st
+
+    @Threaded.exclusive
+    def add(self, path, st):
+        """
+        Add a stat result for the specified path, e.g. one that was returned when listing a directory.
+
+        :param path:    The path to add the stat result for
+        :param st:      The stat result for the path or None if the path doesn't exist
+        """
+        self._stats[path] = st
+
+    @Threaded.exclusive
+    def _get(self, path):
+        """
+        Thread-safe mechanism to look up a path in the cache
+
+        :param path:    The path to look up
+        :returns:       Tuple (found, stat result)
+        """
+        if path in self._stats:
+            return (True, self._stats[path])
+        return (False, None)
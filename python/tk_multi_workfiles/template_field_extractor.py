@@ -0,0 +1,298 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Compiled extraction of template fields from paths.
+"""
+
+import os
+import re
+import sys
+import itertools
+
+from sgtk import TankError
+
+from .util import Threaded
+
+
+class TemplateFieldExtractor(object):
+    """
+    Extract the fields from paths for a template using a regular expression compiled once from the
+    template definition rather than calling template.get_fields() for every path.
+
+    Paths that can't possibly match the template are rejected with a simple prefix check before any
+    regular expression matching is done.  Where a path component contains more than one key, the
+    path is matched both greedily and lazily and if the two disagree then the path could be split in
+    more than one way so it is passed on to template.get_fields() to resolve.  If the template can't
+    be compiled at all then all paths are passed on to the template.
+    """
+
+    # patterns used for keys, depending on the key type:
+    _GENERIC_PATTERN = r"[^/\\]+"
+    _DIGITS_PATTERN = r"\d+"
+    _FILTER_PATTERNS = {"alphanumeric":r"[a-zA-Z0-9]+", "alpha":r"[a-zA-Z]+", "integer":r"\d+"}
+    # maximum number of converted values to remember before starting again:
+    _MAX_CACHED_VALUES = 10000
+
+    def __init__(self, template):
+        """
+        Construction
+
+        :param template:    The TemplatePath to extract fields for
+        """
+        self._template = template
+        self._prefix = None
+        self._variants = []# [(greedy regex, lazy regex or None, [key per group])]
+        self._values = {}# (key name, string value):value
+        self._ignore_case = sys.platform == "win32"
+        try:
+            self._compile()
+        except TankError:
+            self._variants = []
+
+    @property
+    def template(self):
+        """
+        :returns:   The template fields are extracted for
+        """
+        return self._template
+
+    @property
+    def is_compiled(self):
+        """
+        :returns:   True if the template was compiled, False if all paths are passed on to the template
+        """
+        return bool(self._variants)
+
+    def get_fields(self, path):
+        """
+        Extract the fields from a path.
+
+        :param path:    The path to extract the fields from
+        :returns:       A dictionary of fields if the path matches the template, otherwise None
+        """
+        if not self._variants:
+            try:
+                return self._template.get_fields(path)
+            except TankError:
+                return None
+
+        # fast reject for paths that aren't under the static part of the template:
+        match_path = self._normalize(path)
+        if not match_path.startswith(self._prefix):
+            return None
+
+        for regex, lazy_regex, keys in self._variants:
+            match = regex.match(match_path)
+            if not match:
+                continue
+            if lazy_regex and lazy_regex.match(match_path).groups() != match.groups():
+                # the keys can be split in more than one way so let the template decide:
+                try:
+                    return self._template.get_fields(path)
+                except TankError:
+                    return None
+            if self._ignore_case:
+                # normalizing doesn't change the length of the path so the original case of each
+                # value can be recovered from the match:
+                str_values = [path[match.start(i):match.end(i)] for i in range(1, len(keys) + 1)]
+            else:
+                str_values = match.groups()
+            fields = self._convert_values(keys, str_values)
+            if fields is not None:
+                return fields
+        return None
+
+    def get_fields_for_paths(self, paths):
+        """
+        Extract the fields from a batch of paths.
+
+        :param paths:   The paths to extract the fields from
+        :returns:       Dictionary {path:fields} containing an entry for each path that matches the template
+        """
+        found = {}
+        for path in paths:
+            fields = self.get_fields(path)
+            if fields is not None:
+                found[path] = fields
+        return found
+
+    def validate(self, path):
+        """
+        :param path:    The path to validate
+        :returns:       True if the path matches the template, otherwise False
+        """
+        return self.get_fields(path) is not None
+
+    # ------------------------------------------------------------------------------------------
+    # Protected methods
+
+    def _normalize(self, path):
+        """
+        Normalize a path so that it can be matched against the compiled template.
+
+        :param path:    The path to normalize
+        :returns:       The normalized path
+        """
+        if self._ignore_case:
+            return path.replace("/", "\\").lower()
+        return path
+
+    def _convert_values(self, keys, str_values):
+        """
+        Convert the string values matched for a path to field values using the template keys.
+
+        :param keys:        List of template keys, one for each matched value
+        :param str_values:  List of string values matched for the path
+        :returns:           A dictionary of fields or None if any of the values are invalid for their key
+        """
+        fields = {}
+        for key, str_value in zip(keys, str_values):
+            value_key = (key.name, str_value)
+            if value_key in self._values:
+                value = self._values[value_key]
+            else:
+                try:
+                    value = key.value_from_str(str_value)
+                except TankError:
+                    value = None
+                if len(self._values) >= TemplateFieldExtractor._MAX_CACHED_VALUES:
+                    # extractors are shared by all searches so don't let this grow without limit:
+                    self._values = {}
+                self._values[value_key] = value
+            if value is None:
+                return None
+            if key.name in fields and fields[key.name] != value:
+                # the same key appears more than once with different values!
+                return None
+            fields[key.name] = value
+        return fields
+
+    def _compile(self):
+        """
+        Compile the template definition into a regular expression for each combination of optional
+        sections, ordered so that the variant with the most keys is tried first.
+
+        :raises TankError:  If the template can't be compiled
+        """
+        root_path = getattr(self._template, "root_path", None)
+        if not root_path:
+            raise TankError("Template has no root path")
+        prefix = self._normalize(os.path.join(root_path, ""))
+
+        # split the definition into static and optional sections:
+        definition = self._template.definition.replace("/", os.sep)
+        sections = re.split(r"(\[[^\[\]]*\])", definition)
+        if any(c in s for s in sections if not s.startswith("[") for c in "[]"):
+            raise TankError("Template has nested or unbalanced optional sections")
+        optional = [i for i, s in enumerate(sections) if s.startswith("[")]
+
+        variants = []
+        for included in itertools.product([True, False], repeat=len(optional)):
+            include_map = dict(zip(optional, included))
+            variant_def = "".join((s[1:-1] if include_map[i] else "") if i in include_map else s
+                                  for i, s in enumerate(sections))
+            variants.append(self._compile_variant(prefix, variant_def))
+        variants.sort(key=lambda v: len(v[2]), reverse=True)
+
+        # the static prefix common to all variants is used to quickly reject paths:
+        static_prefixes = [prefix + self._normalize(variant_def.split("{")[0])
+                           for _, _, _, variant_def in variants]
+        self._prefix = os.path.commonprefix(static_prefixes)
+        self._variants = [(regex, lazy_regex, keys) for regex, lazy_regex, keys, _ in variants]
+
+    def _compile_variant(self, prefix, variant_def):
+        """
+        Compile a single variant of the template definition.
+
+        :param prefix:      The normalized root path of the template
+        :param variant_def: The variant of the definition, without any optional sections
+        :returns:           Tuple (greedy regex, lazy regex, [key per group], variant definition).  The
+                            lazy regex is None if no path component contains more than one key.
+        :raises TankError:  If the variant can't be compiled
+        """
+        parts = re.split(r"{([^}]*)}", variant_def)
+        pattern = [re.escape(prefix)]
+        lazy_pattern = [re.escape(prefix)]
+        keys = []
+        group_names = {}
+        keys_in_component = 0
+        is_ambiguous = False
+        for i, part in enumerate(parts):
+            if i % 2 == 0:
+                # static text:
+                if os.sep in part:
+                    keys_in_component = 0
+                pattern.append(re.escape(self._normalize(part)))
+                lazy_pattern.append(pattern[-1])
+                continue
+
+            key = self._template.keys.get(part)
+            if not key:
+                raise TankError("Unrecognised key '%s'" % part)
+            if part in group_names:
+                # the same key must have the same value everywhere in the path:
+                pattern.append("(?P=%s)" % group_names[part])
+                lazy_pattern.append(pattern[-1])
+                continue
+
+            keys_in_component += 1
+            is_ambiguous = is_ambiguous or keys_in_component > 1
+            key_pattern = self._key_pattern(key)
+            group_names[part] = "k%d" % len(keys)
+            pattern.append("(?P<%s>%s)" % (group_names[part], key_pattern))
+            lazy_pattern.append("(?P<%s>%s?)" % (group_names[part], key_pattern))
+            keys.append(key)
+        pattern.append("$")
+        lazy_pattern.append("$")
+
+        flags = re.IGNORECASE if self._ignore_case else 0
+        lazy_regex = re.compile("".join(lazy_pattern), flags) if is_ambiguous else None
+        return (re.compile("".join(pattern), flags), lazy_regex, keys, variant_def)
+
+    def _key_pattern(self, key):
+        """
+        :param key: The template key to find the pattern for
+        :returns:   The regular expression pattern used to match values for the key
+        """
+        if type(key).__name__ == "IntegerKey":
+            return TemplateFieldExtractor._DIGITS_PATTERN
+        filter_by = getattr(key, "filter_by", None)
+        return TemplateFieldExtractor._FILTER_PATTERNS.get(filter_by, TemplateFieldExtractor._GENERIC_PATTERN)
+
+
+class FieldExtractorCache(Threaded):
+    """
+    Cache of compiled field extractors, one per template.
+    """
+
+    def __init__(self):
+        """
+        Construction
+        """
+        Threaded.__init__(self)
+        self._extractors = {}# template:TemplateFieldExtractor
+
+    @Threaded.exclusive
+    def get(self, template):
+        """
+        Get the field extractor for a template, compiling it the first time it's needed.
+
+        :param template:    The TemplatePath to get the extractor for
+        :returns:           A TemplateFieldExtractor for the template
+        """
+        extractor = self._extractors.get(template)
+        if not extractor:
+            extractor = TemplateFieldExtractor(template)
+            self._extractors[template] = extractor
+        return extractor
+
+# single global instance of the field extractor cache
+g_field_extractor_cache = FieldExtractorCache()
@@ -0,0 +1,261 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Template aware directory walker used to find files on disk that match a template.
+"""
+
+import os
+from multiprocessing.pool import ThreadPool
+
+from sgtk import TankError
+
+from .template_field_extractor import g_field_extractor_cache
+
+try:
+    # Python 3.5+
+    from os import scandir
+except ImportError:
+    try:
+        # the scandir backport may be available for older versions of Python
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+class _DirEntry(object):
+    """
+    Minimal stand-in for the DirEntry class returned by scandir when scandir isn't available.
+    """
+    def __init__(self, dir_path, name):
+        """
+        Construction
+
+        :param dir_path:    The directory containing the entry
+        :param name:        The name of the entry
+        """
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+        self._stat = None
+
+    def is_dir(self):
+        """
+        :returns:   True if the entry is a directory, otherwise False
+        """
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        """
+        :returns:   The stat result for the entry
+        """
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+
+class TemplateWalker(object):
+    """
+    Find all paths on disk that match a template.  Rather than globbing every candidate path
+    one after another, the walker starts from the deepest directory that can be fully resolved
+    from the specified fields and works down the template one level at a time:
+
+    - Levels of the template that don't contain any keys are appended directly without listing
+      the parent directory.
+    - Levels that do contain keys are found by listing the parent directories and keeping only
+      the entries that match the template for that level.  All the directories for a level are
+      listed in parallel using a bounded pool of threads which is where most of the time is won
+      on high-latency file servers.
+    """
+
+    class Level(object):
+        """
+        A single level (path component) of the template being walked.
+        """
+        def __init__(self, template, is_leaf):
+            """
+            Construction
+
+            :param template:    The template representing the path up to and including this level
+            :param is_leaf:     True if this is the last level of the template
+            """
+            self.template = template
+            self.is_leaf = is_leaf
+            # if the last path component of the template doesn't contain any keys then it can be
+            # used as-is without having to list the parent directory:
+            name = os.path.basename(template.definition)
+            self.static_name = name if "{" not in name and "[" not in name else None
+
+    # maximum number of directories listed at the same time:
+    MAX_THREADS = 8
+
+    def __init__(self, max_threads=None):
+        """
+        Construction
+
+        :param max_threads: The maximum number of threads to use when listing directories
+        """
+        self._max_threads = max_threads or TemplateWalker.MAX_THREADS
+
+    def resolve_levels(self, template, fields, skip_fields):
+        """
+        Find the directory to start the walk from together with all the levels of the template
+        below it.
+
+        :param template:    The template to walk
+        :param fields:      Dictionary of fields to use when resolving the template
+        :param skip_fields: List of fields whose value may differ from the specified fields
+        :returns:           Tuple (root path, [Level]) or (None, []) if the template can't be
+                            walked from the fields.
+        """
+        # find the deepest parent template that can be fully resolved from the fields:
+        templates = []
+        root_template = template
+        while root_template:
+            if all(k in fields and k not in skip_fields for k in root_template.keys):
+                break
+            templates.insert(0, root_template)
+            root_template = root_template.parent
+        if not root_template or not templates:
+            return (None, [])
+
+        try:
+            root_path = root_template.apply_fields(fields)
+        except TankError:
+            return (None, [])
+
+        levels = [TemplateWalker.Level(t, t is template) for t in templates]
+        return (root_path, levels)
+
+    def walk(self, template, fields, skip_fields, found_callback=None):
+        """
+        Walk the file system to find all paths that match the template.
+
+        :param template:        The template to find paths for
+        :param fields:          Dictionary of fields to use when resolving the template
+        :param skip_fields:     List of fields whose value may differ from the specified fields
+        :param found_callback:  Optional callable that is called with the list of (path, fields, stat
+                                result) tuples found in each directory of the last level as soon as
+                                the directory has been listed.  This is called from the thread that
+                                called walk().
+        :returns:           A list of (path, fields, stat result) tuples, one for each path
+                            found or None if the template can't be walked from the fields.
+        """
+        root_path, levels = self.resolve_levels(template, fields, skip_fields)
+        if not root_path:
+            return None
+
+        current_paths = [root_path]
+        for level in levels:
+            if level.static_name and not level.is_leaf:
+                # no need to list anything - the next level will just fail to list any paths
+                # that don't exist:
+                current_paths = [os.path.join(p, level.static_name) for p in current_paths]
+                continue
+
+            dir_results = self.map(
+                lambda dir_path: self.scan_directory(dir_path, level, fields, skip_fields),
+                current_paths,
+                found_callback if level.is_leaf else None
+            )
+            found = [entry for entries in dir_results for entry in entries]
+            if level.is_leaf:
+                return found
+            current_paths = [path for path, _, _ in found]
+
+        return []
+
+    def scan_directory(self, dir_path, level, fields, skip_fields):
+        """
+        List a single directory, returning all entries that match the template for the level.
+        For leaf levels, the stat result for each entry is also returned.
+
+        :param dir_path:    The directory to list
+        :param level:       The Level being listed
+        :param fields:      Dictionary of fields to use when resolving the template
+        :param skip_fields: List of fields whose value may differ from the specified fields
+        :returns:           A list of (path, fields, stat result) tuples for each matching entry.  The
+                            stat result is None for entries that aren't leaves.
+        """
+        if level.static_name:
+            entries = [_DirEntry(dir_path, level.static_name)]
+        else:
+            try:
+                if scandir:
+                    entries = list(scandir(dir_path))
+                else:
+                    entries = [_DirEntry(dir_path, name) for name in os.listdir(dir_path)]
+            except OSError:
+                # not a directory or we don't have permission to list it
+                return []
+
+        found = []
+        for entry in entries:
+            entry_fields = self.match_fields(level.template, entry.path, fields, skip_fields)
+            if entry_fields is None:
+                continue
+            try:
+                if level.is_leaf:
+                    found.append((entry.path, entry_fields, entry.stat()))
+                elif entry.is_dir():
+                    found.append((entry.path, entry_fields, None))
+            except OSError:
+                # the entry may have been removed since the directory was listed
+                continue
+        return found
+
+    def match_fields(self, template, path, fields, skip_fields):
+        """
+        Extract the fields for a path using the template, making sure that they match the fields
+        used for the walk.
+
+        :param template:    The template to match the path against
+        :param path:        The path to extract the fields from
+        :param fields:      Dictionary of fields to use when resolving the template
+        :param skip_fields: List of fields whose value may differ from the specified fields
+        :returns:           A dictionary of fields if the path matches, otherwise None
+        """
+        path_fields = g_field_extractor_cache.get(template).get_fields(path)
+        if path_fields is None:
+            return None
+        for name, value in path_fields.iteritems():
+            if name not in skip_fields and name in fields and fields[name] != value:
+                return None
+        return path_fields
+
+    def map(self, func, items, callback=None):
+        """
+        Call a function for each item using a bounded pool of threads.
+
+        :param func:        The function to call
+        :param items:       The list of items to call the function with
+        :param callback:    Optional callable that is called with each result as soon as it's available.
+                            This is called from the calling thread.
+        :returns:           A list containing the result of the function for each item.  If a callback
+                            is specified then the results are in the order they became available.
+        """
+        if len(items) <= 1:
+            results = [func(item) for item in items]
+            if callback:
+                for result in results:
+                    callback(result)
+            return results
+
+        pool = ThreadPool(min(self._max_threads, len(items)))
+        try:
+            if not callback:
+                return pool.map(func, items)
+            results = []
+            for result in pool.imap_unordered(func, items):
+                callback(result)
+                results.append(result)
+            return results
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,435 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Scaling of thumbnails, an in-memory cache of the resulting pixmaps and an on-disk cache of the
+scaled thumbnails for publishes.
+"""
+
+import os
+import hashlib
+import threading
+import urlparse
+from collections import OrderedDict
+
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+
+from .util import Threaded
+
+# all thumbnails are scaled to fit within these dimensions:
+THUMBNAIL_WIDTH = 576 # 96
+THUMBNAIL_HEIGHT = 374 # 64
+
+
+def build_thumbnail_image(thumb_path, use_cache=True):
+    """
+    Load the thumbnail from the specified path and scale it to uniform dimensions.  This only uses
+    QImage so it is safe to call from a background thread.
+
+    :param thumb_path:  The path on disk of the thumbnail to load
+    :param use_cache:   If True then the thumbnail isn't scaled if a pixmap for it is already in the
+                        thumbnail cache
+    :returns:           Tuple (key, QImage) where key is a hash of the thumbnail file contents and the
+                        QImage is the scaled thumbnail or None if it couldn't be loaded
+    """
+    try:
+        with open(thumb_path, "rb") as thumb_file:
+            thumb_key = hashlib.md5(thumb_file.read()).hexdigest()
+    except (IOError, OSError):
+        return (None, None)
+
+    if use_cache and g_thumbnail_cache.contains(thumb_key):
+        # already have a pixmap for a thumbnail with identical contents so no need to scale it again!
+        return (thumb_key, None)
+
+    # load the thumbnail
+    thumb = QtGui.QImage(thumb_path)
+    if not thumb or thumb.isNull():
+        return (None, None)
+
+    # make sure the thumbnail is a good size with the correct aspect ratio:
+    ASPECT = float(THUMBNAIL_WIDTH) / THUMBNAIL_HEIGHT
+
+    thumb_sz = thumb.size()
+    thumb_aspect = float(thumb_sz.width()) / thumb_sz.height()
+    max_thumb_sz = QtCore.QSize(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT)
+    if thumb_aspect >= ASPECT:
+        # scale based on width:
+        if thumb_sz.width() > THUMBNAIL_WIDTH:
+            thumb_sz *= (float(THUMBNAIL_WIDTH) / thumb_sz.width())
+        else:
+            max_thumb_sz *= (float(thumb_sz.width()) / THUMBNAIL_WIDTH)
+    else:
+        # scale based on height:
+        if thumb_sz.height() > THUMBNAIL_HEIGHT:
+            thumb_sz *= (float(THUMBNAIL_HEIGHT) / thumb_sz.height())
+        else:
+            max_thumb_sz *= (float(thumb_sz.height()) / THUMBNAIL_HEIGHT)
+
+    if thumb_sz != thumb.size():
+        thumb = thumb.scaled(thumb_sz.width(), thumb_sz.height(),
+                             QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+
+    # create base image with the correct aspect ratio that the thumbnail will fit in
+    # and fill it with a transparent colour:
+    thumb_base = QtGui.QImage(max_thumb_sz, QtGui.QImage.Format_ARGB32_Premultiplied)
+    thumb_base.fill(0)
+
+    # create a painter to paint into this image:
+    painter = QtGui.QPainter(thumb_base)
+    try:
+        # paint the thumbnail into this base making sure it's centered:
+        diff = max_thumb_sz - thumb.size()
+        offset = diff / 2
+        painter.drawImage(offset.width(), offset.height(), thumb)
+    finally:
+        painter.end()
+
+    return (thumb_key, thumb_base)
+
+
+class ThumbnailCache(Threaded):
+    """
+    Least-recently-used cache of thumbnail pixmaps that is limited to a maximum memory size.  Pixmaps
+    are keyed by the contents of the thumbnail they were built from so that file versions that share
+    the same thumbnail also share a single pixmap.
+
+    Note that pixmaps can only be used from the main thread so although the contents of the cache can
+    be queried from any thread, pixmaps should only be added and retrieved from the main thread.
+    """
+
+    # default maximum size of the cache in bytes:
+    DEFAULT_MAX_SIZE = 128 * 1024 * 1024
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """
+        Construction
+
+        :param max_size:    The maximum size of all pixmaps in the cache in bytes
+        """
+        Threaded.__init__(self)
+        self._pixmaps = OrderedDict()# key:(QPixmap, size in bytes), least recently used first
+        self._size = 0
+        self._max_size = max_size
+
+    @Threaded.exclusive
+    def set_max_size(self, max_size):
+        """
+        Set the maximum size of all pixmaps in the cache, discarding the least recently used pixmaps
+        if the cache is now too big.
+
+        :param max_size:    The maximum size in bytes
+        """
+        self._max_size = max_size
+        self._evict()
+
+    @Threaded.exclusive
+    def contains(self, key):
+        """
+        :param key: The key to look for
+        :returns:   True if the cache contains a pixmap for the key, otherwise False
+        """
+        return key in self._pixmaps
+
+    @Threaded.exclusive
+    def get(self, key):
+        """
+        Get the pixmap for the specified key, marking it as the most recently used.
+
+        :param key: The key of the pixmap to return
+        :returns:   The QPixmap for the key or None if it isn't in the cache
+        """
+        entry = self._pixmaps.pop(key, None)
+        if entry is None:
+            return None
+        self._pixmaps[key] = entry
+        return entry[0]
+
+    @Threaded.exclusive
+    def add(self, key, pixmap):
+        """
+        Add a pixmap to the cache, discarding the least recently used pixmaps if the cache becomes
+        too big.
+
+        :param key:     The key to add the pixmap for
+        :param pixmap:  The QPixmap to add
+        """
+        entry = self._pixmaps.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+        size = pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) / 8
+        self._pixmaps[key] = (pixmap, size)
+        self._size += size
+        self._evict()
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the cache
+        """
+        self._pixmaps = OrderedDict()
+        self._size = 0
+
+    def _evict(self):
+        """
+        Discard the least recently used pixmaps until the cache is within the maximum size.  The most
+        recently used pixmap is always kept.
+        """
+        while self._size > self._max_size and len(self._pixmaps) > 1:
+            _, (_, size) = self._pixmaps.popitem(last=False)
+            self._size -= size
+
+# single global instance of the thumbnail cache
+g_thumbnail_cache = ThumbnailCache()
+
+
+class ThumbnailDiskCache(Threaded):
+    """
+    Least-recently-used cache of scaled publish thumbnails stored on disk and limited to a maximum size.
+    Thumbnail urls for publishes are signed and expire so they can't be used to identify a thumbnail
+    across sessions.  Instead, thumbnails are keyed by the published file id together with a hash of the
+    url without its query string which identifies the content of the thumbnail.
+
+    Each thumbnail is stored as a png file named:
+
+        <published file id>_<url hash>_<thumbnail key>.png
+
+    where the thumbnail key is the key used for the pixmap in the in-memory thumbnail cache.
+    """
+
+    # default maximum size of the cache in bytes:
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+    _CACHE_FOLDER_NAME = "thumbnails"
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """
+        Construction
+
+        :param max_size:    The maximum size of all thumbnails in the cache in bytes
+        """
+        Threaded.__init__(self)
+        self._cache_dir = None
+        self._entries = None# (published file id, url hash):(path, thumbnail key, size in bytes), least recently used first
+        self._size = 0
+        self._max_size = max_size
+
+    @Threaded.exclusive
+    def set_max_size(self, max_size):
+        """
+        Set the maximum size of all thumbnails in the cache, removing the least recently used thumbnails
+        if the cache is now too big.
+
+        :param max_size:    The maximum size in bytes
+        """
+        self._max_size = max_size
+        if self._entries is not None:
+            self._evict()
+
+    @Threaded.exclusive
+    def contains(self, published_file_id, url):
+        """
+        :param published_file_id:   The id of the publish the thumbnail is for
+        :param url:                 The url the thumbnail is downloaded from
+        :returns:                   True if the cache contains the thumbnail, otherwise False
+        """
+        return self._get_entry_key(published_file_id, url) in self._get_entries()
+
+    @Threaded.exclusive
+    def find(self, published_file_id, url):
+        """
+        Find a thumbnail in the cache, marking it as the most recently used.
+
+        :param published_file_id:   The id of the publish the thumbnail is for
+        :param url:                 The url the thumbnail is downloaded from
+        :returns:                   Tuple (path, key) containing the path of the scaled thumbnail on disk
+                                    and the key to use for it in the in-memory thumbnail cache or
+                                    (None, None) if the thumbnail isn't in the cache
+        """
+        entries = self._get_entries()
+        entry_key = self._get_entry_key(published_file_id, url)
+        entry = entries.pop(entry_key, None)
+        if entry is None:
+            return (None, None)
+
+        path, thumb_key, _ = entry
+        try:
+            # touch the file so that the order is preserved across sessions:
+            os.utime(path, None)
+        except OSError:
+            # the file has been removed!
+            self._size -= entry[2]
+            return (None, None)
+
+        entries[entry_key] = entry
+        return (path, thumb_key)
+
+    def add(self, published_file_id, url, thumb_key, thumb_image):
+        """
+        Add a scaled thumbnail to the cache, removing the least recently used thumbnails if the cache
+        becomes too big.  This only uses QImage so it is safe to call from a background thread.
+
+        :param published_file_id:   The id of the publish the thumbnail is for
+        :param url:                 The url the thumbnail was downloaded from
+        :param thumb_key:           The key of the thumbnail in the in-memory thumbnail cache
+        :param thumb_image:         The scaled thumbnail QImage to add
+        """
+        cache_dir = self._get_cache_dir()
+        if not cache_dir:
+            return
+
+        entry_key = self._get_entry_key(published_file_id, url)
+        path = os.path.join(cache_dir, "%s_%s_%s.png" % (entry_key[0], entry_key[1], thumb_key))
+
+        # encode the thumbnail without holding the lock so that lookups aren't blocked:
+        tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.current_thread().ident)
+        if not thumb_image.save(tmp_path, "PNG"):
+            # make sure a partially written file isn't left behind:
+            ThumbnailDiskCache._remove_file(tmp_path)
+            return
+        self._add_entry(entry_key, path, tmp_path, thumb_key)
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the cache, removing all thumbnails from disk
+        """
+        for entry_key in list(self._get_entries().keys()):
+            self._remove_entry(entry_key)
+
+    @Threaded.exclusive
+    def _get_cache_dir(self):
+        """
+        :returns:   The folder the thumbnails are stored in or None if the app doesn't have a cache
+                    location
+        """
+        self._get_entries()
+        return self._cache_dir
+
+    @Threaded.exclusive
+    def _add_entry(self, entry_key, path, tmp_path, thumb_key):
+        """
+        Add an entry for a thumbnail that has been saved to a temporary file, moving the file into
+        place.
+
+        :param entry_key:   The key of the entry in the cache
+        :param path:        The path the thumbnail should be stored at
+        :param tmp_path:    The path the thumbnail was saved to
+        :param thumb_key:   The key of the thumbnail in the in-memory thumbnail cache
+        """
+        entries = self._get_entries()
+        try:
+            # replace any existing thumbnail for the entry:
+            self._remove_entry(entry_key)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            # don't leave files behind that the cache doesn't know about:
+            ThumbnailDiskCache._remove_file(tmp_path)
+            ThumbnailDiskCache._remove_file(path)
+            return
+
+        entries[entry_key] = (path, thumb_key, size)
+        self._size += size
+        self._evict()
+
+    def _get_entry_key(self, published_file_id, url):
+        """
+        :param published_file_id:   The id of the publish the thumbnail is for
+        :param url:                 The url the thumbnail is downloaded from
+        :returns:                   The key of the thumbnail in the cache
+        """
+        url_path = urlparse.urlsplit(url or "").path
+        return (str(published_file_id), hashlib.md5(url_path).hexdigest())
+
+    def _get_entries(self):
+        """
+        Get the entries in the cache, loading them from the cache folder the first time they are needed.
+
+        :returns:   OrderedDict of all entries in the cache, least recently used first
+        """
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = OrderedDict()
+        self._size = 0
+
+        cache_location = sgtk.platform.current_bundle().cache_location
+        if not cache_location:
+            return self._entries
+        self._cache_dir = os.path.join(cache_location, ThumbnailDiskCache._CACHE_FOLDER_NAME)
+        if not os.path.exists(self._cache_dir):
+            try:
+                os.makedirs(self._cache_dir)
+            except OSError:
+                # the folder may have been created in a different process
+                pass
+
+        found_entries = []
+        try:
+            file_names = os.listdir(self._cache_dir)
+        except OSError:
+            file_names = []
+        for file_name in file_names:
+            name, ext = os.path.splitext(file_name)
+            parts = name.split("_")
+            if ext != ".png" or len(parts) != 3:
+                continue
+            path = os.path.join(self._cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found_entries.append((stat.st_mtime, (parts[0], parts[1]), (path, parts[2], stat.st_size)))
+
+        for _, entry_key, entry in sorted(found_entries):
+            self._entries[entry_key] = entry
+            self._size += entry[2]
+        self._evict()
+
+        return self._entries
+
+    def _remove_entry(self, entry_key):
+        """
+        Remove an entry from the cache and its thumbnail from disk.
+
+        :param entry_key:   The key of the entry to remove
+        """
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        self._size -= entry[2]
+        ThumbnailDiskCache._remove_file(entry[0])
+
+    @staticmethod
+    def _remove_file(path):
+        """
+        Remove a file from disk if it exists, ignoring any errors.
+
+        :param path:    The path of the file to remove
+        """
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """
+        Remove the least recently used thumbnails until the cache is within the maximum size.
+        """
+        while self._size > self._max_size and self._entries:
+            self._remove_entry(next(iter(self._entries)))
+
+# single global instance of the thumbnail disk cache
+g_thumbnail_disk_cache = ThumbnailDiskCache()
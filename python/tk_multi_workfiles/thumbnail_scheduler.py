@@ -0,0 +1,291 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Scheduling of thumbnail downloads so that duplicate requests are merged and visible files are
+downloaded first.
+"""
+
+from collections import deque
+
+import sgtk
+from sgtk.platform.qt import QtCore
+
+
+class ThumbnailScheduler(QtCore.QObject):
+    """
+    Schedule thumbnail downloads through a ShotgunDataRetriever.
+
+    Requests for the same publish or the same url are merged into a single download and only a
+    small number of downloads are in progress at any time.  Requests for files that have been painted
+    in a view are downloaded first, followed by requests for files in groups that are visible.
+    Requests for groups that aren't visible are held back (and stopped if they are already in progress)
+    until the group becomes visible again.
+
+    Each request is made on behalf of an 'owner' which is a (group key, file key, file version) tuple
+    identifying the model items the thumbnail is for.
+    """
+
+    class _Request(object):
+        """
+        A single thumbnail download shared by all the owners that requested it.
+        """
+        __slots__ = ("url", "published_file_id", "owners", "group_keys", "uid", "is_done")
+
+        def __init__(self, url, published_file_id):
+            """
+            :param url:                 The url of the thumbnail to download
+            :param published_file_id:   The id of the publish the thumbnail is for
+            """
+            self.url = url
+            self.published_file_id = published_file_id
+            self.owners = set()
+            self.group_keys = set()
+            self.uid = None# the data retriever request id when the download is in progress
+            self.is_done = False
+
+        @property
+        def is_pending(self):
+            """
+            :returns:   True if the request is waiting to be downloaded, otherwise False
+            """
+            return self.uid is None and not self.is_done
+
+    # the maximum number of downloads in progress at any time:
+    MAX_IN_PROGRESS = 4
+
+    # Signal emitted when a thumbnail has been downloaded for a list of owners
+    thumbnail_downloaded = QtCore.Signal(object, object, object, object)# owners, thumb path, published file id, url
+
+    def __init__(self, data_retriever, published_file_type, parent=None):
+        """
+        Construction
+
+        :param data_retriever:      The ShotgunDataRetriever used to download thumbnails
+        :param published_file_type: The entity type used for publishes
+        :param parent:              The parent QObject for this instance
+        """
+        QtCore.QObject.__init__(self, parent)
+
+        self._app = sgtk.platform.current_bundle()
+        self._published_file_type = published_file_type
+        self._data_retriever = data_retriever
+        self._data_retriever.work_completed.connect(self._on_data_retriever_work_completed)
+        self._data_retriever.work_failure.connect(self._on_data_retriever_work_failed)
+
+        self._requests_by_url = {}# url:_Request
+        self._requests_by_publish = {}# published file id:_Request
+        self._requests_by_owner = {}# owner:_Request
+        self._in_progress = {}# data retriever request id:_Request
+
+        # pending requests are only ever removed from the queues when they are next looked at so the
+        # queues may also contain requests that are no longer pending:
+        self._priority_queue = []# stack of requests for files that have been painted
+        self._group_queues = {}# group key:deque(_Request)
+
+        # the keys of the visible groups or None if all groups should be treated as visible:
+        self._visible_group_keys = None
+
+    def shut_down(self):
+        """
+        Stop all requests and disconnect from the data retriever.
+        """
+        self.stop_all()
+        if self._data_retriever:
+            self._data_retriever.work_completed.disconnect(self._on_data_retriever_work_completed)
+            self._data_retriever.work_failure.disconnect(self._on_data_retriever_work_failed)
+            self._data_retriever = None
+
+    def request(self, owner, url, published_file_id):
+        """
+        Request a thumbnail.  If the thumbnail has already been requested for the same url or publish
+        then the owner is added to the existing request rather than downloading it again.
+
+        :param owner:               Tuple (group key, file key, file version) that the thumbnail is for
+        :param url:                 The url of the thumbnail to download
+        :param published_file_id:   The id of the publish the thumbnail is for
+        """
+        request = self._requests_by_publish.get(published_file_id) if published_file_id else None
+        request = request or self._requests_by_url.get(url)
+        if not request:
+            request = ThumbnailScheduler._Request(url, published_file_id)
+            self._requests_by_url[url] = request
+            if published_file_id:
+                self._requests_by_publish[published_file_id] = request
+
+        request.owners.add(owner)
+        self._requests_by_owner[owner] = request
+        group_key = owner[0]
+        if group_key not in request.group_keys:
+            request.group_keys.add(group_key)
+            if request.is_pending:
+                self._group_queues.setdefault(group_key, deque()).append(request)
+
+        self._dispatch()
+
+    def has_request(self, owner):
+        """
+        :param owner:   Tuple (group key, file key, file version) that the thumbnail would be requested for
+        :returns:       True if a thumbnail has been requested for the owner and hasn't been downloaded
+                        yet, otherwise False
+        """
+        return owner in self._requests_by_owner
+
+    def prioritize(self, owner):
+        """
+        Move the request for the specified owner to the front of the queue, e.g. because the file it's
+        for is being shown in a view.
+
+        :param owner:   Tuple (group key, file key, file version) that the thumbnail was requested for
+        """
+        request = self._requests_by_owner.get(owner)
+        if not request or not request.is_pending:
+            return
+        self._priority_queue.append(request)
+        self._dispatch()
+
+    def set_visible_groups(self, group_keys):
+        """
+        Set the groups that are currently visible.  Requests for groups that aren't visible are held
+        back until the group becomes visible again, including requests that are already in progress.
+
+        :param group_keys:  A list of the keys of all visible groups or None if all groups should be
+                            treated as visible
+        """
+        self._visible_group_keys = set(group_keys) if group_keys is not None else None
+
+        if self._visible_group_keys is not None:
+            # stop any downloads that are in progress for groups that are no longer visible:
+            for uid, request in self._in_progress.items():
+                if request.group_keys & self._visible_group_keys:
+                    continue
+                self._data_retriever.stop_work(uid)
+                del(self._in_progress[uid])
+                request.uid = None
+                for group_key in request.group_keys:
+                    self._group_queues.setdefault(group_key, deque()).appendleft(request)
+
+        self._dispatch()
+
+    def stop_all(self):
+        """
+        Stop all requests, including any that are in progress.
+        """
+        if self._data_retriever:
+            for uid in self._in_progress:
+                self._data_retriever.stop_work(uid)
+        self._requests_by_url = {}
+        self._requests_by_publish = {}
+        self._requests_by_owner = {}
+        self._in_progress = {}
+        self._priority_queue = []
+        self._group_queues = {}
+
+    # ------------------------------------------------------------------------------------------
+    # protected methods
+
+    def _next_request(self):
+        """
+        :returns:   The next pending request to download or None if there aren't any that can be
+                    downloaded at the moment
+        """
+        # requests for files that have been painted take priority, most recently painted first:
+        while self._priority_queue:
+            request = self._priority_queue.pop()
+            if request.is_pending:
+                return request
+
+        # then requests for the visible groups in the order they were requested:
+        if self._visible_group_keys is None:
+            group_keys = self._group_queues.keys()
+        else:
+            group_keys = [k for k in self._group_queues if k in self._visible_group_keys]
+        for group_key in group_keys:
+            queue = self._group_queues[group_key]
+            while queue:
+                request = queue.popleft()
+                if request.is_pending:
+                    return request
+            del(self._group_queues[group_key])
+        return None
+
+    def _dispatch(self):
+        """
+        Start downloading pending requests until the maximum number of downloads are in progress.
+        """
+        if not self._data_retriever:
+            return
+        while len(self._in_progress) < ThumbnailScheduler.MAX_IN_PROGRESS:
+            request = self._next_request()
+            if not request:
+                break
+            request.uid = self._data_retriever.request_thumbnail(request.url,
+                                                                 self._published_file_type,
+                                                                 request.published_file_id,
+                                                                 "image",
+                                                                 load_image=False)
+            self._in_progress[request.uid] = request
+
+    def _complete_request(self, uid):
+        """
+        Remove a completed or failed request.
+
+        :param uid: The data retriever request id of the request
+        :returns:   The _Request that was completed or None if the request is of no interest
+        """
+        request = self._in_progress.pop(uid, None)
+        if not request:
+            return None
+        request.is_done = True
+        request.uid = None
+        if self._requests_by_url.get(request.url) is request:
+            del(self._requests_by_url[request.url])
+        if self._requests_by_publish.get(request.published_file_id) is request:
+            del(self._requests_by_publish[request.published_file_id])
+        for owner in request.owners:
+            if self._requests_by_owner.get(owner) is request:
+                del(self._requests_by_owner[owner])
+        return request
+
+    def _on_data_retriever_work_completed(self, uid, request_type, data):
+        """
+        Slot triggered when the data retriever has finished doing some work.
+
+        :param uid:             The unique id representing a task being executed by the data retriever
+        :param request_type:    A string representing the type of request that has been completed
+        :param data:            The result from completing the work
+        """
+        request = self._complete_request(uid)
+        if not request:
+            # the completed work is of no interest to us!
+            return
+
+        thumb_path = data.get("thumb_path")
+        if thumb_path:
+            self.thumbnail_downloaded.emit(list(request.owners), thumb_path,
+                                           request.published_file_id, request.url)
+
+        # start the next download:
+        self._dispatch()
+
+    def _on_data_retriever_work_failed(self, uid, error_msg):
+        """
+        Slot triggered when the data retriever fails to do some work!
+
+        :param uid:         The unique id representing the task that the data retriever failed on
+        :param error_msg:   The error message for the failed task
+        """
+        request = self._complete_request(uid)
+        if not request:
+            return
+        self._app.log_debug("File Model: Failed to find thumbnail for id %s: %s" % (uid, error_msg))
+
+        # start the next download:
+        self._dispatch()
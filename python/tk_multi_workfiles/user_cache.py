@@ -111,14 +111,34 @@ class UserCache(Threaded):
         :returns:       A  Shotgun entity dictionary for the HumanUser that last modified the path
         """
 
-        login_name = None
         if sys.platform == "win32":
+            # TODO: add windows support..
+            return None
+
+        try:
+            uid = os.stat(path).st_uid
+        except OSError:
+            return None
+
+        return self.get_user_details_for_uid(uid)
+
+    def get_user_details_for_uid(self, uid):
+        """
+        Get the user details for the specified file system user id, e.g. the owner of a file.  Note,
+        this currently doesn't work on Windows as Windows doesn't provide this information as standard
+
+        :param uid:     The file system user id to find the user details for
+        :returns:       A Shotgun entity dictionary for the HumanUser with the login matching the
+                        file system user or None if not found
+        """
+        login_name = None
+        if sys.platform == "win32" or uid is None:
             # TODO: add windows support..
             pass
         else:
             try:
                 from pwd import getpwuid
-                login_name = getpwuid(os.stat(path).st_uid).pw_name
+                login_name = getpwuid(uid).pw_name
             except:
                 pass
 
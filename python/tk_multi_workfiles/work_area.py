@@ -13,11 +13,16 @@ Environment and context abstraction.
 """
 
 import copy
+import threading
+from collections import OrderedDict
+
 import sgtk
 from sgtk import TankError
 
 from .user_cache import g_user_cache
+from .context_cache import g_context_cache, get_context_key
 from .util import Threaded, get_template_user_keys
+from .template_walker import TemplateWalker
 
 
 class WorkArea(object):
@@ -29,17 +34,33 @@ class WorkArea(object):
     # Number of template settings for the app.
     NB_TEMPLATE_SETTINGS = 4
 
+    # maximum number of seconds to wait for another thread that is resolving the same settings before
+    # resolving them again:
+    _RESOLVE_WAIT_TIMEOUT = 5.0
+
     class _SettingsCache(Threaded):
         """
-        Cache of settings per context.
+        Least-recently-used cache of settings per context.  Contexts are mapped to the environment,
+        engine & app instance their settings were resolved from so that all contexts that resolve
+        to the same app instance share the same settings.  If several threads need the settings for
+        the same app instance at the same time (e.g. when searching all the Tasks for a Shot) then
+        only one of them resolves the settings and the others wait for it.
         """
 
-        def __init__(self):
+        # default maximum number of contexts & app instances that are cached:
+        DEFAULT_MAX_ENTRIES = 512
+
+        def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
             """
             Constructor.
+
+            :param max_entries: The maximum number of contexts & app instances to cache settings for.
             """
             Threaded.__init__(self)
-            self._cache = []
+            self._instance_keys = OrderedDict()# context key:app instance key, least recently used first
+            self._settings = OrderedDict()# app instance key:settings, least recently used first
+            self._resolving = {}# app instance key:threading.Event set once the settings are resolved
+            self._max_entries = max_entries
 
         @Threaded.exclusive
         def get(self, context):
@@ -50,20 +71,99 @@ class WorkArea(object):
 
             :returns: The settings dictionary or None
             """
-            for ctx, settings in self._cache:
-                if ctx == context:
-                    return settings
-            return None
+            context_key = get_context_key(context)
+            instance_key = self._instance_keys.pop(context_key, None)
+            if instance_key is None:
+                return None
+            self._instance_keys[context_key] = instance_key
+            return self._get_instance_settings(instance_key)
 
         @Threaded.exclusive
-        def add(self, context, settings):
+        def get_for_instance(self, context, instance_key):
+            """
+            Retrieve the cached settings for an app instance, caching them for the given context as well.
+
+            :param context: The context the settings are for.
+            :param instance_key: Tuple (environment, engine instance, app instance) identifying the app
+                                 instance the settings were resolved from.
+
+            :returns: The settings dictionary or None
+            """
+            settings = self._get_instance_settings(instance_key)
+            if settings is not None:
+                self._add_context(context, instance_key)
+            return settings
+
+        @Threaded.exclusive
+        def add(self, context, settings, instance_key=None):
             """
             Cache settings for a given context.
 
             :param context: Context for which these settings need to be cached.
             :param settings: Settings to cache.
+            :param instance_key: Tuple (environment, engine instance, app instance) identifying the app
+                                 instance the settings were resolved from or None if they should only be
+                                 cached for the context.
+            """
+            if instance_key is None:
+                instance_key = ("context", get_context_key(context))
+            self._settings.pop(instance_key, None)
+            self._settings[instance_key] = settings
+            if len(self._settings) > self._max_entries:
+                self._settings.popitem(last=False)
+            self._add_context(context, instance_key)
+
+        @Threaded.exclusive
+        def begin_resolve(self, instance_key):
             """
-            self._cache.append((context, settings))
+            Register that the settings for an app instance are about to be resolved so that other
+            threads that need the same settings can wait for them rather than resolving them again.
+
+            :param instance_key: The key of the app instance.
+            :returns: A threading.Event that will be set once the settings have been resolved if another
+                      thread is already resolving them, otherwise None in which case end_resolve() must
+                      be called once the settings have been resolved.
+            """
+            event = self._resolving.get(instance_key)
+            if event:
+                return event
+            self._resolving[instance_key] = threading.Event()
+            return None
+
+        @Threaded.exclusive
+        def end_resolve(self, instance_key):
+            """
+            Register that the settings for an app instance have been resolved (or failed to be),
+            releasing any threads waiting for them.
+
+            :param instance_key: The key of the app instance.
+            """
+            event = self._resolving.pop(instance_key, None)
+            if event:
+                event.set()
+
+        def _get_instance_settings(self, instance_key):
+            """
+            :param instance_key: The key of the app instance to retrieve the settings for.
+            :returns: The settings dictionary or None, marked as the most recently used.
+            """
+            settings = self._settings.pop(instance_key, None)
+            if settings is not None:
+                self._settings[instance_key] = settings
+            return settings
+
+        def _add_context(self, context, instance_key):
+            """
+            Map a context to the app instance its settings were resolved from.
+
+            :param context: The context to add.
+            :param instance_key: The key of the app instance.
+            """
+            context_key = get_context_key(context)
+            self._instance_keys.pop(context_key, None)
+            self._instance_keys[context_key] = instance_key
+            if len(self._instance_keys) > self._max_entries:
+                self._instance_keys.popitem(last=False)
 
     _settings_cache = _SettingsCache()
 
@@ -314,6 +414,7 @@ class WorkArea(object):
             return app_settings
 
         resolved_settings = {}
+        instance_key = None
         if app.context == context:
             # no need to look for settings as we already have them in the
             # current environment!
@@ -326,37 +427,64 @@ class WorkArea(object):
             for key in settings_to_find:
                 resolved_settings[key] = app.get_setting(key)
 
+            instance_key = (app.engine.environment.get("name"),
+                            app.engine.instance_name,
+                            app.instance_name)
         else:
-            # need to look for settings in a different context/environment
-            app_settings = self._get_raw_app_settings_for_context(app, context)
+            # need to look for settings in a different context/environment.  Contexts that resolve to
+            # the same environment share the same settings so they only need to be found once for each
+            # environment:
+            env_name = app.sgtk.execute_core_hook("pick_environment", context=context)
+            instance_key = (env_name, app.engine.instance_name, app.instance_name)
+            app_settings = WorkArea._settings_cache.get_for_instance(context, instance_key)
             if app_settings:
-
-                new_env = app_settings["env_instance"]
-                new_eng = app_settings["engine_instance"]
-                new_app = app_settings["app_instance"]
-                new_settings = app_settings["settings"]
-                new_descriptor = new_env.get_app_descriptor(new_eng, new_app)
-
-                # Create a new app instance from the new env / context
-                new_app_obj = sgtk.platform.application.get_application(
-                        app.engine, 
-                        new_descriptor.get_path(), 
-                        new_descriptor, 
-                        new_settings, 
-                        new_app, 
-                        new_env,
-                        context)
-                
-                # get templates:
-                for key in templates_to_find:
-                    resolved_settings[key] = new_app_obj.get_template(key)
-
-                # get additional settings:
-                for key in settings_to_find:
-                    resolved_settings[key] = new_app_obj.get_setting(key)
+                return app_settings
+
+            # if another thread is already resolving the settings for this environment then wait for it
+            # rather than resolving them again, unless it takes too long:
+            resolving_event = WorkArea._settings_cache.begin_resolve(instance_key)
+            if resolving_event:
+                resolving_event.wait(WorkArea._RESOLVE_WAIT_TIMEOUT)
+                app_settings = WorkArea._settings_cache.get_for_instance(context, instance_key)
+                if app_settings:
+                    return app_settings
+
+            try:
+                app_settings = self._get_raw_app_settings_for_context(app, context)
+                if app_settings:
+
+                    new_env = app_settings["env_instance"]
+                    new_eng = app_settings["engine_instance"]
+                    new_app = app_settings["app_instance"]
+                    new_settings = app_settings["settings"]
+                    new_descriptor = new_env.get_app_descriptor(new_eng, new_app)
+
+                    # Create a new app instance from the new env / context
+                    new_app_obj = sgtk.platform.application.get_application(
+                            app.engine, 
+                            new_descriptor.get_path(), 
+                            new_descriptor, 
+                            new_settings, 
+                            new_app, 
+                            new_env,
+                            context)
+
+                    # get templates:
+                    for key in templates_to_find:
+                        resolved_settings[key] = new_app_obj.get_template(key)
+
+                    # get additional settings:
+                    for key in settings_to_find:
+                        resolved_settings[key] = new_app_obj.get_setting(key)
+
+                # cache the settings before any waiting threads are released:
+                WorkArea._settings_cache.add(context, resolved_settings, instance_key)
+            finally:
+                if not resolving_event:
+                    WorkArea._settings_cache.end_resolve(instance_key)
 
         # Cache any found settings
-        WorkArea._settings_cache.add(context, resolved_settings)
+        WorkArea._settings_cache.add(context, resolved_settings, instance_key)
 
         return resolved_settings
 
@@ -468,14 +596,18 @@ class WorkArea(object):
 
         # ok, so lets search for paths that match the template:
         app = sgtk.platform.current_bundle()
-        paths = app.sgtk.paths_from_template(search_template, ctx_fields, user_keys)
+        found_paths = TemplateWalker().walk(search_template, ctx_fields, user_keys)
+        if found_paths is not None:
+            paths = [path for path, _, _ in found_paths]
+        else:
+            paths = app.sgtk.paths_from_template(search_template, ctx_fields, user_keys)
 
         # split out users from the list of paths:
         user_ids = set()
         for path in paths:
             # to find the user, we have to construct a context
             # from the path and then inspect the user from this
-            path_ctx = app.sgtk.context_from_path(path)
+            path_ctx = g_context_cache.context_from_path(path)
             user = path_ctx.user
             if user: 
                 user_ids.add(user["id"])
@@ -485,3 +617,4 @@ class WorkArea(object):
         self._sandbox_users[template.definition] = users
         return users
 
+
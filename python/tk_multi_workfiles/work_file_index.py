@@ -0,0 +1,340 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Persistent on-disk index of the work files found for a work area.
+"""
+
+import os
+import stat
+import time
+import sqlite3
+import hashlib
+import cPickle as pickle
+from collections import OrderedDict
+
+import sgtk
+
+from .util import Threaded
+from .template_walker import TemplateWalker
+
+
+class WorkFileIndex(Threaded):
+    """
+    Persistent index of the work files found on disk for a work area.  Each work area (context, user
+    and work template) is indexed separately and stores the directories that were walked to find its
+    work files together with the matching files, their template fields, modified time and owner.
+
+    When a work area is searched again, only directories whose modified time has changed since the
+    last scan are re-listed.  Files found in unchanged directories are returned straight from the
+    index without touching the file system.
+
+    Note that a file overwritten in place doesn't change the modified time of its directory so the
+    modified time stored for it will only be updated the next time its directory is re-listed.
+    """
+
+    # bump this whenever the database layout changes to discard any existing index:
+    _DB_VERSION = 2
+    _DB_FILE_NAME = "work_file_index.db"
+
+    # directories modified this many seconds or less before they were scanned are listed again on the
+    # next scan as they may have changed again without their mtime changing:
+    _MTIME_RESOLUTION = 2.0
+
+    # default maximum number of work areas kept in memory:
+    DEFAULT_MAX_AREAS = 100
+
+    class _AreaIndex(object):
+        """
+        In-memory copy of the index for a single work area.
+        """
+        def __init__(self):
+            """
+            Construction
+            """
+            # dir path:(mtime, entries) where entries is either a list of matching child
+            # directory paths or a dictionary {file path:(fields, mtime, uid)} for leaf directories
+            self.entries = {}
+
+    def __init__(self, max_areas=DEFAULT_MAX_AREAS):
+        """
+        Construction
+
+        :param max_areas:   The maximum number of work areas to keep in memory.  The least recently
+                            used work areas are reloaded from disk when they're needed again
+        """
+        Threaded.__init__(self)
+        self._app = sgtk.platform.current_bundle()
+        self._db_path = None
+        self._areas = OrderedDict()# area key:_AreaIndex(), least recently used first
+        self._max_areas = max_areas
+
+    def find_work_files(self, template, context, ctx_fields, skip_fields):
+        """
+        Find all work files for the specified work area, re-listing only the directories that have
+        changed since the work area was last searched.
+
+        :param template:    The work template to match files against
+        :param context:     The context of the work area to find files for
+        :param ctx_fields:  Dictionary of template fields resolved from the context
+        :param skip_fields: List of fields whose value may differ from the context fields
+        :returns:           A dictionary {path:(fields, mtime, uid)} containing an entry for each work
+                            file found or None if the work area can't be searched using the index, in
+                            which case the caller should fall back to a regular search.
+        """
+        walker = TemplateWalker()
+        root_path, levels = walker.resolve_levels(template, ctx_fields, skip_fields)
+        if not root_path:
+            return None
+
+        area_key = self._construct_area_key(template, context, skip_fields)
+        area = self._get_area(area_key)
+
+        # walk the work area one level at a time:
+        changed_dirs = {}
+        visited_dirs = set()
+        found_files = {}
+        current_paths = [root_path]
+        for level in levels:
+            if level.static_name and not level.is_leaf:
+                current_paths = [os.path.join(p, level.static_name) for p in current_paths]
+                continue
+
+            dir_results = walker.map(
+                lambda dir_path: self._scan_directory(walker, area, dir_path, level, ctx_fields, skip_fields),
+                current_paths
+            )
+
+            next_paths = []
+            for dir_path, (dir_mtime, entries, is_changed) in zip(current_paths, dir_results):
+                if dir_mtime is None:
+                    # directory doesn't exist any more!
+                    continue
+                visited_dirs.add(dir_path)
+                if is_changed:
+                    changed_dirs[dir_path] = (dir_mtime, entries)
+                if level.is_leaf:
+                    found_files.update(entries)
+                else:
+                    next_paths.extend(entries)
+            current_paths = next_paths
+
+        # and update the index with anything that changed:
+        removed_dirs = set(area.entries.keys()) - visited_dirs
+        if changed_dirs or removed_dirs:
+            self._update_area(area_key, area, changed_dirs, removed_dirs)
+
+        return found_files
+
+    @Threaded.exclusive
+    def clear(self):
+        """
+        Clear the index, removing all entries from the database on disk.
+        """
+        self._areas = OrderedDict()
+        connection = self._connect()
+        if not connection:
+            return
+        try:
+            with connection:
+                connection.execute("DELETE FROM dirs")
+        except sqlite3.Error, e:
+            self._app.log_debug("Failed to clear the work file index: %s" % e)
+        finally:
+            connection.close()
+
+    # ------------------------------------------------------------------------------------------
+    # Protected methods
+
+    def _scan_directory(self, walker, area, dir_path, level, ctx_fields, skip_fields):
+        """
+        Scan a single directory of the work area, only listing it if it has changed since the last
+        time it was scanned.  Files in leaf directories are always stat'd again as overwriting a file
+        doesn't change the mtime of the directory it's in.
+
+        :param walker:      The TemplateWalker used to list the directory
+        :param area:        The _AreaIndex for the work area being scanned
+        :param dir_path:    The directory to scan
+        :param level:       The TemplateWalker.Level being scanned
+        :param ctx_fields:  Dictionary of template fields resolved from the context
+        :param skip_fields: List of fields whose value may differ from the context fields
+        :returns:           Tuple (mtime, entries, is_changed) where entries is a dictionary
+                            {path:(fields, mtime, uid)} of files for leaf levels or a list of child
+                            directory paths otherwise.  mtime is None if the directory doesn't exist.
+        """
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime
+        except OSError:
+            return (None, None, False)
+
+        cached_entries = area.entries.get(dir_path)
+        if cached_entries and cached_entries[0] == dir_mtime:
+            # nothing has been added or removed since the last scan:
+            if not level.is_leaf:
+                return (dir_mtime, cached_entries[1], False)
+            entries, is_changed = self._restat_files(cached_entries[1])
+            return (dir_mtime, entries, is_changed)
+
+        # the directory has changed so we need to list it again:
+        scan_time = time.time()
+        found = walker.scan_directory(dir_path, level, ctx_fields, skip_fields)
+        if level.is_leaf:
+            entries = dict((path, (fields, st.st_mtime, st.st_uid))
+                           for path, fields, st in found if not stat.S_ISDIR(st.st_mode))
+        else:
+            entries = [path for path, _, _ in found]
+
+        if scan_time - dir_mtime <= WorkFileIndex._MTIME_RESOLUTION:
+            # the directory may still be changing within the resolution of its mtime so make sure
+            # it doesn't match next time and is listed again:
+            dir_mtime = 0
+        return (dir_mtime, entries, True)
+
+    def _restat_files(self, file_entries):
+        """
+        Check the files found by a previous scan of a leaf directory for any that have been modified
+        or removed since.
+
+        :param file_entries:    Dictionary {path:(fields, mtime, uid)} of the files previously found
+        :returns:               Tuple (entries, is_changed) containing the up-to-date dictionary of files
+                                and True if any of them had changed, otherwise False
+        """
+        entries = {}
+        is_changed = False
+        for path, (fields, mtime, uid) in file_entries.iteritems():
+            try:
+                st = os.stat(path)
+            except OSError:
+                # file has been removed:
+                is_changed = True
+                continue
+            if st.st_mtime != mtime or st.st_uid != uid:
+                is_changed = True
+            entries[path] = (fields, st.st_mtime, st.st_uid)
+        return (entries, is_changed)
+
+    def _construct_area_key(self, template, context, skip_fields):
+        """
+        Construct a unique key for the work area being searched.
+
+        :param template:    The work template used to search the work area
+        :param context:     The context of the work area
+        :param skip_fields: List of fields whose value may differ from the context fields
+        :returns:           A string key for the work area
+        """
+        key_parts = []
+        for entity in [context.project, context.entity, context.step, context.task, context.user]:
+            key_parts.append("%s:%s" % (entity["type"], entity["id"]) if entity else "")
+        key_parts.append(template.definition)
+        key_parts.extend(sorted(skip_fields))
+        return hashlib.md5("|".join(key_parts)).hexdigest()
+
+    @Threaded.exclusive
+    def _get_area(self, area_key):
+        """
+        Get the in-memory index for a work area, loading it from disk the first time it's needed.
+
+        :param area_key:    The unique key of the work area
+        :returns:           An _AreaIndex instance for the work area
+        """
+        area = self._areas.pop(area_key, None)
+        if area:
+            # re-add to mark it as the most recently used:
+            self._areas[area_key] = area
+            return area
+
+        area = WorkFileIndex._AreaIndex()
+        connection = self._connect()
+        if connection:
+            try:
+                for path, mtime, entries in connection.execute(
+                    "SELECT path, mtime, entries FROM dirs WHERE area=?", (area_key,)
+                ):
+                    area.entries[path] = (mtime, pickle.loads(str(entries)))
+            except sqlite3.Error, e:
+                self._app.log_debug("Failed to load the work file index: %s" % e)
+                area = WorkFileIndex._AreaIndex()
+            finally:
+                connection.close()
+
+        self._areas[area_key] = area
+        if len(self._areas) > self._max_areas:
+            self._areas.popitem(last=False)
+        return area
+
+    @Threaded.exclusive
+    def _update_area(self, area_key, area, changed_dirs, removed_dirs):
+        """
+        Update the index for a work area, both in memory and on disk.
+
+        :param area_key:        The unique key of the work area
+        :param area:            The _AreaIndex to update
+        :param changed_dirs:    Dictionary {dir path:(mtime, entries)} of all directories that were
+                                listed again
+        :param removed_dirs:    Set of directory paths that no longer exist in the work area
+        """
+        for dir_path in removed_dirs:
+            area.entries.pop(dir_path, None)
+        area.entries.update(changed_dirs)
+
+        connection = self._connect()
+        if not connection:
+            return
+        try:
+            with connection:
+                connection.executemany(
+                    "DELETE FROM dirs WHERE area=? AND path=?",
+                    [(area_key, dir_path) for dir_path in removed_dirs]
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO dirs (area, path, mtime, entries) VALUES (?, ?, ?, ?)",
+                    [(area_key, dir_path, mtime, sqlite3.Binary(pickle.dumps(entries, 2)))
+                     for dir_path, (mtime, entries) in changed_dirs.iteritems()]
+                )
+        except sqlite3.Error, e:
+            self._app.log_debug("Failed to update the work file index: %s" % e)
+        finally:
+            connection.close()
+
+    def _connect(self):
+        """
+        Open a connection to the index database, creating it if needed.  Connections aren't shared
+        between threads so a new one is opened for each operation.
+
+        :returns:   A sqlite3 connection or None if the database couldn't be opened
+        """
+        if not self._db_path:
+            cache_dir = self._app.cache_location
+            if not os.path.exists(cache_dir):
+                try:
+                    os.makedirs(cache_dir)
+                except OSError:
+                    # the folder may have been created in a different thread
+                    pass
+            self._db_path = os.path.join(cache_dir, WorkFileIndex._DB_FILE_NAME)
+
+        try:
+            connection = sqlite3.connect(self._db_path, timeout=10)
+            connection.text_factory = str
+            db_version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if db_version != WorkFileIndex._DB_VERSION:
+                with connection:
+                    connection.execute("DROP TABLE IF EXISTS dirs")
+                    connection.execute("DROP TABLE IF EXISTS files")
+                    connection.execute("CREATE TABLE dirs (area TEXT, path TEXT, mtime REAL, entries BLOB, "
+                                       "PRIMARY KEY (area, path))")
+                    connection.execute("PRAGMA user_version=%d" % WorkFileIndex._DB_VERSION)
+            return connection
+        except sqlite3.Error, e:
+            self._app.log_debug("Failed to open the work file index '%s': %s" % (self._db_path, e))
+            return None
+
+# single global instance of the work file index
+g_work_file_index = WorkFileIndex()
@@ -15,6 +15,7 @@ import sgtk
 from sgtk.platform.qt import QtCore
 
 from .util import report_non_destroyed_qobjects
+from .path_cache_sync import g_path_cache_sync
 
 
 def dbg_info(func):
@@ -74,9 +75,9 @@ class WorkFiles(object):
         Constructor.
         """
         app = sgtk.platform.current_bundle()
-        app.log_debug("Synchronizing remote path cache...")
-        app.sgtk.synchronize_filesystem_structure()
-        app.log_debug("Path cache up to date!")
+
+        # synchronize the path cache in the background while the dialog is shown:
+        g_path_cache_sync.start()
 
         # If the user wants to debug the dialog, show it modally and wrap it
         # with memory leak-detection code.
@@ -103,6 +104,25 @@ class WorkFiles(object):
         from .file_save_form import FileSaveForm
         handler._show_file_dlg("File Save", FileSaveForm)
 
+    @staticmethod
+    def shut_down():
+        """
+        Shut down any models that are being kept warm between dialog invocations.
+        """
+        from .model_session import g_model_session
+        g_model_session.shut_down()
+
+    @staticmethod
+    def prewarm():
+        """
+        Run the file search for the current context in the background so that the next dialog is
+        populated as soon as it's shown.  Does nothing if a dialog is already being shown.
+        """
+        app = sgtk.platform.current_bundle()
+        g_path_cache_sync.start()
+        from .model_session import g_model_session
+        g_model_session.prewarm(app.context)
+
     def _show_file_dlg(self, dlg_name, form):
         """
         Shows the file dialog modally or not depending on the current DCC and settings.